@@ -0,0 +1,127 @@
+"""
+Job em lote: modelo publicado no MinIO -> top-N por usuário -> tabela recommendations
+Gera as recomendações de todos os usuários com os algoritmos kmeans, knn ou hybrid
+"""
+import argparse
+import logging
+import time
+from typing import Dict
+
+from minio_client import MinIOClient
+from postgres_client import RECOMMENDATIONS_EVENT, PostgreSQLClient
+from recommender import load_model_from_minio
+from recommender.batch import ALGORITHMS, USER_CHUNK_SIZE, recommend_all_users
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Versões publicadas mantidas por algoritmo (a anterior continua servida por até
+# PUBLISHED_VERSION_TTL segundos nos workers que ainda não releram a nova)
+RECOMMENDATION_VERSIONS_KEPT = 2
+
+RECOMMENDATION_COLUMNS = ["user_id", "movie_id", "predicted_rating", "recommendation_score", "model_version", "algorithm"]
+
+
+def recommendations_event(algorithm: str) -> str:
+    """Evento em db_metadata com a versão publicada de um algoritmo"""
+    return f"{RECOMMENDATIONS_EVENT}:{algorithm}"
+
+
+def generate_and_store_recommendations(
+    algorithm: str = "hybrid",
+    n: int = 10,
+    model=None,
+    minio_client=None,
+    pg_client=None,
+    chunk_size: int = USER_CHUNK_SIZE,
+    max_workers: int = 4,
+    keep: int = RECOMMENDATION_VERSIONS_KEPT
+) -> Dict:
+    """
+    Calcula o top-N de todos os usuários e carrega em recommendations
+
+    A carga usa COPY e substitui as linhas da mesma (model_version,
+    algorithm) numa única transação; ao final a versão é registrada
+    como a servida pela API para o algoritmo e as linhas do algoritmo
+    fora das `keep` últimas versões publicadas são removidas.
+
+    Args:
+        algorithm: 'kmeans', 'knn' ou 'hybrid'
+        n: Recomendações por usuário
+        model: Modelo (opcional, default: última versão publicada no MinIO)
+        minio_client: Cliente MinIO (opcional, criado se ausente)
+        pg_client: Cliente PostgreSQL (opcional, criado se ausente)
+        chunk_size: Usuários por bloco
+        max_workers: Threads de pontuação
+        keep: Versões publicadas mantidas para o algoritmo
+
+    Returns:
+        Dicionário com versão, algoritmo, número de linhas e tempo
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Algoritmo inválido: {algorithm}. Use um de {ALGORITHMS}")
+    if keep < 1:
+        raise ValueError("keep deve ser maior que zero")
+
+    pg_client = pg_client or PostgreSQLClient()
+    if model is None:
+        model = load_model_from_minio(minio_client or MinIOClient())
+    if model is None:
+        raise ValueError("Nenhum modelo publicado no MinIO. Treine um modelo em /recommender/train")
+
+    start = time.perf_counter()
+    model_version = model.model_version
+
+    def rows():
+        for user_ids, movie_ids, scores in recommend_all_users(model, algorithm, n, chunk_size, max_workers):
+            predicted = scores.clip(1.0, 5.0)
+            for user_id, movie_id, rating, score in zip(user_ids.tolist(), movie_ids.tolist(), predicted.tolist(), scores.tolist()):
+                yield user_id, movie_id, round(rating, 4), round(score, 6), model_version, algorithm
+
+    loaded = pg_client.copy_records(
+        "recommendations",
+        RECOMMENDATION_COLUMNS,
+        rows(),
+        replace={"model_version": model_version, "algorithm": algorithm}
+    )
+    pg_client.publish_version(recommendations_event(algorithm), model_version)
+    pruned = pg_client.prune_versions("recommendations", recommendations_event(algorithm), keep, {"algorithm": algorithm})
+
+    result = {
+        "model_version": model_version,
+        "algorithm": algorithm,
+        "n": n,
+        "users": model.n_users,
+        "rows": loaded,
+        "pruned_rows": pruned,
+        "total_seconds": round(time.perf_counter() - start, 3)
+    }
+    logger.info(f"recommendations {model_version}/{algorithm}: {loaded} linhas em {result['total_seconds']}s")
+    return result
+
+
+def main():
+    """Função principal para execução do job via CLI"""
+    parser = argparse.ArgumentParser(description="Gera recomendações em lote para todos os usuários")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default="hybrid", help="Algoritmo de recomendação")
+    parser.add_argument("--n", type=int, default=10, help="Recomendações por usuário")
+    parser.add_argument("--chunk-size", type=int, default=USER_CHUNK_SIZE, help="Usuários por bloco")
+    parser.add_argument("--workers", type=int, default=4, help="Threads de pontuação")
+    parser.add_argument("--keep", type=int, default=RECOMMENDATION_VERSIONS_KEPT, help="Versões publicadas mantidas para o algoritmo")
+    args = parser.parse_args()
+
+    try:
+        result = generate_and_store_recommendations(
+            args.algorithm, args.n, chunk_size=args.chunk_size, max_workers=args.workers, keep=args.keep
+        )
+        print(f"\n✅ Recomendações publicadas: {result['model_version']} ({result['algorithm']})")
+        for key, value in result.items():
+            print(f"  {key}: {value}")
+        return 0
+    except Exception as e:
+        logger.error(f"Falha ao gerar recomendações: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,431 @@
+"""
+Benchmark da carga ETL (PostgreSQL) e do armazenamento (MinIO) em vários tamanhos de dados
+Mede linhas/s, MB/s, pico de memória e tempo de cada caminho e grava um JSON comparável entre commits
+"""
+import argparse
+import io
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from etl_minio_postgres import MovieLensETL
+from generate_synthetic_data import DEFAULT_SOURCE_DIR, SyntheticMovieLens, fit_profile
+from recommender.clustering import PeakMemory
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Caminhos de carga das avaliações no PostgreSQL
+PG_PATHS = ("etl_movies", "etl_users", "etl_ratings", "insert_row", "execute_batch", "copy", "copy_parallel", "upsert")
+
+# Caminhos de upload/download no MinIO (um resultado por codec)
+MINIO_PATHS = ("upload", "upload_dedup", "download", "stream")
+
+# O insert linha a linha é medido só nas primeiras N avaliações (linhas/s é extrapolável)
+ROW_INSERT_LIMIT = 20_000
+
+# Tamanho dos lotes de execute_batch e do upsert (mesmos padrões do ETL e do writer de avaliações)
+BATCH_SIZE = 1000
+
+# Conexões simultâneas no COPY paralelo (o pool do PostgreSQLClient tem até 10)
+PARALLEL_WORKERS = 4
+
+# Bloco lido por vez no download em streaming (1 MB)
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Queda de linhas/s acima desta fração em relação à base conta como regressão
+REGRESSION_THRESHOLD = 0.10
+
+# Bucket separado para não tocar nos dados reais do MinIO
+DEFAULT_BUCKET = "movielens-benchmark"
+
+RATING_COLUMNS = ["user_id", "movie_id", "rating", "timestamp", "rated_at"]
+
+# Tabelas esvaziadas pelo benchmark (TRUNCATE ... CASCADE a partir de movies, users e ratings)
+TRUNCATED_TABLES = ("movies", "users", "ratings", "user_clusters", "movie_similarities", "recommendations")
+
+# Banco da aplicação (o mesmo default do PostgreSQLClient)
+APP_DATABASE = os.getenv("POSTGRES_DB", "movielens")
+
+
+def git_commit() -> Optional[str]:
+    """Commit atual do repositório (None fora de um checkout git)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset_shape(n_ratings: int) -> Dict[str, int]:
+    """
+    Usuários e filmes de um dataset com n_ratings avaliações
+
+    Mantém as proporções do ml-100k: ~106 avaliações por usuário e o
+    catálogo crescendo com a raiz do volume (1682 filmes em 100k).
+    """
+    return {
+        "users": max(100, round(n_ratings / 106)),
+        "movies": max(200, round(1682 * math.sqrt(n_ratings / 100_000))),
+        "ratings": n_ratings
+    }
+
+
+def build_dataset(profile: Dict, n_ratings: int, seed: int) -> Dict:
+    """
+    Gera um dataset sintético em memória, nos formatos usados pelo ETL
+
+    Returns:
+        Dicionário com 'rows' (tuplas na ordem de RATING_COLUMNS) e os
+        arquivos 'u.data', 'u.user' e 'u.item' em bytes
+    """
+    shape = dataset_shape(n_ratings)
+    generator = SyntheticMovieLens(profile, shape["users"], shape["movies"], n_ratings, seed)
+
+    rows, lines = [], []
+    for users, movies, ratings, timestamps in generator.rating_chunks():
+        for u, m, r, ts in zip(users.tolist(), movies.tolist(), ratings.tolist(), timestamps.tolist()):
+            # rated_at como no ETL (datetime.fromtimestamp)
+            rows.append((u, m, r, ts, datetime.fromtimestamp(ts)))
+            lines.append(f"{u}\t{m}\t{r}\t{ts}")
+
+    items = [
+        "|".join([str(movie_id), title, release, "", ""] + [str(g) for g in genres])
+        for movie_id, title, release, genres in generator.movie_rows()
+    ]
+    return {
+        "shape": {**shape, "ratings": len(rows)},
+        "rows": rows,
+        "files": {
+            "u.data": ("\n".join(lines) + "\n").encode("latin-1"),
+            "u.user": "".join("|".join(row) + "\n" for row in generator.user_rows()).encode("latin-1"),
+            "u.item": ("\n".join(items) + "\n").encode("latin-1")
+        }
+    }
+
+
+def measure(path: str, fn: Callable[[], Optional[int]], rows: int, n_bytes: int = 0, **extra) -> Dict:
+    """
+    Executa um caminho e mede tempo total e pico de memória residente
+
+    Args:
+        path: Nome do caminho
+        fn: Função medida; se retornar um inteiro, ele substitui `rows`
+        rows: Linhas processadas
+        n_bytes: Bytes processados (para MB/s)
+        **extra: Campos adicionais do resultado (ex.: codec)
+
+    Returns:
+        Dicionário com rows, bytes, wall_seconds, rows_per_s, mb_per_s e peak_rss_mb
+    """
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        returned = fn()
+        wall = time.perf_counter() - start
+    if isinstance(returned, int):
+        rows = returned
+    result = {
+        "path": path,
+        **extra,
+        "rows": rows,
+        "bytes": n_bytes,
+        "wall_seconds": round(wall, 4),
+        "rows_per_s": round(rows / wall, 1) if wall > 0 else None,
+        "mb_per_s": round(n_bytes / 1024 / 1024 / wall, 2) if wall > 0 and n_bytes else None,
+        "peak_rss_mb": memory.peak_mb
+    }
+    label = f"{path}[{extra['codec']}]" if "codec" in extra else path
+    logger.info(f"{label}: {rows} linhas em {result['wall_seconds']}s ({result['rows_per_s']} linhas/s)")
+    return result
+
+
+def copy_parallel(pg_client, rows: List[tuple], workers: int = PARALLEL_WORKERS) -> int:
+    """
+    COPY das avaliações em paralelo, um bloco contíguo por conexão
+
+    Os blocos seguem a ordem do gerador (blocos de usuários), então cada
+    conexão escreve usuários distintos e não disputa as mesmas chaves.
+    """
+    size = math.ceil(len(rows) / workers)
+    chunks = [rows[i:i + size] for i in range(0, len(rows), size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(lambda chunk: pg_client.copy_records("ratings", RATING_COLUMNS, chunk), chunks))
+
+
+def check_postgres_target(pg_client, database: Optional[str]):
+    """
+    Garante que o benchmark não apague dados da aplicação
+
+    Com um banco próprio (--database, diferente do banco da aplicação)
+    o benchmark roda sempre; sem ele, só se todas as tabelas que seriam
+    esvaziadas já estiverem vazias.
+
+    Raises:
+        ValueError: Se o alvo é o banco da aplicação com dados
+    """
+    if database:
+        if database == APP_DATABASE:
+            raise ValueError(f"--database precisa ser diferente do banco da aplicação ({APP_DATABASE})")
+        return
+    filled = [
+        table for table in TRUNCATED_TABLES
+        if pg_client.execute_query(f"SELECT EXISTS (SELECT 1 FROM {table}) AS filled")[0]["filled"]
+    ]
+    if filled:
+        raise ValueError(
+            f"O benchmark apaga {', '.join(TRUNCATED_TABLES)} e {', '.join(filled)} têm dados em "
+            f"{pg_client.database}. Use um banco próprio com --database"
+        )
+
+
+def benchmark_postgres(etl: MovieLensETL, dataset: Dict, paths: List[str], workers: int) -> List[Dict]:
+    """
+    Mede os caminhos de carga do PostgreSQL sobre um banco limpo
+
+    Os caminhos etl_* executam o MovieLensETL de ponta a ponta (extração
+    do MinIO, parse e carga). Os demais carregam as avaliações já em
+    memória; a tabela ratings é esvaziada antes de cada um.
+    """
+    pg = etl.pg_client
+    rows = dataset["rows"]
+    data_bytes = len(dataset["files"]["u.data"])
+    results = []
+
+    pg.execute_query("TRUNCATE TABLE ratings, users, movies CASCADE", fetch=False)
+    # Filmes e usuários são pré-requisito (chaves estrangeiras) de todos os caminhos
+    if "etl_movies" in paths:
+        results.append(measure("etl_movies", etl.load_movies, 0, len(dataset["files"]["u.item"])))
+    else:
+        etl.load_movies()
+    if "etl_users" in paths:
+        results.append(measure("etl_users", etl.load_users, 0, len(dataset["files"]["u.user"])))
+    else:
+        etl.load_users()
+
+    def run(path: str, fn: Callable[[], Optional[int]], n_rows: int, n_bytes: int):
+        if path not in paths:
+            return
+        pg.truncate_table("ratings")
+        results.append(measure(path, fn, n_rows, n_bytes))
+
+    def execute_batch():
+        for i in range(0, len(rows), BATCH_SIZE):
+            pg.insert_ratings_batch([dict(zip(RATING_COLUMNS, row)) for row in rows[i:i + BATCH_SIZE]])
+
+    def upsert():
+        return sum(pg.upsert_ratings(rows[i:i + BATCH_SIZE])["written"] for i in range(0, len(rows), BATCH_SIZE))
+
+    def insert_row(sample: List[tuple]):
+        for row in sample:
+            pg.insert_rating(dict(zip(RATING_COLUMNS, row)))
+
+    sample = rows[:ROW_INSERT_LIMIT]
+    sample_bytes = round(data_bytes * len(sample) / max(len(rows), 1))
+
+    run("etl_ratings", lambda: etl.load_ratings(BATCH_SIZE), len(rows), data_bytes)
+    run("insert_row", lambda: insert_row(sample), len(sample), sample_bytes)
+    run("execute_batch", execute_batch, len(rows), data_bytes)
+    run("copy", lambda: pg.copy_records("ratings", RATING_COLUMNS, rows), len(rows), data_bytes)
+    run("copy_parallel", lambda: copy_parallel(pg, rows, workers), len(rows), data_bytes)
+    run("upsert", upsert, len(rows), data_bytes)
+
+    pg.execute_query("TRUNCATE TABLE ratings, users, movies CASCADE", fetch=False)
+    return results
+
+
+def benchmark_minio(minio_client, dataset: Dict, paths: List[str], codecs: List[str], prefix: str) -> List[Dict]:
+    """
+    Mede upload, upload repetido (deduplicado), download e leitura em
+    streaming do u.data para cada codec de compressão
+    """
+    data = dataset["files"]["u.data"]
+    rows = dataset["shape"]["ratings"]
+    results = []
+
+    def stream_read(object_name: str) -> None:
+        stream = minio_client.open_object_stream(object_name)
+        try:
+            while stream.read(STREAM_CHUNK_SIZE):
+                pass
+        finally:
+            stream.close()
+
+    for codec in codecs:
+        object_name = f"{prefix}{codec}/u.data"
+        minio_client.delete_file(object_name)
+        steps = {
+            "upload": lambda: minio_client.upload_stream_dedup(io.BytesIO(data), object_name, "text/plain", codec),
+            "upload_dedup": lambda: minio_client.upload_stream_dedup(io.BytesIO(data), object_name, "text/plain", codec),
+            "download": lambda: minio_client.download_file(object_name),
+            "stream": lambda: stream_read(object_name)
+        }
+        for path, fn in steps.items():
+            # Os passos de leitura e dedup dependem do upload, que sempre roda
+            if path in paths or path == "upload":
+                result = measure(path, lambda: fn() and None, rows, len(data), codec=codec)
+                if path in paths:
+                    results.append(result)
+        minio_client.delete_file(object_name)
+    return results
+
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[Dict]:
+    """
+    Compara linhas/s de cada (tamanho pedido, caminho, codec) com a execução base
+
+    Returns:
+        Lista de comparações com baseline/current rows_per_s, variação e flag 'regression'
+    """
+    def index(report: Dict) -> Dict:
+        return {
+            (run["size"], r["path"], r.get("codec")): r
+            for run in report["runs"]
+            for r in run["results"]
+        }
+
+    base, cur = index(baseline), index(current)
+    comparisons = []
+    for key in sorted(base.keys() & cur.keys(), key=lambda k: (k[0], k[1], k[2] or "")):
+        before, after = base[key]["rows_per_s"], cur[key]["rows_per_s"]
+        if not before or not after:
+            continue
+        change = after / before - 1
+        comparisons.append({
+            "size": key[0],
+            "path": key[1],
+            "codec": key[2],
+            "baseline_rows_per_s": before,
+            "current_rows_per_s": after,
+            "change": round(change, 4),
+            "regression": change < -threshold
+        })
+    return comparisons
+
+
+def parse_list(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def main():
+    """Função principal para execução do benchmark via CLI"""
+    parser = argparse.ArgumentParser(description="Benchmark de carga ETL (PostgreSQL) e armazenamento (MinIO)")
+    parser.add_argument("--sizes", default="100000,1000000", help="Tamanhos (avaliações) separados por vírgula")
+    parser.add_argument("--pg-paths", default=",".join(PG_PATHS), help=f"Caminhos do PostgreSQL ({', '.join(PG_PATHS)}) ou 'none'")
+    parser.add_argument("--minio-paths", default=",".join(MINIO_PATHS), help=f"Caminhos do MinIO ({', '.join(MINIO_PATHS)}) ou 'none'")
+    parser.add_argument("--codecs", default="none,gzip", help="Codecs de compressão testados no MinIO")
+    parser.add_argument("--workers", type=int, default=PARALLEL_WORKERS, help="Conexões do COPY paralelo")
+    parser.add_argument("--bucket", default=DEFAULT_BUCKET, help="Bucket usado no benchmark (criado se não existir)")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do dataset sintético")
+    parser.add_argument("--source", default=DEFAULT_SOURCE_DIR, help="Diretório do ml-100k real (ajuste das distribuições)")
+    parser.add_argument("--output", help="Arquivo JSON de resultados (padrão: etl-benchmark-<commit>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior; falha se houver regressão")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Queda de linhas/s tolerada (fração)")
+    parser.add_argument("--database", default=os.getenv("BENCHMARK_POSTGRES_DB"),
+                        help="Banco do PostgreSQL usado no benchmark, diferente do da aplicação (default: BENCHMARK_POSTGRES_DB)")
+    args = parser.parse_args()
+
+    pg_paths = [] if args.pg_paths == "none" else parse_list(args.pg_paths)
+    minio_paths = [] if args.minio_paths == "none" else parse_list(args.minio_paths)
+    unknown = set(pg_paths) - set(PG_PATHS) | set(minio_paths) - set(MINIO_PATHS)
+    if unknown:
+        logger.error(f"Caminhos desconhecidos: {sorted(unknown)}")
+        return 1
+
+    try:
+        if pg_paths and args.database:
+            # O PostgreSQLClient lê o banco de POSTGRES_DB ao ser criado (validado em check_postgres_target)
+            os.environ["POSTGRES_DB"] = args.database
+        etl = MovieLensETL()
+        etl.minio_client.bucket_name = args.bucket
+        # Sem cache local: cada leitura vai ao servidor
+        etl.minio_client.cache = None
+        if not etl.minio_client.check_connection() or not etl.minio_client.create_bucket_if_not_exists():
+            raise ConnectionError(f"MinIO indisponível em {etl.minio_client.endpoint}")
+        if pg_paths:
+            if not etl.pg_client.check_connection():
+                raise ConnectionError(f"PostgreSQL indisponível em {etl.pg_client.host}:{etl.pg_client.port}")
+            check_postgres_target(etl.pg_client, args.database)
+
+        profile = fit_profile(args.source)
+        commit = git_commit()
+        report = {
+            "commit": commit,
+            "started_at": datetime.utcnow().isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "cpus": os.cpu_count(),
+                "postgres": f"{etl.pg_client.host}:{etl.pg_client.port}/{etl.pg_client.database}",
+                "minio": f"{etl.minio_client.endpoint}/{args.bucket}"
+            },
+            "parameters": {
+                "seed": args.seed,
+                "batch_size": BATCH_SIZE,
+                "row_insert_limit": ROW_INSERT_LIMIT,
+                "workers": args.workers,
+                "codecs": parse_list(args.codecs)
+            },
+            "runs": []
+        }
+
+        for size in (int(s) for s in parse_list(args.sizes)):
+            logger.info(f"Gerando dataset sintético com ~{size} avaliações...")
+            dataset = build_dataset(profile, size, args.seed)
+
+            # Arquivos nos caminhos lidos pelo MovieLensETL, no bucket do benchmark
+            for folder, name in (("ratings", "u.data"), ("users", "u.user"), ("items", "u.item")):
+                etl.minio_client.upload_file_dedup(dataset["files"][name], f"movielens/{folder}/{name}", "text/plain", "none")
+
+            results = []
+            if pg_paths:
+                results += benchmark_postgres(etl, dataset, pg_paths, args.workers)
+            if minio_paths:
+                results += benchmark_minio(etl.minio_client, dataset, minio_paths, parse_list(args.codecs), "benchmark/")
+            report["runs"].append({"size": size, **dataset["shape"], "data_mb": round(len(dataset["files"]["u.data"]) / 1024 / 1024, 2), "results": results})
+
+        output = args.output or f"etl-benchmark-{commit or 'local'}.json"
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+        print(f"\n📊 Benchmark ETL/armazenamento (commit {commit})")
+        for run in report["runs"]:
+            print(f"\n  {run['ratings']} avaliações, {run['users']} usuários, {run['movies']} filmes ({run['data_mb']} MB)")
+            for r in run["results"]:
+                label = f"{r['path']}[{r['codec']}]" if "codec" in r else r["path"]
+                mb = f"{r['mb_per_s']} MB/s" if r["mb_per_s"] is not None else "-"
+                print(f"    {label:<22} {r['rows_per_s']:>12} linhas/s  {mb:>12}  {r['wall_seconds']:>8}s  pico {r['peak_rss_mb']} MB")
+        print(f"\n✅ Resultados gravados em {output}")
+
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+            comparisons = compare_results(report, baseline, args.threshold)
+            regressions = [c for c in comparisons if c["regression"]]
+            print(f"\n🔍 Comparação com {args.compare} (commit {baseline.get('commit')})")
+            for c in comparisons:
+                label = f"{c['path']}[{c['codec']}]" if c["codec"] else c["path"]
+                flag = "❌" if c["regression"] else "✓"
+                print(f"  {flag} {c['size']:>9} {label:<22} {c['baseline_rows_per_s']:>12} -> {c['current_rows_per_s']:>12} linhas/s ({c['change']:+.1%})")
+            if regressions:
+                print(f"\n❌ {len(regressions)} regressões acima de {args.threshold:.0%}")
+                return 1
+        return 0
+    except Exception as e:
+        logger.error(f"Falha no benchmark: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,94 @@
+"""
+Benchmark do índice aproximado de vizinhos (LSH) contra a busca exata
+Mede recall@K e latência por consulta sobre os vetores do modelo publicado ou sintéticos
+"""
+import argparse
+import json
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+from recommender.ann import DEFAULT_TABLES, DEFAULT_WINDOW, recall_benchmark
+from recommender.training import normalize_user_vectors
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def synthetic_user_vectors(n_users: int, k_clusters: int = 8, n_profiles: int = 50, seed: int = 42) -> np.ndarray:
+    """
+    Vetores de usuários sintéticos com a forma dos do modelo
+
+    Cada usuário segue um de n_profiles perfis de gosto (nota média por
+    cluster de filmes) com ruído; 20% das células ficam sem avaliação (0),
+    como na utility clustered matrix. Os vetores passam pela mesma
+    normalização do treino.
+    """
+    rng = np.random.default_rng(seed)
+    profiles = rng.uniform(1, 5, (n_profiles, k_clusters))
+    means = profiles[rng.integers(0, n_profiles, n_users)] + rng.normal(0, 0.6, (n_users, k_clusters))
+    means = np.clip(means, 1, 5)
+    means[rng.random((n_users, k_clusters)) < 0.2] = 0
+    return normalize_user_vectors(means.astype(np.float32))
+
+
+def model_user_vectors() -> np.ndarray:
+    """Vetores dos usuários do último modelo publicado no MinIO"""
+    from minio_client import MinIOClient
+    from recommender import load_model_from_minio
+
+    model = load_model_from_minio(MinIOClient())
+    if model is None:
+        raise ValueError("Nenhum modelo publicado no MinIO. Treine um modelo em /recommender/train")
+    return np.asarray(model.user_vectors)
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    """Função principal para execução do benchmark via CLI"""
+    parser = argparse.ArgumentParser(description="Recall@K e latência do índice LSH de vizinhos")
+    parser.add_argument("--synthetic-users", type=int, help="Usa N usuários sintéticos em vez do modelo publicado")
+    parser.add_argument("--k-clusters", type=int, default=8, help="Dimensão dos vetores sintéticos")
+    parser.add_argument("--k", type=int, default=10, help="Vizinhos por consulta (recall@K)")
+    parser.add_argument("--queries", type=int, default=1000, help="Usuários sorteados como consultas")
+    parser.add_argument("--tables", default=f"4,{DEFAULT_TABLES},16", help="Valores de n_tables")
+    parser.add_argument("--windows", default=f"32,{DEFAULT_WINDOW}", help="Valores de window")
+    parser.add_argument("--output", help="Arquivo JSON para gravar os resultados")
+    args = parser.parse_args()
+
+    try:
+        if args.synthetic_users:
+            vectors = synthetic_user_vectors(args.synthetic_users, args.k_clusters)
+        else:
+            vectors = model_user_vectors()
+
+        configs = [
+            {"n_tables": tables, "window": window}
+            for tables in parse_int_list(args.tables)
+            for window in parse_int_list(args.windows)
+        ]
+        results = recall_benchmark(vectors, args.k, configs, args.queries)
+
+        print(f"\n📊 Vizinhos aproximados: {len(vectors)} usuários, d={vectors.shape[1]}, recall@{args.k}")
+        for r in results:
+            params = f"tables={r['n_tables']:>3} window={r['window']:>4}" if r["method"] == "lsh" else "busca exata".ljust(22)
+            latency = f"p50={r['query_p50_ms']}ms p99={r['query_p99_ms']}ms" if r["method"] == "lsh" else f"média={r['query_mean_ms']}ms"
+            print(f"  {params}  recall={r['recall_at_k']:.4f}  {latency}")
+
+        if args.output:
+            report: Dict = {"n_users": int(len(vectors)), "dim": int(vectors.shape[1]), "k": args.k, "results": results}
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n✅ Resultados gravados em {args.output}")
+        return 0
+    except Exception as e:
+        logger.error(f"Falha no benchmark: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
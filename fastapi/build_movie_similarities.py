@@ -0,0 +1,100 @@
+"""
+Job em lote: PostgreSQL (ratings) -> similaridade item-item -> movie_similarities
+Grava os top-K filmes similares de cada filme, versionados por model_version
+"""
+import argparse
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from postgres_client import SIMILARITIES_EVENT, PostgreSQLClient
+from recommender import load_ratings_from_postgres
+from recommender.similarity import DEFAULT_SIMILAR_MOVIES, MIN_COMMON_RATERS, item_similarity_pairs
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def build_and_store_similarities(
+    top_k: int = DEFAULT_SIMILAR_MOVIES,
+    min_common: int = MIN_COMMON_RATERS,
+    model_version: Optional[str] = None,
+    pg_client=None
+) -> Dict:
+    """
+    Calcula as similaridades entre filmes e carrega em movie_similarities
+
+    A carga usa COPY e substitui as linhas da mesma model_version numa
+    única transação; ao final a versão é registrada como a servida pela API.
+
+    Args:
+        top_k: Filmes similares por filme
+        min_common: Mínimo de usuários em comum por par
+        model_version: Versão gravada (default: item_cosine-<timestamp>)
+        pg_client: Cliente PostgreSQL (opcional, criado se ausente)
+
+    Returns:
+        Dicionário com versão, número de pares e tempos
+
+    Raises:
+        ValueError: Parâmetros inválidos, sem avaliações ou sem nenhum par
+            (uma versão vazia não é publicada)
+    """
+    if top_k < 1 or min_common < 1:
+        raise ValueError("top_k e min_common devem ser maiores que zero")
+    pg_client = pg_client or PostgreSQLClient()
+    start = time.perf_counter()
+    model_version = model_version or f"item_cosine-{datetime.now():%Y%m%dT%H%M%S}"
+
+    user_ids, movie_ids, ratings = load_ratings_from_postgres(pg_client)
+    if len(ratings) == 0:
+        raise ValueError("Nenhuma avaliação no PostgreSQL. Execute o ETL primeiro (/etl/run)")
+
+    movie_id_1, movie_id_2, scores = item_similarity_pairs(user_ids, movie_ids, ratings, k=top_k, min_common=min_common)
+    compute_seconds = time.perf_counter() - start
+    if len(scores) == 0:
+        raise ValueError(f"Nenhum par de filmes com pelo menos {min_common} usuários em comum")
+
+    rows = zip(movie_id_1.tolist(), movie_id_2.tolist(), scores.tolist(), (model_version for _ in range(len(scores))))
+    loaded = pg_client.copy_records(
+        "movie_similarities",
+        ["movie_id_1", "movie_id_2", "similarity_score", "model_version"],
+        rows,
+        replace={"model_version": model_version}
+    )
+    pg_client.publish_version(SIMILARITIES_EVENT, model_version)
+
+    result = {
+        "model_version": model_version,
+        "top_k": top_k,
+        "min_common": min_common,
+        "pairs": loaded,
+        "compute_seconds": round(compute_seconds, 3),
+        "total_seconds": round(time.perf_counter() - start, 3)
+    }
+    logger.info(f"movie_similarities {model_version}: {loaded} pares em {result['total_seconds']}s")
+    return result
+
+
+def main():
+    """Função principal para execução do job via CLI"""
+    parser = argparse.ArgumentParser(description="Calcula e grava similaridades entre filmes")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_SIMILAR_MOVIES, help="Filmes similares por filme")
+    parser.add_argument("--min-common", type=int, default=MIN_COMMON_RATERS, help="Mínimo de usuários em comum por par")
+    parser.add_argument("--model-version", default=None, help="Versão gravada em movie_similarities")
+    args = parser.parse_args()
+
+    try:
+        result = build_and_store_similarities(args.top_k, args.min_common, args.model_version)
+        print(f"\n✅ Similaridades publicadas: {result['model_version']}")
+        for key, value in result.items():
+            print(f"  {key}: {value}")
+        return 0
+    except Exception as e:
+        logger.error(f"Falha ao calcular similaridades: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,89 @@
+"""
+Job em lote: PostgreSQL (users, movies, ratings) -> features do Random Forest -> MinIO
+Materializa o feature store uma vez por versão dos dados (features/rf/<versão>/)
+"""
+import argparse
+import logging
+import time
+from typing import Dict
+
+from minio_client import MinIOClient
+from postgres_client import PostgreSQLClient
+from recommender import load_ratings_from_postgres
+from recommender.features import (
+    feature_data_version, load_feature_tables_from_postgres, load_features_from_minio,
+    materialize_features, save_features_to_minio, set_latest_feature_version
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def materialize_and_publish(pg_client=None, minio_client=None, force: bool = False) -> Dict:
+    """
+    Materializa as features do Random Forest e publica no MinIO
+
+    A versão é derivada dos dados (usuários, filmes e avaliações); se ela
+    já foi publicada, o feature store existente é reaproveitado e apenas
+    marcado como LATEST.
+
+    Args:
+        pg_client: Cliente PostgreSQL (opcional, criado se ausente)
+        minio_client: Cliente MinIO (opcional, criado se ausente)
+        force: Recalcula mesmo se a versão já existe
+
+    Returns:
+        Dicionário com versão, tamanhos, origem e tempos (e o feature store em 'store')
+    """
+    pg_client = pg_client or PostgreSQLClient()
+    minio_client = minio_client or MinIOClient()
+    start = time.perf_counter()
+
+    users, movies = load_feature_tables_from_postgres(pg_client)
+    ratings = load_ratings_from_postgres(pg_client)
+    if len(ratings[2]) == 0:
+        raise ValueError("Nenhuma avaliação no PostgreSQL. Execute o ETL primeiro (/etl/run)")
+    version = feature_data_version(users, movies, ratings)
+
+    store = None if force else load_features_from_minio(minio_client, version)
+    cached = store is not None
+    if cached:
+        set_latest_feature_version(minio_client, version)
+    else:
+        store = materialize_features(users, movies, ratings, version)
+        save_features_to_minio(minio_client, store)
+
+    result = {
+        "version": version,
+        "n_users": store.n_users,
+        "n_movies": store.n_movies,
+        "n_ratings": store.metadata["n_ratings"],
+        "n_features": len(store.feature_names),
+        "cached": cached,
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "store": store
+    }
+    logger.info(f"Feature store {version} publicado em {result['total_seconds']}s" + (" (existente)" if cached else ""))
+    return result
+
+
+def main():
+    """Função principal para execução do job via CLI"""
+    parser = argparse.ArgumentParser(description="Materializa as features do Random Forest no MinIO")
+    parser.add_argument("--force", action="store_true", help="Recalcula mesmo se a versão dos dados já foi publicada")
+    args = parser.parse_args()
+
+    try:
+        result = materialize_and_publish(force=args.force)
+        print(f"\n✅ Features do Random Forest publicadas: {result['version']}")
+        for key, value in result.items():
+            if key != "store":
+                print(f"  {key}: {value}")
+        return 0
+    except Exception as e:
+        logger.error(f"Falha ao materializar features: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
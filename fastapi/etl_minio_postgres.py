@@ -6,7 +6,7 @@ Extrai dados do MinIO e carrega no PostgreSQL de forma estruturada
 import io
 import logging
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 import pandas as pd
 
 from minio_client import MinIOClient
@@ -15,13 +15,21 @@ from postgres_client import PostgreSQLClient
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tentativas de leitura via cache (a entrada pode ser removida por LRU entre o download e a abertura)
+CACHE_READ_ATTEMPTS = 2
+
 
 class MovieLensETL:
     """Pipeline ETL para transferir dados do MinIO para PostgreSQL"""
     
-    def __init__(self):
-        self.minio_client = MinIOClient()
-        self.pg_client = PostgreSQLClient()
+    def __init__(self, minio_client: Optional[MinIOClient] = None, pg_client: Optional[PostgreSQLClient] = None):
+        """
+        Args:
+            minio_client: Cliente MinIO (opcional, criado se ausente; a API passa o do worker)
+            pg_client: Cliente PostgreSQL (opcional, criado se ausente; a API passa o pool do worker)
+        """
+        self.minio_client = minio_client or MinIOClient()
+        self.pg_client = pg_client or PostgreSQLClient()
         self.stats = {
             "movies_inserted": 0,
             "users_inserted": 0,
@@ -42,14 +50,25 @@ class MovieLensETL:
         try:
             logger.info(f"Extraindo dados de {object_name}")
             
-            # Download do objeto usando boto3 (s3_client)
-            response = self.minio_client.s3_client.get_object(
-                Bucket=self.minio_client.bucket_name,
-                Key=object_name
-            )
-            
-            # Ler conteúdo
-            data = response['Body'].read()
+            # Leitura via cache local em disco (GET condicional por ETag); se a
+            # entrada for removida (LRU) entre get_cached_path e open, baixa de novo
+            if self.minio_client.cache is not None:
+                for attempt in range(CACHE_READ_ATTEMPTS):
+                    path = self.minio_client.get_cached_path(object_name)
+                    try:
+                        with open(path, 'rb') as f:
+                            return f.read()
+                    except FileNotFoundError:
+                        if attempt == CACHE_READ_ATTEMPTS - 1:
+                            raise
+                        logger.info(f"{object_name} removido do cache antes da leitura, baixando novamente")
+            
+            # Download do objeto com descompressão transparente (gzip/zstd)
+            stream = self.minio_client.open_object_stream(object_name)
+            try:
+                data = stream.read()
+            finally:
+                stream.close()
             
             return data
             
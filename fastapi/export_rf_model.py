@@ -0,0 +1,185 @@
+"""
+Exporta o Random Forest (Step 14 do notebook) para o formato compacto servido pela API
+Origem: pickle local, artifact de um run do MLflow ou treino sobre o feature store;
+destino: arrays NumPy em models/rf/<versão>/ no MinIO
+"""
+import argparse
+import glob
+import logging
+import os
+import pickle
+import time
+from typing import Dict, Optional
+
+from minio_client import MinIOClient
+from postgres_client import PostgreSQLClient
+from recommender import load_ratings_from_postgres
+from recommender.features import load_features_from_minio
+from recommender.forest import export_forest, save_forest_to_minio
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Hiperparâmetros do notebook (Step 14)
+DEFAULT_N_ESTIMATORS = 100
+DEFAULT_MAX_DEPTH = 15
+DEFAULT_MIN_SAMPLES_SPLIT = 10
+
+
+def load_pickled_model(path: str):
+    """Carrega um modelo sklearn serializado com pickle (como no log do MLflow do notebook)"""
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def load_mlflow_model(run_id: str, artifact_path: str = "models"):
+    """
+    Baixa o pickle do Random Forest de um run do MLflow
+
+    O notebook grava o modelo com mlflow.log_artifact(<arquivo>.pkl, "models");
+    o servidor é lido de MLFLOW_TRACKING_URI.
+    """
+    import mlflow
+
+    directory = mlflow.artifacts.download_artifacts(run_id=run_id, artifact_path=artifact_path)
+    pickles = sorted(glob.glob(os.path.join(directory, "*.pkl")))
+    if len(pickles) != 1:
+        raise ValueError(f"Esperado um .pkl em {artifact_path}/ do run {run_id}, encontrados {len(pickles)}")
+    return load_pickled_model(pickles[0])
+
+
+def mlflow_feature_store_version(run_id: str) -> Optional[str]:
+    """Versão do feature store registrada como parâmetro do run (o notebook grava feature_store_version)"""
+    import mlflow
+
+    return mlflow.get_run(run_id).data.params.get("feature_store_version")
+
+
+def train_random_forest(
+    pg_client,
+    minio_client,
+    n_estimators: int = DEFAULT_N_ESTIMATORS,
+    max_depth: int = DEFAULT_MAX_DEPTH,
+    min_samples_split: int = DEFAULT_MIN_SAMPLES_SPLIT,
+    feature_store_version: Optional[str] = None
+):
+    """
+    Treina o Random Forest do notebook sobre todas as avaliações e o feature store publicado
+
+    Returns:
+        Tupla (modelo sklearn, nomes das features, versão do feature store)
+    """
+    from sklearn.ensemble import RandomForestRegressor
+
+    store = load_features_from_minio(minio_client, feature_store_version)
+    if store is None:
+        raise ValueError(f"Feature store {feature_store_version or 'LATEST'} não publicado. Materialize em /features/rf/build")
+    user_ids, movie_ids, ratings = load_ratings_from_postgres(pg_client)
+    if len(ratings) == 0:
+        raise ValueError("Nenhuma avaliação no PostgreSQL. Execute o ETL primeiro (/etl/run)")
+
+    model = RandomForestRegressor(
+        n_estimators=n_estimators,
+        max_depth=max_depth,
+        min_samples_split=min_samples_split,
+        n_jobs=-1,
+        random_state=42
+    )
+    model.fit(store.lookup(user_ids, movie_ids), ratings)
+    return model, store.feature_names, store.version
+
+
+def export_and_publish(
+    estimator,
+    feature_names=None,
+    metadata: Optional[Dict] = None,
+    minio_client=None,
+    set_latest: bool = True
+) -> Dict:
+    """
+    Converte o modelo sklearn em CompactForest e publica no MinIO
+
+    Args:
+        estimator: RandomForestRegressor treinado
+        feature_names: Ordem das features no treino (default: feature_names_in_ do modelo)
+        metadata: Informações extras gravadas no manifest (origem, feature store, ...)
+        minio_client: Cliente MinIO (opcional, criado se ausente)
+        set_latest: Se True, a versão passa a ser a servida pela API
+
+    Returns:
+        Dicionário com versão, tamanho e tempos
+    """
+    minio_client = minio_client or MinIOClient()
+    start = time.perf_counter()
+    forest = export_forest(estimator, feature_names, metadata)
+    save_forest_to_minio(minio_client, forest, set_latest=set_latest)
+    return {
+        "model_version": forest.model_version,
+        "n_trees": forest.n_trees,
+        "n_nodes": forest.n_nodes,
+        "max_depth": forest.max_depth,
+        "size_mb": round(forest.nbytes / 1e6, 2),
+        "n_features": len(forest.feature_names),
+        "total_seconds": round(time.perf_counter() - start, 3)
+    }
+
+
+def main():
+    """Função principal para execução via CLI"""
+    parser = argparse.ArgumentParser(description="Exporta o Random Forest para arrays NumPy no MinIO")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pickle", help="Arquivo .pkl com o RandomForestRegressor")
+    source.add_argument("--mlflow-run", help="Run do MLflow com o .pkl em models/")
+    source.add_argument("--train", action="store_true", help="Treina com os hiperparâmetros do notebook sobre o feature store")
+    parser.add_argument("--feature-names", default=None, help="Features na ordem do treino, separadas por vírgula (se o modelo não as guarda)")
+    parser.add_argument("--feature-store-version", default=None,
+                        help="Feature store usado no treino (obrigatório para --pickle; em --mlflow-run, default: parâmetro do run; em --train, default: LATEST)")
+    args = parser.parse_args()
+
+    try:
+        feature_names = args.feature_names.split(",") if args.feature_names else None
+        minio_client = MinIOClient()
+        if args.train:
+            start = time.perf_counter()
+            estimator, feature_names, store_version = train_random_forest(
+                PostgreSQLClient(), minio_client, feature_store_version=args.feature_store_version
+            )
+            metadata = {"source": "train", "feature_store_version": store_version,
+                        "train_seconds": round(time.perf_counter() - start, 3)}
+        else:
+            # Modelos importados: a API só os serve com o feature store exato do treino
+            # (no notebook, o store calculado só com rating_train e publicado sem LATEST)
+            if args.mlflow_run:
+                estimator = load_mlflow_model(args.mlflow_run)
+                store_version = args.feature_store_version or mlflow_feature_store_version(args.mlflow_run)
+                metadata = {"source": f"mlflow:{args.mlflow_run}"}
+            else:
+                estimator = load_pickled_model(args.pickle)
+                store_version = args.feature_store_version
+                metadata = {"source": os.path.basename(args.pickle)}
+            if not store_version:
+                raise ValueError("Informe --feature-store-version: a versão do feature store usada no treino do modelo")
+            store = load_features_from_minio(minio_client, store_version)
+            if store is None:
+                raise ValueError(f"Feature store {store_version} não publicado no MinIO")
+            if feature_names is None and not hasattr(estimator, "feature_names_in_"):
+                if len(store.feature_names) != estimator.n_features_in_:
+                    raise ValueError("O modelo não guarda os nomes das features; informe --feature-names")
+                feature_names = store.feature_names
+            missing = set(feature_names if feature_names is not None else estimator.feature_names_in_) - set(store.feature_names)
+            if missing:
+                raise ValueError(f"Features ausentes no feature store {store_version}: {sorted(missing)}")
+            metadata["feature_store_version"] = store_version
+
+        result = export_and_publish(estimator, feature_names, metadata, minio_client)
+        print(f"\n✅ Random Forest publicado: {result['model_version']}")
+        for key, value in result.items():
+            print(f"  {key}: {value}")
+        return 0
+    except Exception as e:
+        logger.error(f"Falha ao exportar Random Forest: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,433 @@
+"""
+Gerador de dados sintéticos no formato MovieLens para testes de escala
+Ajusta as distribuições ao ml-100k real e grava u.data/u.user/u.item e/ou CSVs estilo ml-25m
+"""
+import argparse
+import csv
+import logging
+import os
+import shutil
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE_DIR = "/data/archive/ml-100k"
+FORMATS = ("ml-100k", "ml-25m")
+
+# Usuários gerados por bloco (limita a memória a um bloco de avaliações)
+USER_CHUNK_SIZE = 5_000
+
+# Usuários por bloco de semente: cada um tem gerador próprio, então o resultado
+# não depende do tamanho dos blocos de escrita (arredondado para um múltiplo deste)
+SEED_BLOCK_USERS = 1_000
+
+# Dimensão dos fatores latentes usuário x filme (gostos correlacionados com os gêneros)
+N_FACTORS = 8
+
+# Fração da variância residual explicada pelos fatores latentes (o resto é ruído)
+FACTOR_VARIANCE_SHARE = 0.5
+
+# Usuários com mais avaliações que esta fração do catálogo são amostrados sem reposição exata
+HEAVY_USER_FRACTION = 0.25
+
+# Nomes de gêneros do ml-25m para as 19 colunas do u.item
+ML25M_GENRES = [
+    "(no genres listed)", "Action", "Adventure", "Animation", "Children",
+    "Comedy", "Crime", "Documentary", "Drama", "Fantasy",
+    "Film-Noir", "Horror", "Musical", "Mystery", "Romance",
+    "Sci-Fi", "Thriller", "War", "Western"
+]
+
+
+def read_source_ratings(source_dir: str) -> np.ndarray:
+    """
+    Lê as avaliações reais (u.data ou, se ausente, u1.base + u1.test)
+
+    Returns:
+        Array int64 [R, 4] com user_id, movie_id, rating, timestamp
+    """
+    paths = [os.path.join(source_dir, "u.data")]
+    if not os.path.exists(paths[0]):
+        # Os folds 1..5 particionam o u.data: base + test de um fold é o dataset completo
+        paths = [os.path.join(source_dir, "u1.base"), os.path.join(source_dir, "u1.test")]
+    frames = [pd.read_csv(path, sep="\t", header=None, dtype=np.int64) for path in paths]
+    return pd.concat(frames).to_numpy()
+
+
+def read_pipe_file(path: str) -> List[List[str]]:
+    """Lê um arquivo do MovieLens separado por | (latin-1)"""
+    with open(path, encoding="latin-1") as f:
+        return [line.rstrip("\n").split("|") for line in f if line.strip()]
+
+
+def fit_profile(source_dir: str = DEFAULT_SOURCE_DIR) -> Dict:
+    """
+    Ajusta as distribuições do gerador ao dataset real
+
+    Args:
+        source_dir: Diretório do ml-100k
+
+    Returns:
+        Dicionário com distribuição das notas, atividade por usuário,
+        curva de popularidade dos filmes, desvios dos vieses/resíduo,
+        tempos por usuário e as linhas reais de usuários e filmes
+    """
+    data = read_source_ratings(source_dir)
+    users, movies, ratings, timestamps = data[:, 0], data[:, 1], data[:, 2].astype(np.float64), data[:, 3]
+
+    _, user_idx, user_counts = np.unique(users, return_inverse=True, return_counts=True)
+    _, movie_idx, movie_counts = np.unique(movies, return_inverse=True, return_counts=True)
+
+    global_mean = ratings.mean()
+    user_bias = np.bincount(user_idx, weights=ratings) / user_counts - global_mean
+    movie_bias = np.bincount(movie_idx, weights=ratings) / movie_counts - global_mean
+    residual = ratings - global_mean - user_bias[user_idx] - movie_bias[movie_idx]
+
+    first_ts = np.full(len(user_counts), np.iinfo(np.int64).max)
+    last_ts = np.zeros(len(user_counts), dtype=np.int64)
+    np.minimum.at(first_ts, user_idx, timestamps)
+    np.maximum.at(last_ts, user_idx, timestamps)
+
+    levels, level_counts = np.unique(data[:, 2], return_counts=True)
+    popularity = np.sort(movie_counts)[::-1].astype(np.float64)
+
+    return {
+        "rating_levels": levels,
+        "rating_probs": level_counts / level_counts.sum(),
+        "user_counts": user_counts,
+        "popularity_curve": popularity / popularity.sum(),
+        "user_bias_std": float(user_bias.std()),
+        # Filmes com poucas avaliações têm média ruidosa; o desvio vem dos com 20+
+        "movie_bias_std": float(movie_bias[movie_counts >= 20].std()),
+        "residual_std": float(residual.std()),
+        "first_timestamps": first_ts,
+        "spans": last_ts - first_ts,
+        "users": read_pipe_file(os.path.join(source_dir, "u.user")),
+        "items": read_pipe_file(os.path.join(source_dir, "u.item")),
+        "source_dir": source_dir
+    }
+
+
+class SyntheticMovieLens:
+    """
+    Gera um dataset MovieLens sintético em blocos de usuários
+
+    Cada avaliação vem de um escore latente (viés do usuário + viés do
+    filme + fatores usuário x filme ligados aos gêneros + ruído),
+    discretizado com limiares que reproduzem a distribuição real das
+    notas. Filmes são escolhidos pela curva de popularidade (cauda longa)
+    reescalada para o tamanho do catálogo; o número de avaliações de cada
+    usuário segue a distribuição real, reescalada para o total pedido.
+
+    O resultado depende apenas da semente: cada bloco de
+    SEED_BLOCK_USERS usuários usa um gerador próprio derivado de
+    (seed, bloco), independente do tamanho dos blocos de escrita.
+    """
+
+    def __init__(self, profile: Dict, n_users: int, n_movies: int, n_ratings: int, seed: int = 42):
+        """
+        Args:
+            profile: Resultado de fit_profile
+            n_users: Número de usuários
+            n_movies: Número de filmes
+            n_ratings: Total aproximado de avaliações
+            seed: Semente
+        """
+        self.profile = profile
+        self.n_users = n_users
+        self.n_movies = n_movies
+        self.n_ratings = n_ratings
+        self.seed = seed
+        rng = np.random.default_rng([seed, 0])
+
+        # Popularidade: curva real interpolada no novo número de filmes, ids embaralhados
+        curve = profile["popularity_curve"]
+        real_ranks = (np.arange(len(curve)) + 0.5) / len(curve)
+        weights = np.interp((np.arange(n_movies) + 0.5) / n_movies, real_ranks, curve)
+        weights = weights[rng.permutation(n_movies)]
+        self.movie_weights = weights / weights.sum()
+        self.movie_cdf = np.cumsum(self.movie_weights)
+        self.movie_cdf[-1] = 1.0
+
+        # Filmes: linhas reais sorteadas (datas e gêneros), fatores ligados aos gêneros
+        self.item_source = rng.integers(0, len(profile["items"]), n_movies)
+        genres = np.array([[int(v) for v in row[5:24]] for row in profile["items"]], dtype=np.float32)
+        self.movie_genres = genres[self.item_source]
+        genre_factors = rng.standard_normal((genres.shape[1], N_FACTORS))
+        factors = self.movie_genres @ genre_factors + 0.5 * rng.standard_normal((n_movies, N_FACTORS))
+        self.movie_factors = (factors / np.linalg.norm(factors, axis=1, keepdims=True)).astype(np.float32)
+        self.movie_bias = (rng.standard_normal(n_movies) * profile["movie_bias_std"]).astype(np.float32)
+
+        residual_var = profile["residual_std"] ** 2
+        # Fatores de filme têm norma 1: cada dimensão do usuário com esta variância
+        # faz o produto interno ter FACTOR_VARIANCE_SHARE da variância residual
+        self.factor_std = float(np.sqrt(FACTOR_VARIANCE_SHARE * residual_var))
+        self.noise_std = float(np.sqrt((1 - FACTOR_VARIANCE_SHARE) * residual_var))
+
+        # Atividade: distribuição real reescalada para a média pedida
+        real_counts = profile["user_counts"]
+        self.activity_scale = n_ratings / (n_users * real_counts.mean())
+        self.min_ratings = int(min(real_counts.min(), n_movies))
+
+        self.thresholds = self._calibrate_thresholds(rng)
+
+    def _user_latents(self, rng: np.random.Generator, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Viés e fatores de n usuários"""
+        bias = (rng.standard_normal(n) * self.profile["user_bias_std"]).astype(np.float32)
+        factors = (rng.standard_normal((n, N_FACTORS)) * self.factor_std).astype(np.float32)
+        return bias, factors
+
+    def _scores(self, rng, user_bias, user_factors, owners, movies) -> np.ndarray:
+        """Escore latente de cada par (usuário do bloco, filme)"""
+        affinity = np.einsum("nd,nd->n", user_factors[owners], self.movie_factors[movies])
+        noise = rng.standard_normal(len(movies)).astype(np.float32) * self.noise_std
+        return user_bias[owners] + self.movie_bias[movies] + affinity + noise
+
+    def _calibrate_thresholds(self, rng: np.random.Generator, sample_size: int = 200_000) -> np.ndarray:
+        """Limiares do escore que reproduzem a proporção real de cada nota"""
+        user_bias, user_factors = self._user_latents(rng, 1000)
+        owners = rng.integers(0, 1000, sample_size)
+        movies = np.searchsorted(self.movie_cdf, rng.random(sample_size))
+        scores = self._scores(rng, user_bias, user_factors, owners, movies)
+        return np.quantile(scores, np.cumsum(self.profile["rating_probs"])[:-1])
+
+    def _user_counts(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        """Número de avaliações de n usuários (bootstrap da distribuição real, com ruído)"""
+        counts = rng.choice(self.profile["user_counts"], n) * self.activity_scale * np.exp(rng.normal(0, 0.1, n))
+        return np.clip(np.rint(counts), self.min_ratings, self.n_movies).astype(np.int64)
+
+    def _sample_movies(self, rng: np.random.Generator, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sorteia counts[u] filmes distintos por usuário, ponderados pela popularidade
+
+        Usuários comuns: sorteio com reposição + remoção de repetidos, com
+        novos sorteios só para quem ficou abaixo da meta. Usuários que
+        avaliam grande parte do catálogo: top-k com ruído de Gumbel
+        (amostragem ponderada sem reposição exata).
+
+        Returns:
+            Tupla (owner, movie) com o índice do usuário no bloco e o filme (0-based)
+        """
+        heavy = counts > HEAVY_USER_FRACTION * self.n_movies
+        owners_parts, movies_parts = [], []
+
+        light_users = np.flatnonzero(~heavy)
+        kept = np.empty(0, dtype=np.int64)
+        pending, need = light_users, counts[light_users]
+        while len(pending):
+            draws = np.ceil(need * 1.2).astype(np.int64) + 2
+            owners = np.repeat(pending, draws)
+            movies = np.searchsorted(self.movie_cdf, rng.random(len(owners)))
+            keys = np.concatenate([kept, owners * self.n_movies + movies])
+
+            # Mantém a primeira ocorrência de cada par, na ordem do sorteio
+            _, first = np.unique(keys, return_index=True)
+            keys = keys[np.sort(first)]
+            keys = keys[np.argsort(keys // self.n_movies, kind="stable")]
+            owner_of = keys // self.n_movies
+            starts = np.searchsorted(owner_of, owner_of, side="left")
+            rank = np.arange(len(keys)) - starts
+            kept = keys[rank < counts[owner_of]]
+
+            got = np.bincount(kept // self.n_movies, minlength=len(counts))
+            pending = light_users[got[light_users] < counts[light_users]]
+            need = counts[pending] - got[pending]
+        owners_parts.append(kept // self.n_movies)
+        movies_parts.append(kept % self.n_movies)
+
+        log_weights = np.log(self.movie_weights)
+        for u in np.flatnonzero(heavy):
+            keys = log_weights - np.log(-np.log(rng.random(self.n_movies)))
+            chosen = np.argpartition(-keys, counts[u] - 1)[:counts[u]]
+            owners_parts.append(np.full(len(chosen), u, dtype=np.int64))
+            movies_parts.append(chosen)
+
+        return np.concatenate(owners_parts), np.concatenate(movies_parts)
+
+    def _rating_block(self, block: int) -> Tuple[np.ndarray, ...]:
+        """Avaliações de um bloco de semente (SEED_BLOCK_USERS usuários, gerador (seed, 1, bloco))"""
+        rng = np.random.default_rng([self.seed, 1, block])
+        start = block * SEED_BLOCK_USERS
+        n = min(SEED_BLOCK_USERS, self.n_users - start)
+        user_bias, user_factors = self._user_latents(rng, n)
+        counts = self._user_counts(rng, n)
+
+        owners, movies = self._sample_movies(rng, counts)
+        scores = self._scores(rng, user_bias, user_factors, owners, movies)
+        ratings = self.profile["rating_levels"][np.searchsorted(self.thresholds, scores)]
+
+        # Cada usuário avalia ao longo do seu período de atividade (início e duração reais)
+        pick = rng.integers(0, len(self.profile["first_timestamps"]), n)
+        first, span = self.profile["first_timestamps"][pick], self.profile["spans"][pick]
+        timestamps = first[owners] + (rng.random(len(owners)) * (span[owners] + 1)).astype(np.int64)
+
+        return owners + start + 1, movies + 1, ratings, timestamps
+
+    def rating_chunks(self, chunk_size: int = USER_CHUNK_SIZE) -> Iterator[Tuple[np.ndarray, ...]]:
+        """
+        Gera as avaliações bloco a bloco de usuários
+
+        Cada bloco junta blocos de semente consecutivos (chunk_size é
+        arredondado para um múltiplo de SEED_BLOCK_USERS), na ordem dos
+        usuários; o conteúdo não depende de chunk_size.
+
+        Yields:
+            Tupla (user_ids, movie_ids, ratings, timestamps) de um bloco (ids 1-based)
+        """
+        blocks_per_chunk = max(1, -(-chunk_size // SEED_BLOCK_USERS))
+        n_blocks = -(-self.n_users // SEED_BLOCK_USERS)
+        for first in range(0, n_blocks, blocks_per_chunk):
+            parts = [self._rating_block(block) for block in range(first, min(first + blocks_per_chunk, n_blocks))]
+            yield tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+    def user_rows(self) -> Iterator[List[str]]:
+        """Linhas do u.user (perfil demográfico real sorteado, ids novos)"""
+        rng = np.random.default_rng([self.seed, 2])
+        source = self.profile["users"]
+        for start in range(0, self.n_users, USER_CHUNK_SIZE):
+            n = min(USER_CHUNK_SIZE, self.n_users - start)
+            for offset, i in enumerate(rng.integers(0, len(source), n)):
+                yield [str(start + offset + 1)] + source[i][1:5]
+
+    def movie_rows(self) -> Iterator[Tuple[int, str, str, List[int]]]:
+        """Filmes: (movie_id, título, data de lançamento, gêneros 0/1)"""
+        items = self.profile["items"]
+        for movie, source in enumerate(self.item_source):
+            release = items[source][2]
+            year = release[-4:] if release else ""
+            title = f"Synthetic Movie {movie + 1}" + (f" ({year})" if year else "")
+            yield movie + 1, title, release, self.movie_genres[movie].astype(int).tolist()
+
+
+def _write_ml100k_static(generator: SyntheticMovieLens, out_dir: str, n_ratings: int):
+    """u.user, u.item, u.info e arquivos de metadados copiados do dataset real"""
+    with open(os.path.join(out_dir, "u.user"), "w", encoding="latin-1") as f:
+        for row in generator.user_rows():
+            f.write("|".join(row) + "\n")
+    with open(os.path.join(out_dir, "u.item"), "w", encoding="latin-1") as f:
+        for movie_id, title, release, genres in generator.movie_rows():
+            f.write("|".join([str(movie_id), title, release, "", ""] + [str(g) for g in genres]) + "\n")
+    with open(os.path.join(out_dir, "u.info"), "w") as f:
+        f.write(f"{generator.n_users} users\n{generator.n_movies} items\n{n_ratings} ratings\n")
+    for name in ("u.genre", "u.occupation"):
+        source = os.path.join(generator.profile["source_dir"], name)
+        if os.path.exists(source):
+            shutil.copyfile(source, os.path.join(out_dir, name))
+
+
+def _write_ml25m_movies(generator: SyntheticMovieLens, out_dir: str):
+    """movies.csv (movieId,title,genres)"""
+    with open(os.path.join(out_dir, "movies.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["movieId", "title", "genres"])
+        for movie_id, title, _, genres in generator.movie_rows():
+            names = [ML25M_GENRES[i] for i, g in enumerate(genres) if g and i > 0]
+            writer.writerow([movie_id, title, "|".join(names) or ML25M_GENRES[0]])
+
+
+def write_dataset(
+    generator: SyntheticMovieLens,
+    output_dir: str,
+    formats: Tuple[str, ...] = FORMATS,
+    chunk_size: int = USER_CHUNK_SIZE
+) -> Dict:
+    """
+    Gera e grava o dataset em streaming (um bloco de usuários por vez)
+
+    ml-100k: u.data (tab, em ordem aleatória dentro de cada bloco de
+    semente, como o original), u.user, u.item, u.info, u.genre, u.occupation.
+    O conteúdo dos arquivos depende só da semente, não de chunk_size.
+    ml-25m: ratings.csv (ordenado por userId, movieId) e movies.csv.
+
+    Args:
+        generator: Gerador configurado
+        output_dir: Diretório de saída (subdiretórios ml-100k/ e ml-25m/)
+        formats: Formatos a gravar
+        chunk_size: Usuários por bloco
+
+    Returns:
+        Dicionário com contagens, arquivos gravados e tempo total
+    """
+    start = time.perf_counter()
+    dirs = {fmt: os.path.join(output_dir, fmt) for fmt in formats}
+    for directory in dirs.values():
+        os.makedirs(directory, exist_ok=True)
+
+    files = {}
+    if "ml-100k" in dirs:
+        files["ml-100k"] = open(os.path.join(dirs["ml-100k"], "u.data"), "w")
+    if "ml-25m" in dirs:
+        files["ml-25m"] = open(os.path.join(dirs["ml-25m"], "ratings.csv"), "w")
+        files["ml-25m"].write("userId,movieId,rating,timestamp\n")
+
+    total = 0
+    try:
+        for chunk, (users, movies, ratings, timestamps) in enumerate(generator.rating_chunks(chunk_size)):
+            frame = pd.DataFrame({"user_id": users, "movie_id": movies, "rating": ratings, "timestamp": timestamps})
+            if "ml-100k" in files:
+                # Embaralha cada bloco de semente (linhas contíguas, na ordem dos usuários)
+                blocks, starts, sizes = np.unique((users - 1) // SEED_BLOCK_USERS, return_index=True, return_counts=True)
+                order = np.concatenate([
+                    start + np.random.default_rng([generator.seed, 3, block]).permutation(size)
+                    for block, start, size in zip(blocks.tolist(), starts, sizes)
+                ])
+                frame.iloc[order].to_csv(files["ml-100k"], sep="\t", header=False, index=False)
+            if "ml-25m" in files:
+                sorted_frame = frame.sort_values(["user_id", "movie_id"]).assign(rating=lambda df: df["rating"].astype(float))
+                sorted_frame.to_csv(files["ml-25m"], header=False, index=False, float_format="%.1f")
+            total += len(frame)
+            logger.info(f"Bloco {chunk}: {len(frame)} avaliações ({total} no total)")
+    finally:
+        for f in files.values():
+            f.close()
+
+    if "ml-100k" in dirs:
+        _write_ml100k_static(generator, dirs["ml-100k"], total)
+    if "ml-25m" in dirs:
+        _write_ml25m_movies(generator, dirs["ml-25m"])
+
+    return {
+        "users": generator.n_users,
+        "movies": generator.n_movies,
+        "ratings": total,
+        "seed": generator.seed,
+        "output": {fmt: sorted(os.listdir(directory)) for fmt, directory in dirs.items()},
+        "total_seconds": round(time.perf_counter() - start, 3)
+    }
+
+
+def main():
+    """Função principal para geração via CLI"""
+    parser = argparse.ArgumentParser(description="Gera um dataset MovieLens sintético ajustado ao ml-100k")
+    parser.add_argument("--ratings", type=int, default=10_000_000, help="Total aproximado de avaliações")
+    parser.add_argument("--users", type=int, default=70_000, help="Número de usuários")
+    parser.add_argument("--movies", type=int, default=10_000, help="Número de filmes")
+    parser.add_argument("--seed", type=int, default=42, help="Semente (mesma semente = mesmos arquivos)")
+    parser.add_argument("--format", choices=FORMATS + ("both",), default="ml-100k", help="Formato dos arquivos")
+    parser.add_argument("--source", default=DEFAULT_SOURCE_DIR, help="Diretório do ml-100k real (ajuste das distribuições)")
+    parser.add_argument("--output", default="/tmp/movielens-synthetic", help="Diretório de saída")
+    parser.add_argument("--chunk-users", type=int, default=USER_CHUNK_SIZE, help=f"Usuários gerados por bloco (múltiplo de {SEED_BLOCK_USERS}; não muda o resultado)")
+    args = parser.parse_args()
+
+    try:
+        profile = fit_profile(args.source)
+        generator = SyntheticMovieLens(profile, args.users, args.movies, args.ratings, args.seed)
+        formats = FORMATS if args.format == "both" else (args.format,)
+        result = write_dataset(generator, args.output, formats, args.chunk_users)
+
+        print(f"\n✅ Dataset sintético gerado em {args.output} ({result['total_seconds']}s)")
+        for key, value in result.items():
+            print(f"  {key}: {value}")
+        return 0
+    except Exception as e:
+        logger.error(f"Falha ao gerar dataset: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,37 @@
+"""
+Configuração do gunicorn para produção: workers uvicorn pré-forkados
+
+O app é importado uma vez no mestre (preload_app) e os workers herdam os
+módulos já carregados no fork; clientes (MinIO, pool do PostgreSQL) e
+modelos são criados no lifespan de cada worker, depois do fork. Um worker
+que morre é substituído sem pagar o import de novo. Cada worker grava suas
+métricas em METRICS_DIR, somadas em /metrics.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Workers sem heartbeat por mais de `timeout` segundos são reiniciados
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Recicla workers após N requisições (0 desativa); o jitter evita reinícios simultâneos
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """Limpa os snapshots de métricas da execução anterior (os contadores recomeçam do zero)"""
+    metrics_dir = os.getenv("METRICS_DIR", "")
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -0,0 +1,128 @@
+"""
+Monitor de saúde em background para as dependências da API
+Executa as verificações em intervalos fixos e mantém o último estado em memória
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HealthMonitor:
+    """Executa probes periódicos por componente, com backoff exponencial em falhas"""
+
+    def __init__(
+        self,
+        probes: Dict[str, Callable[[], bool]],
+        interval: Optional[float] = None,
+        max_backoff: Optional[float] = None,
+        timeout: Optional[float] = None
+    ):
+        """
+        Inicializa o monitor
+
+        Args:
+            probes: Mapa componente -> função síncrona que retorna True se saudável
+            interval: Intervalo entre verificações com o componente saudável (s)
+            max_backoff: Intervalo máximo entre tentativas com o componente fora (s)
+            timeout: Tempo máximo de cada verificação (s)
+        """
+        self.probes = probes
+        self.interval = interval or float(os.getenv("HEALTH_PROBE_INTERVAL", "5"))
+        self.max_backoff = max_backoff or float(os.getenv("HEALTH_PROBE_MAX_BACKOFF", "60"))
+        self.timeout = timeout or float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))
+        self._state: Dict[str, Dict] = {
+            name: {
+                "healthy": False,
+                "latency_ms": None,
+                "checked_at": None,
+                "consecutive_failures": 0,
+                "error": "ainda não verificado"
+            }
+            for name in probes
+        }
+        self._tasks: List[asyncio.Task] = []
+        # Execução em andamento de cada probe: o timeout não interrompe a thread
+        self._running: Dict[str, asyncio.Future] = {}
+
+    async def _run_probe(self, name: str) -> bool:
+        """
+        Executa um probe em thread separada e atualiza o estado em cache
+
+        Se a execução anterior ainda não terminou (passou do timeout e a
+        thread continua presa), o probe não é disparado de novo e o
+        componente segue fora.
+        """
+        start = time.perf_counter()
+        error = None
+        running = self._running.get(name)
+        if running is not None and not running.done():
+            healthy = False
+            error = "verificação anterior ainda em andamento"
+        else:
+            running = self._running[name] = asyncio.ensure_future(asyncio.to_thread(self.probes[name]))
+            # Consome a exceção de execuções abandonadas pelo timeout
+            running.add_done_callback(lambda future: future.cancelled() or future.exception())
+            try:
+                healthy = bool(await asyncio.wait_for(asyncio.shield(running), timeout=self.timeout))
+            except asyncio.TimeoutError:
+                healthy = False
+                error = f"timeout após {self.timeout:.1f}s"
+            except Exception as e:
+                healthy = False
+                error = str(e)
+
+        state = self._state[name]
+        state["healthy"] = healthy
+        state["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        state["checked_at"] = datetime.utcnow().isoformat()
+        state["error"] = error if not healthy else None
+        state["consecutive_failures"] = 0 if healthy else state["consecutive_failures"] + 1
+        return healthy
+
+    def _next_delay(self, name: str) -> float:
+        """Intervalo até a próxima verificação (backoff exponencial quando fora)"""
+        failures = self._state[name]["consecutive_failures"]
+        if failures == 0:
+            return self.interval
+        return min(self.interval * (2 ** (failures - 1)), self.max_backoff)
+
+    async def _loop(self, name: str):
+        """Laço de verificação de um componente"""
+        while True:
+            await asyncio.sleep(self._next_delay(name))
+            try:
+                await self._run_probe(name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro inesperado no probe de saúde '{name}': {e}")
+
+    async def probe_all(self):
+        """Executa todos os probes uma vez, em paralelo"""
+        await asyncio.gather(*(self._run_probe(name) for name in self.probes))
+
+    async def start(self):
+        """Executa uma verificação inicial e inicia os laços em background"""
+        await self.probe_all()
+        self._tasks = [asyncio.create_task(self._loop(name)) for name in self.probes]
+        logger.info(f"Monitor de saúde iniciado (intervalo {self.interval}s)")
+
+    async def stop(self):
+        """Cancela os laços de verificação"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def is_healthy(self, name: str) -> bool:
+        """Retorna o último estado conhecido de um componente"""
+        return self._state[name]["healthy"]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Retorna uma cópia do estado de todos os componentes"""
+        return {name: dict(state) for name, state in self._state.items()}
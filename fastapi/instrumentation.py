@@ -0,0 +1,66 @@
+"""
+Ganchos de instrumentação dos clientes (PostgreSQL, MinIO)
+Os clientes marcam seus métodos com @instrumented; quem quiser medir registra um gancho
+"""
+import functools
+import logging
+import threading
+import time
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Gancho: (componente, operação, segundos)
+TimingHook = Callable[[str, str, float], None]
+
+_hooks: List[TimingHook] = []
+
+# Profundidade de chamadas instrumentadas na thread (só a mais externa é medida)
+_local = threading.local()
+
+
+def add_timing_hook(hook: TimingHook):
+    """Registra um gancho chamado ao fim de cada método instrumentado"""
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_timing_hook(hook: TimingHook):
+    """Remove um gancho registrado"""
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def instrumented(component: str):
+    """
+    Decorador de métodos de cliente medidos pelos ganchos
+
+    Sem ganchos registrados o método é chamado diretamente. Chamadas
+    aninhadas (ex.: get_table_info -> get_table_count) contam uma vez,
+    na mais externa. Exceções do método são propagadas normalmente; as
+    dos ganchos são apenas registradas no log.
+
+    Args:
+        component: Nome do componente (ex.: 'postgres', 'minio')
+    """
+    def decorator(method):
+        operation = method.__name__
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not _hooks or getattr(_local, "active", False):
+                return method(*args, **kwargs)
+            _local.active = True
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _local.active = False
+                for hook in tuple(_hooks):
+                    try:
+                        hook(component, operation, elapsed)
+                    except Exception as e:
+                        logger.error(f"Erro no gancho de instrumentação: {e}")
+        return wrapper
+    return decorator
@@ -43,6 +43,8 @@ def ingest_movielens_dataset():
             data = response.json()
             print("\n✅ Ingestão concluída com sucesso!")
             print(f"   - Arquivos enviados: {data['uploaded_count']}")
+            print(f"   - Arquivos idênticos (ignorados): {data.get('deduplicated_count', 0)}")
+            print(f"   - Bytes economizados: {data.get('bytes_saved', 0) / 1024:.2f} KB")
             print(f"   - Erros: {data['error_count']}")
             
             if data['uploaded_files']:
@@ -0,0 +1,560 @@
+"""
+Gerador de carga HTTP para a API (asyncio, sem dependências externas)
+Mede latência (histogramas no estilo HDR), taxa de erros e vazão por endpoint e compara com uma base salva
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Mistura padrão: endpoints de leitura mais usados (caminho:peso)
+DEFAULT_MIX = "/health:4,/postgres/top-movies?limit=10:3,/postgres/summary:2,/files:1"
+
+# Bits de sub-bucket do histograma: 2^11 sub-buckets = 3 dígitos significativos (~0,1%)
+HISTOGRAM_SUB_BITS = 11
+
+# Maior latência registrável (µs); acima disso o valor é truncado
+HISTOGRAM_MAX_US = 60_000_000
+
+# Percentis reportados
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Piora tolerada na comparação com a base (fração) e aumento tolerado da taxa de erros
+REGRESSION_THRESHOLD = 0.20
+ERROR_RATE_TOLERANCE = 0.01
+
+# Limite de requisições pendentes no modelo aberto (acima disso a chegada é descartada)
+MAX_PENDING = 10_000
+
+
+class LatencyHistogram:
+    """
+    Histograma de latências log-linear (no estilo HdrHistogram)
+
+    Valores em microssegundos. Abaixo de 2^sub_bits cada valor tem seu
+    próprio bucket; acima, cada potência de 2 é dividida em 2^(sub_bits-1)
+    buckets, o que mantém o erro relativo abaixo de 2^-(sub_bits-1) em
+    toda a faixa com memória fixa. Histogramas com os mesmos parâmetros
+    podem ser somados e serializados sem perder resolução.
+    """
+
+    def __init__(self, sub_bits: int = HISTOGRAM_SUB_BITS, max_us: int = HISTOGRAM_MAX_US):
+        self.sub_bits = sub_bits
+        self.max_us = max_us
+        self._half = 1 << (sub_bits - 1)
+        self.counts = np.zeros(self._index(max_us) + 1, dtype=np.int64)
+        self.total = 0
+        self.min_us = None
+        self.max_seen_us = 0
+        self.sum_us = 0
+
+    def _index(self, value: int) -> int:
+        shift = max(0, value.bit_length() - self.sub_bits)
+        if shift == 0:
+            return value
+        return (1 << self.sub_bits) + (shift - 1) * self._half + ((value >> shift) - self._half)
+
+    def _bucket_value(self, index: int) -> float:
+        """Ponto médio do bucket (valor reportado nos percentis)"""
+        full = 1 << self.sub_bits
+        if index < full:
+            return float(index)
+        shift = (index - full) // self._half + 1
+        low = ((index - full) % self._half + self._half) << shift
+        return low + ((1 << shift) - 1) / 2
+
+    def record(self, seconds: float):
+        """Registra uma latência (em segundos)"""
+        value = min(max(int(seconds * 1_000_000), 0), self.max_us)
+        self.counts[self._index(value)] += 1
+        self.total += 1
+        self.sum_us += value
+        self.min_us = value if self.min_us is None else min(self.min_us, value)
+        self.max_seen_us = max(self.max_seen_us, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        """Soma outro histograma (mesmos parâmetros) a este"""
+        self.counts += other.counts
+        self.total += other.total
+        self.sum_us += other.sum_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        self.max_seen_us = max(self.max_seen_us, other.max_seen_us)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Latência (ms) do percentil q (0-100)"""
+        if self.total == 0:
+            return None
+        rank = max(1, int(np.ceil(q / 100 * self.total)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return round(min(self._bucket_value(index), self.max_seen_us) / 1000, 3)
+
+    def summary(self) -> Dict:
+        """Contagem, média, mínimo, máximo e percentis (ms)"""
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum_us / self.total / 1000, 3) if self.total else None,
+            "min_ms": round(self.min_us / 1000, 3) if self.min_us is not None else None,
+            "max_ms": round(self.max_seen_us / 1000, 3),
+            **{f"p{q:g}_ms".replace(".", "_"): self.percentile(q) for q in PERCENTILES}
+        }
+
+    def to_dict(self) -> Dict:
+        """Forma serializável (apenas buckets não vazios)"""
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            "sub_bits": self.sub_bits,
+            "max_us": self.max_us,
+            "min_us": self.min_us,
+            "max_seen_us": self.max_seen_us,
+            "sum_us": self.sum_us,
+            "buckets": dict(zip(nonzero.tolist(), self.counts[nonzero].tolist()))
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LatencyHistogram":
+        histogram = cls(data["sub_bits"], data["max_us"])
+        for index, count in data["buckets"].items():
+            histogram.counts[int(index)] = count
+        histogram.total = int(histogram.counts.sum())
+        histogram.min_us = data["min_us"]
+        histogram.max_seen_us = data["max_seen_us"]
+        histogram.sum_us = data["sum_us"]
+        return histogram
+
+
+class EndpointStats:
+    """Latências, status e erros de um endpoint da mistura"""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.bytes = 0
+
+    def record(self, seconds: float, status: Optional[int], n_bytes: int = 0, error: Optional[str] = None):
+        self.histogram.record(seconds)
+        self.bytes += n_bytes
+        if status is not None:
+            self.statuses[status] += 1
+        if error is not None:
+            self.errors[error] += 1
+        elif status >= 400:
+            self.errors[f"HTTP {status}"] += 1
+
+    def report(self, duration: float) -> Dict:
+        count = self.histogram.total
+        failed = sum(self.errors.values())
+        return {
+            "requests": count,
+            "errors": failed,
+            "error_rate": round(failed / count, 4) if count else 0.0,
+            "throughput_rps": round(count / duration, 2) if duration > 0 else None,
+            "latency": self.histogram.summary(),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "error_types": dict(self.errors),
+            "bytes": self.bytes,
+            "histogram": self.histogram.to_dict()
+        }
+
+
+class HTTPConnection:
+    """Conexão HTTP/1.1 keep-alive mínima (GET, respostas com Content-Length ou chunked)"""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def _open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def _read_body(self, headers: Dict[str, str]) -> int:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            size = 0
+            while True:
+                chunk_size = int((await self.reader.readline()).split(b";")[0], 16)
+                if chunk_size == 0:
+                    # Trailers até a linha vazia
+                    while (await self.reader.readline()) not in (b"\r\n", b""):
+                        pass
+                    return size
+                await self.reader.readexactly(chunk_size + 2)
+                size += chunk_size
+        length = int(headers.get("content-length", "0"))
+        if length:
+            await self.reader.readexactly(length)
+        return length
+
+    async def _request(self, path: str) -> Tuple[int, int]:
+        if self.writer is None:
+            await self._open()
+        self.writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nAccept: */*\r\n\r\n".encode("latin-1")
+        )
+        await self.writer.drain()
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        size = await self._read_body(headers)
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, size
+
+    async def get(self, path: str) -> Tuple[int, int]:
+        """
+        Executa um GET
+
+        Returns:
+            Tupla (status, bytes do corpo)
+
+        Em qualquer falha a conexão é fechada (reaberta no próximo GET)
+        e a exceção é propagada.
+        """
+        try:
+            return await asyncio.wait_for(self._request(path), self.timeout)
+        except BaseException:
+            self.close()
+            raise
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """
+    Lê a mistura de endpoints 'caminho:peso,caminho:peso' (peso padrão 1)
+
+    Caminhos podem conter {id}, trocado a cada requisição por um inteiro
+    aleatório entre 1 e --max-id (ex.: /recommendations/{id}).
+    """
+    mix = []
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        path, _, weight = item.rpartition(":")
+        if not path or not weight.replace(".", "", 1).isdigit():
+            path, weight = item, "1"
+        if not path.startswith("/"):
+            raise ValueError(f"Caminho inválido na mistura: {path}")
+        mix.append((path, float(weight)))
+    if not mix:
+        raise ValueError("Mistura de endpoints vazia")
+    return mix
+
+
+class LoadTest:
+    """
+    Executa uma mistura de endpoints em modelo aberto ou fechado
+
+    Modelo aberto (rate): as requisições chegam em taxa fixa, independente
+    das respostas; a latência é medida a partir do instante programado
+    da chegada, então a espera por conexão livre entra na medida (sem
+    omissão coordenada). Modelo fechado (concurrency): N clientes enviam
+    a próxima requisição assim que recebem a resposta anterior.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        mix: List[Tuple[str, float]],
+        rate: Optional[float] = None,
+        concurrency: int = 10,
+        duration: float = 30,
+        warmup: float = 5,
+        connections: int = 64,
+        timeout: float = 10,
+        max_id: int = 943,
+        poisson: bool = False,
+        seed: int = 42
+    ):
+        """
+        Args:
+            base_url: URL da API (ex.: http://localhost:8000)
+            mix: Lista de (caminho, peso)
+            rate: Requisições/s no modelo aberto (None = modelo fechado)
+            concurrency: Clientes simultâneos no modelo fechado
+            duration: Duração medida (s)
+            warmup: Aquecimento antes da medida (s, descartado)
+            connections: Conexões keep-alive no modelo aberto
+            timeout: Timeout por requisição (s)
+            max_id: Maior valor sorteado para {id}
+            poisson: Chegadas com intervalos exponenciais em vez de fixos
+            seed: Semente da escolha de endpoints e dos intervalos
+        """
+        url = urlsplit(base_url)
+        if url.scheme != "http":
+            raise ValueError("Apenas http:// é suportado")
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip("/")
+        self.mix = mix
+        self.rate = rate
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.connections = connections
+        self.timeout = timeout
+        self.max_id = max_id
+        self.poisson = poisson
+        self.rng = random.Random(seed)
+
+        self._paths = [path for path, _ in mix]
+        self._weights = [weight for _, weight in mix]
+        self.stats: Dict[str, EndpointStats] = {path: EndpointStats() for path in self._paths}
+        self.dropped = 0
+        self._measure_from = 0.0
+        self._measure_until = 0.0
+
+    def _next_path(self) -> Tuple[str, str]:
+        path = self.rng.choices(self._paths, self._weights)[0]
+        url = path.replace("{id}", str(self.rng.randint(1, self.max_id))) if "{id}" in path else path
+        return path, self.prefix + url
+
+    async def _execute(self, connection: HTTPConnection, path: str, url: str, started: float):
+        """Envia um GET e registra o resultado se ele começou dentro da janela medida"""
+        status, size, error = None, 0, None
+        try:
+            status, size = await connection.get(url)
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            error = type(e).__name__
+        elapsed = time.perf_counter() - started
+        if self._measure_from <= started < self._measure_until:
+            self.stats[path].record(elapsed, status, size, error)
+
+    async def _closed_client(self):
+        connection = HTTPConnection(self.host, self.port, self.timeout)
+        try:
+            while time.perf_counter() < self._measure_until:
+                path, url = self._next_path()
+                await self._execute(connection, path, url, time.perf_counter())
+        finally:
+            connection.close()
+
+    async def _open_request(self, pool: asyncio.Queue, path: str, url: str, scheduled: float):
+        connection = await pool.get()
+        try:
+            await self._execute(connection, path, url, scheduled)
+        finally:
+            pool.put_nowait(connection)
+
+    async def _open_model(self):
+        pool: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.connections):
+            pool.put_nowait(HTTPConnection(self.host, self.port, self.timeout))
+
+        pending = set()
+        scheduled = time.perf_counter()
+        interval = 1 / self.rate
+        while scheduled < self._measure_until:
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            path, url = self._next_path()
+            if len(pending) >= MAX_PENDING:
+                if scheduled >= self._measure_from:
+                    self.dropped += 1
+            else:
+                task = asyncio.create_task(self._open_request(pool, path, url, scheduled))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            scheduled += self.rng.expovariate(self.rate) if self.poisson else interval
+            # Atrasado em relação ao agendamento, o laço não dorme: cede a vez para as requisições pendentes
+            await asyncio.sleep(0)
+
+        if pending:
+            await asyncio.wait(pending)
+        while not pool.empty():
+            pool.get_nowait().close()
+
+    async def run(self) -> Dict:
+        """Executa o teste e retorna o relatório"""
+        start = time.perf_counter()
+        self._measure_from = start + self.warmup
+        self._measure_until = self._measure_from + self.duration
+        mode = "open" if self.rate else "closed"
+        logger.info(
+            f"Carga {mode} em {self.host}:{self.port} por {self.duration}s (+{self.warmup}s de aquecimento): "
+            + (f"{self.rate} req/s" if self.rate else f"{self.concurrency} clientes")
+        )
+
+        if self.rate:
+            await self._open_model()
+        else:
+            await asyncio.gather(*(self._closed_client() for _ in range(self.concurrency)))
+
+        total = EndpointStats()
+        for stats in self.stats.values():
+            total.histogram.merge(stats.histogram)
+            total.statuses.update(stats.statuses)
+            total.errors.update(stats.errors)
+            total.bytes += stats.bytes
+
+        return {
+            "started_at": datetime.utcnow().isoformat(),
+            "target": f"http://{self.host}:{self.port}{self.prefix}",
+            "mode": mode,
+            "parameters": {
+                "rate": self.rate,
+                "poisson": self.poisson,
+                "concurrency": None if self.rate else self.concurrency,
+                "connections": self.connections if self.rate else self.concurrency,
+                "duration": self.duration,
+                "warmup": self.warmup,
+                "timeout": self.timeout,
+                "mix": [{"path": path, "weight": weight} for path, weight in self.mix]
+            },
+            "dropped": self.dropped,
+            "total": total.report(self.duration),
+            "endpoints": {path: stats.report(self.duration) for path, stats in self.stats.items()}
+        }
+
+
+# Parâmetros que precisam ser iguais aos da base para a comparação valer
+COMPARED_PARAMETERS = ("rate", "poisson", "concurrency")
+
+
+def compare_reports(
+    current: Dict,
+    baseline: Dict,
+    threshold: float = REGRESSION_THRESHOLD,
+    error_tolerance: float = ERROR_RATE_TOLERANCE
+) -> List[Dict]:
+    """
+    Compara p50/p99, vazão e taxa de erros de cada endpoint (e do total) com a base
+
+    Os dois relatórios precisam ter o mesmo modelo de carga (modo, taxa,
+    chegadas de Poisson e clientes): vazão e latência de cargas
+    diferentes não são comparáveis.
+
+    Returns:
+        Lista de comparações com os valores antes/depois e a flag 'regression'
+
+    Raises:
+        ValueError: Se o modelo de carga difere do da base
+    """
+    differences = [
+        f"{name}: {before} -> {after}"
+        for name, before, after in [("mode", baseline.get("mode"), current.get("mode"))] + [
+            (name, baseline["parameters"].get(name), current["parameters"].get(name))
+            for name in COMPARED_PARAMETERS
+        ]
+        if before != after
+    ]
+    if differences:
+        raise ValueError(f"Modelo de carga diferente da base ({', '.join(differences)}); rode com os mesmos parâmetros")
+    pairs = [("total", baseline["total"], current["total"])]
+    pairs += [
+        (path, baseline["endpoints"][path], current["endpoints"][path])
+        for path in current["endpoints"] if path in baseline["endpoints"]
+    ]
+    comparisons = []
+    for name, before, after in pairs:
+        checks = {
+            "p50_ms": (before["latency"]["p50_ms"], after["latency"]["p50_ms"], "up"),
+            "p99_ms": (before["latency"]["p99_ms"], after["latency"]["p99_ms"], "up"),
+            "throughput_rps": (before["throughput_rps"], after["throughput_rps"], "down")
+        }
+        for metric, (old, new, worse) in checks.items():
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            regression = change > threshold if worse == "up" else change < -threshold
+            comparisons.append({"endpoint": name, "metric": metric, "baseline": old, "current": new,
+                                "change": round(change, 4), "regression": regression})
+        error_change = after["error_rate"] - before["error_rate"]
+        comparisons.append({"endpoint": name, "metric": "error_rate", "baseline": before["error_rate"],
+                            "current": after["error_rate"], "change": round(error_change, 4),
+                            "regression": error_change > error_tolerance})
+    return comparisons
+
+
+def print_report(report: Dict):
+    print(f"\n📊 Carga {report['mode']} em {report['target']} ({report['parameters']['duration']}s)")
+    if report["dropped"]:
+        print(f"  ⚠️  {report['dropped']} chegadas descartadas (mais de {MAX_PENDING} requisições pendentes)")
+    rows = [("TOTAL", report["total"])] + list(report["endpoints"].items())
+    for name, r in rows:
+        lat = r["latency"]
+        print(
+            f"  {name:<36} {r['throughput_rps'] or 0:>9} req/s  erros {r['error_rate']:>7.2%}  "
+            f"p50 {lat['p50_ms']}ms  p90 {lat['p90_ms']}ms  p99 {lat['p99_ms']}ms  p99.9 {lat['p99_9_ms']}ms  max {lat['max_ms']}ms"
+        )
+
+
+def main():
+    """Função principal para execução do teste de carga via CLI"""
+    parser = argparse.ArgumentParser(description="Teste de carga HTTP da API (modelo aberto ou fechado)")
+    parser.add_argument("--url", default="http://localhost:8000", help="URL base da API")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Endpoints 'caminho:peso' separados por vírgula ({id} = id aleatório)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rate", type=float, help="Modelo aberto: requisições/s fixas")
+    mode.add_argument("--concurrency", type=int, default=10, help="Modelo fechado: clientes simultâneos")
+    parser.add_argument("--poisson", action="store_true", help="Modelo aberto com chegadas de Poisson")
+    parser.add_argument("--connections", type=int, default=64, help="Conexões keep-alive no modelo aberto")
+    parser.add_argument("--duration", type=float, default=30, help="Duração medida (s)")
+    parser.add_argument("--warmup", type=float, default=5, help="Aquecimento descartado (s)")
+    parser.add_argument("--timeout", type=float, default=10, help="Timeout por requisição (s)")
+    parser.add_argument("--max-id", type=int, default=943, help="Maior id sorteado para {id}")
+    parser.add_argument("--seed", type=int, default=42, help="Semente da mistura")
+    parser.add_argument("--output", help="Arquivo JSON para gravar o relatório")
+    parser.add_argument("--compare", help="Relatório base (JSON); falha se houver regressão")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Piora tolerada de p50/p99/vazão (fração)")
+    args = parser.parse_args()
+
+    try:
+        test = LoadTest(
+            args.url, parse_mix(args.mix), rate=args.rate, concurrency=args.concurrency,
+            duration=args.duration, warmup=args.warmup, connections=args.connections,
+            timeout=args.timeout, max_id=args.max_id, poisson=args.poisson, seed=args.seed
+        )
+        report = asyncio.run(test.run())
+        print_report(report)
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n✅ Relatório gravado em {args.output}")
+
+        if args.compare:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+            comparisons = compare_reports(report, baseline, args.threshold)
+            regressions = [c for c in comparisons if c["regression"]]
+            print(f"\n🔍 Comparação com {args.compare}")
+            for c in comparisons:
+                flag = "❌" if c["regression"] else "✓"
+                print(f"  {flag} {c['endpoint']:<36} {c['metric']:<15} {c['baseline']} -> {c['current']} ({c['change']:+.1%})")
+            if regressions:
+                print(f"\n❌ {len(regressions)} regressões em relação à base")
+                return 1
+        return 0
+    except Exception as e:
+        logger.error(f"Falha no teste de carga: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -3,61 +3,321 @@ FastAPI - Sistema de Ingestão de Dados MovieLens
 Parte do pipeline de ML para Sistema de Recomendação de Filmes
 """
 import os
-from typing import List, Optional
+import time
+import asyncio
+import importlib
+import threading
+from typing import Dict, List, Optional
 from datetime import datetime
-import io
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, status
-from fastapi.responses import JSONResponse
-import boto3
-from botocore.exceptions import ClientError
-import pandas as pd
-from pydantic import BaseModel
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, File, UploadFile, HTTPException, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
 
 from minio_client import MinIOClient
-from postgres_client import PostgreSQLClient
-from etl_minio_postgres import MovieLensETL
+from postgres_client import SIMILARITIES_EVENT, PostgreSQLClient
+from object_compression import normalize_codec
+from health_monitor import HealthMonitor
+from rating_writer import RatingQueueFull, RatingWriter
+from request_profiling import LoopLagMonitor, MetricsRegistry, ProfilingExecutor, ProfilingMiddleware, RequestProfiler, SharedMetrics
+from startup_profile import StartupTimer
+from recommender import get_latest_version, load_model_from_minio
+from recommender.evaluation import error_metrics
+from recommender.features import get_latest_feature_version, load_features_from_minio
+from recommender.forest import get_latest_forest_version, load_forest_from_minio
+from batch_recommendations import generate_and_store_recommendations, recommendations_event
+from recommender.batch import ALGORITHMS
 
 from contextlib import asynccontextmanager
 
-# Inicializar clientes
-minio_client = MinIOClient()
+# Clientes criados no lifespan de cada worker (depois do fork, quando há preload)
+minio_client = None
 pg_client = None  # Será inicializado no startup
+_pg_client_lock = threading.Lock()  # Criação do pool pelo probe de saúde
+recommender_model = None  # Carregado do MinIO no startup (última versão publicada)
+published_versions: Dict[str, tuple] = {}  # Evento de db_metadata -> (versão publicada, lida em)
+rf_features = None  # Feature store do Random Forest (última versão publicada no MinIO)
+rf_forest = None  # Random Forest compacto (arrays NumPy) servido em /predict/rf/batch
+model_refresh_task = None  # Tarefa que acompanha os ponteiros LATEST do MinIO
+
+# Intervalo (s) para reler em db_metadata as versões publicadas (jobs de outros processos)
+PUBLISHED_VERSION_TTL = float(os.getenv("PUBLISHED_VERSION_TTL", "30"))
+
+# Intervalo (s) para conferir os ponteiros LATEST do MinIO e recarregar os modelos (0 desativa)
+MODEL_REFRESH_INTERVAL = float(os.getenv("MODEL_REFRESH_INTERVAL", "30"))
 
 def get_pg_client():
     """
-    Retorna o cliente PostgreSQL, tentando inicializar se necessário
+    Retorna o cliente PostgreSQL atual (ou None se indisponível)
+    
+    A (re)conexão é feita pelo monitor de saúde em background, nunca
+    no caminho da requisição.
+    """
+    return pg_client
+
+
+async def get_published_version(client, event: str) -> Optional[str]:
+    """
+    Versão publicada de um evento de db_metadata, relida a cada PUBLISHED_VERSION_TTL segundos
+
+    Publicações feitas por outro worker ou por um job via CLI passam a
+    ser servidas em até um TTL.
+    """
+    cached = published_versions.get(event)
+    if cached is None or time.monotonic() - cached[1] > PUBLISHED_VERSION_TTL:
+        version = await asyncio.to_thread(client.get_published_version, event)
+        cached = published_versions[event] = (version, time.monotonic())
+    return cached[0]
+
+
+def set_published_version(event: str, version: str):
+    """Registra a versão recém-publicada por este processo (sem esperar o TTL)"""
+    published_versions[event] = (version, time.monotonic())
+
+
+async def _import_job(module: str, name: str):
+    """
+    Importa sob demanda a função de um job (ETL, treino, similaridades, features)
+
+    Os jobs trazem pandas, SciPy e scikit-learn, que ficam fora da
+    inicialização da API; o primeiro import roda numa thread para não
+    bloquear o event loop.
+    """
+    return getattr(await asyncio.to_thread(importlib.import_module, module), name)
+
+
+def _probe_minio() -> bool:
+    """Probe de saúde do MinIO (falso até o cliente ser criado no lifespan)"""
+    return minio_client is not None and minio_client.check_connection()
+
+
+def _probe_bucket() -> bool:
+    """Probe de saúde do bucket (falso até o cliente ser criado no lifespan)"""
+    return minio_client is not None and minio_client.bucket_exists()
+
+
+def _probe_postgres() -> bool:
+    """
+    Probe de saúde do PostgreSQL, recriando o pool se necessário
+
+    A criação é protegida por lock: um probe que estourou o timeout
+    continua na thread e não pode criar um segundo pool.
     """
     global pg_client
-    if pg_client is None:
-        try:
+    with _pg_client_lock:
+        if pg_client is None:
             pg_client = PostgreSQLClient()
-            if not pg_client.check_connection():
-                print(f"⚠️ Tentativa de conexão PostgreSQL falhou")
-                pg_client = None
-            else:
-                print(f"✅ Conexão PostgreSQL restabelecida com sucesso!")
+            print(f"✅ Pool PostgreSQL criado, verificando conexão...")
+    return pg_client.check_connection()
+
+
+def load_recommender_model(model_version: Optional[str] = None):
+    """
+    Carrega o modelo de recomendação do MinIO (default: última versão)
+    """
+    global recommender_model
+    try:
+        model = load_model_from_minio(minio_client, model_version)
+        if model is None:
+            print(f"ℹ️  Nenhum modelo de recomendação publicado no MinIO")
+        else:
+            recommender_model = model
+            print(f"✅ Modelo de recomendação carregado: {model.model_version}")
+    except Exception as e:
+        print(f"⚠️ Erro ao carregar modelo de recomendação: {e}")
+    return recommender_model
+
+
+def load_rf_features(version: Optional[str] = None):
+    """
+    Carrega o feature store do Random Forest do MinIO (default: última versão)
+    """
+    global rf_features
+    try:
+        store = load_features_from_minio(minio_client, version)
+        if store is None:
+            print(f"ℹ️  Nenhum feature store do Random Forest publicado no MinIO")
+        else:
+            rf_features = store
+            print(f"✅ Features do Random Forest carregadas: {store.version}")
+    except Exception as e:
+        print(f"⚠️ Erro ao carregar features do Random Forest: {e}")
+    return rf_features
+
+
+def load_rf_forest(model_version: Optional[str] = None):
+    """
+    Carrega o Random Forest compacto do MinIO (default: última versão)
+    """
+    global rf_forest
+    try:
+        forest = load_forest_from_minio(minio_client, model_version)
+        if forest is None:
+            print(f"ℹ️  Nenhum Random Forest publicado no MinIO")
+        else:
+            rf_forest = forest
+            print(f"✅ Random Forest carregado: {forest.model_version} ({forest.n_trees} árvores)")
+    except Exception as e:
+        print(f"⚠️ Erro ao carregar Random Forest: {e}")
+    return rf_forest
+
+
+def forest_feature_version(forest) -> Optional[str]:
+    """Versão do feature store usada no treino do Random Forest (None em modelos exportados sem ela, que não são servidos)"""
+    return forest.metadata.get("feature_store_version")
+
+
+def load_rf_models(model_version: Optional[str] = None):
+    """
+    Carrega o Random Forest e, em seguida, o feature store com que ele foi treinado
+
+    Para modelos sem feature_store_version (recusados em
+    /predict/rf/batch), as features ficam na versão já carregada (ou a
+    última publicada), usada por /features/rf.
+    """
+    forest = load_rf_forest(model_version)
+    version = forest_feature_version(forest) if forest is not None else None
+    if rf_features is None or (version and rf_features.version != version):
+        load_rf_features(version)
+    return forest
+
+
+def refresh_models() -> List[str]:
+    """
+    Recarrega os modelos cuja versão carregada difere da apontada por LATEST no MinIO
+
+    Cada worker tem sua cópia dos modelos: uma publicação (treino,
+    /features/rf/build, export_rf_model.py) ou um reload chega só ao
+    worker que atendeu a requisição, e os demais convergem por aqui.
+    As features do Random Forest seguem a versão registrada na floresta,
+    quando houver; senão, o LATEST do feature store.
+
+    Returns:
+        Nomes dos modelos recarregados
+    """
+    reloaded = []
+    latest = get_latest_version(minio_client)
+    if latest and (recommender_model is None or recommender_model.model_version != latest):
+        load_recommender_model(latest)
+        reloaded.append("recommender")
+
+    latest = get_latest_forest_version(minio_client)
+    if latest and (rf_forest is None or rf_forest.model_version != latest):
+        load_rf_models(latest)
+        reloaded.append("rf_forest")
+    else:
+        version = (forest_feature_version(rf_forest) if rf_forest is not None else None) or get_latest_feature_version(minio_client)
+        if version and (rf_features is None or rf_features.version != version):
+            load_rf_features(version)
+            reloaded.append("rf_features")
+    return reloaded
+
+
+async def model_refresh_loop():
+    """Confere os ponteiros LATEST a cada MODEL_REFRESH_INTERVAL segundos"""
+    while True:
+        await asyncio.sleep(MODEL_REFRESH_INTERVAL)
+        try:
+            reloaded = await asyncio.to_thread(refresh_models)
+            if reloaded:
+                print(f"🔄 Worker {os.getpid()} recarregou: {', '.join(reloaded)}")
         except Exception as e:
-            print(f"⚠️ Erro ao reconectar PostgreSQL: {e}")
-            pg_client = None
-    
-    return pg_client
+            print(f"⚠️ Erro ao conferir modelos publicados no MinIO: {e}")
+
+
+def get_recommender_model():
+    """Retorna o modelo carregado ou HTTP 503 se nenhum modelo está disponível"""
+    if recommender_model is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Modelo de recomendação não carregado. Treine um modelo em /recommender/train"
+        )
+    return recommender_model
+
+
+# Monitor de saúde: verificações em background, endpoints leem o estado em cache
+health_monitor = HealthMonitor({
+    "minio": _probe_minio,
+    "bucket": _probe_bucket,
+    "postgres": _probe_postgres,
+})
+
+# Writer de avaliações: POST /ratings enfileira, o writer grava em micro-lotes com COPY
+rating_writer = RatingWriter(get_pg_client)
+
+# Perfil por requisição (Server-Timing, /metrics e dumps de requisições lentas)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() in ("1", "true", "yes")
+metrics = MetricsRegistry()
+loop_lag_monitor = LoopLagMonitor(metrics)
+# Com vários workers, cada um grava seus contadores em METRICS_DIR e /metrics soma todos (vazio: só o worker que respondeu)
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+shared_metrics = SharedMetrics(metrics, METRICS_DIR) if METRICS_DIR else None
+request_profiler = RequestProfiler() if PROFILING_ENABLED else None
+if PROFILING_ENABLED:
+    metrics.install()
+
+# Fases da inicialização deste processo (import no mestre, com preload; o resto no worker)
+startup = StartupTimer()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Inicializa o bucket do MinIO e conexão PostgreSQL na inicialização da aplicação"""
-    global pg_client
+    """
+    Cria os clientes e carrega os modelos na inicialização de cada worker
+
+    Com gunicorn e preload_app, o import acontece uma vez no mestre e o
+    lifespan roda em cada worker depois do fork: conexões (MinIO,
+    pool do PostgreSQL) nunca são compartilhadas entre processos.
+    """
+    global minio_client, model_refresh_task
+    
+    # Perfis amostrados cobrem também o trabalho de asyncio.to_thread
+    if request_profiler is not None and request_profiler.enabled:
+        asyncio.get_running_loop().set_default_executor(ProfilingExecutor(request_profiler))
     
     # MinIO
-    minio_client.create_bucket_if_not_exists()
+    with startup.phase("minio"):
+        minio_client = MinIOClient()
+        minio_client.create_bucket_if_not_exists()
     print(f"✅ Bucket '{minio_client.bucket_name}' verificado/criado com sucesso!")
     
-    # PostgreSQL - tentar conectar, mas não falhar se o banco não estiver pronto
-    get_pg_client()
+    # PostgreSQL - a primeira verificação tenta conectar, mas não falha se o banco não estiver pronto
+    with startup.phase("postgres"):
+        await health_monitor.start()
+    await rating_writer.start()
+    if PROFILING_ENABLED:
+        await loop_lag_monitor.start()
+    if shared_metrics is not None:
+        await shared_metrics.start()
+    
+    # Modelos - a API sobe mesmo sem modelo publicado; as features do Random Forest
+    # dependem da versão registrada na floresta, o modelo de recomendação é independente
+    with startup.phase("models"):
+        await asyncio.gather(
+            asyncio.to_thread(load_recommender_model),
+            asyncio.to_thread(load_rf_models)
+        )
+    
+    if MODEL_REFRESH_INTERVAL > 0:
+        model_refresh_task = asyncio.create_task(model_refresh_loop())
+    
+    summary = startup.summary()
+    metrics.record_startup(summary)
+    ready = f" em {summary['process']:.2f}s" if "process" in summary else ""
+    print(f"✅ Worker {os.getpid()} pronto{ready} (" + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in summary.items() if phase != "process") + ")")
     
     yield
     
     # Clean up (se necessário)
+    if model_refresh_task is not None:
+        model_refresh_task.cancel()
+        await asyncio.gather(model_refresh_task, return_exceptions=True)
+    await loop_lag_monitor.stop()
+    if shared_metrics is not None:
+        await shared_metrics.stop()
+    await rating_writer.stop()
+    await health_monitor.stop()
     if pg_client:
         pg_client.close()
 
@@ -68,6 +328,7 @@ class HealthResponse(BaseModel):
     bucket_exists: bool
     postgres_connected: bool
     timestamp: str
+    checks: Dict[str, Dict] = {}
 
 
 class FileInfo(BaseModel):
@@ -83,6 +344,103 @@ class UploadResponse(BaseModel):
     size: int
     bucket: str
     object_key: str
+    deduplicated: bool = False
+    bytes_saved: int = 0
+    stored_size: Optional[int] = None
+    compression: Optional[str] = None
+
+
+class BulkDeleteRequest(BaseModel):
+    prefix: Optional[str] = None
+    keys: Optional[List[str]] = None
+    dry_run: bool = False
+
+
+class BulkDeleteError(BaseModel):
+    key: Optional[str]
+    code: Optional[str]
+    message: Optional[str]
+
+
+class BulkDeleteResponse(BaseModel):
+    matched: int
+    deleted: int
+    batches: int
+    dry_run: bool
+    duration_seconds: float
+    error_count: int
+    errors: List[BulkDeleteError]
+
+
+class PredictRequest(BaseModel):
+    user_id: int
+    movie_id: int
+    top_n: int = 10
+
+
+class PredictResponse(BaseModel):
+    user_id: int
+    movie_id: int
+    predicted_rating: float
+    model_version: str
+
+
+class BatchPredictRequest(BaseModel):
+    user_ids: List[int]
+    movie_ids: List[int]
+    ratings: Optional[List[float]] = None  # Notas reais (opcional, para calcular RMSE/MAE)
+    top_n: int = 10
+
+
+class RFBatchPredictRequest(BaseModel):
+    user_ids: List[int]
+    movie_ids: List[int]
+    ratings: Optional[List[float]] = None  # Notas reais (opcional, para calcular RMSE/MAE)
+
+
+class BatchPredictResponse(BaseModel):
+    model_version: str
+    count: int
+    predictions: List[float]
+    metrics: Optional[Dict[str, float]] = None
+    duration_ms: float
+
+
+# Faixas aceitas nas avaliações: ids cabem em INTEGER do PostgreSQL e o
+# timestamp precisa virar um datetime válido (rated_at); até 2100-01-01 UTC
+PG_INT_MAX = 2**31 - 1
+MAX_RATING_TIMESTAMP = 4_102_444_800
+
+
+class RatingSubmission(BaseModel):
+    user_id: int = Field(..., ge=1, le=PG_INT_MAX)
+    movie_id: int = Field(..., ge=1, le=PG_INT_MAX)
+    rating: int = Field(..., ge=1, le=5)
+    timestamp: Optional[int] = Field(None, ge=0, le=MAX_RATING_TIMESTAMP)  # Unix epoch (default: momento do envio)
+
+
+class RatingsBatchRequest(BaseModel):
+    ratings: List[RatingSubmission]
+
+
+class RatingsWriteResponse(BaseModel):
+    status: str  # 'written' (gravado, ack) ou 'queued' (fire-and-forget)
+    count: int
+    written: Optional[int] = None
+    rejected: List[Dict[str, int]] = []
+    duration_ms: float
+
+
+class RecommendedMovie(BaseModel):
+    movie_id: int
+    predicted_rating: float
+
+
+class RecommendationsResponse(BaseModel):
+    user_id: int
+    model_version: str
+    known_user: bool
+    recommendations: List[RecommendedMovie]
 
 
 # Inicializar FastAPI
@@ -93,6 +451,9 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, registry=metrics, profiler=request_profiler)
+
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -104,31 +465,76 @@ async def root():
             "health": "/health",
             "upload": "/upload",
             "files": "/files",
-            "download": "/download/{filename}"
+            "download": "/download/{filename}",
+            "recommendations": "/recommendations/{user_id}",
+            "predict": "/predict",
+            "predict_rf": "/predict/rf/batch",
+            "ratings": "/ratings",
+            "metrics": "/metrics",
+            "similar_movies": "/movies/{movie_id}/similar",
+            "rf_features": "/features/rf/{user_id}/{movie_id}"
         }
     }
 
 
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
-    """Verifica a saúde da API e conexão com MinIO e PostgreSQL"""
-    minio_connected = minio_client.check_connection()
-    bucket_exists = minio_client.bucket_exists()
-    postgres_connected = pg_client.check_connection() if pg_client else False
+    """
+    Verifica a saúde da API e conexão com MinIO e PostgreSQL
+    
+    Retorna o último estado coletado pelo monitor em background
+    (sem chamadas de rede no caminho da requisição), incluindo a
+    latência de cada verificação.
+    """
+    minio_connected = health_monitor.is_healthy("minio")
+    bucket_exists = health_monitor.is_healthy("bucket")
+    postgres_connected = health_monitor.is_healthy("postgres")
     
     return HealthResponse(
         status="healthy" if (minio_connected and bucket_exists and postgres_connected) else "partial",
         minio_connected=minio_connected,
         bucket_exists=bucket_exists,
         postgres_connected=postgres_connected,
-        timestamp=datetime.utcnow().isoformat() 
+        timestamp=datetime.utcnow().isoformat(),
+        checks=health_monitor.snapshot()
     )
 
 
+def _validate_compression(compression: Optional[str]) -> Optional[str]:
+    """Valida o codec de compressão recebido como parâmetro (HTTP 400 se inválido)"""
+    if compression is None:
+        return None
+    try:
+        return normalize_codec(compression) or "none"
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Health"])
+async def get_metrics():
+    """
+    Métricas no formato texto do Prometheus
+
+    Histogramas por rota do tempo total e do tempo gasto no PostgreSQL,
+    no MinIO e no restante (serialização, CPU, espera no event loop),
+    duração das chamadas de cada cliente e atraso do event loop.
+    Com METRICS_DIR, soma os snapshots de todos os workers do gunicorn.
+    """
+    if shared_metrics is not None:
+        text = await asyncio.to_thread(shared_metrics.exposition)
+    else:
+        text = metrics.exposition()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
 @app.post("/upload", response_model=UploadResponse, tags=["Data Ingestion"])
 async def upload_file(
     file: UploadFile = File(...),
-    folder: Optional[str] = "raw"
+    folder: Optional[str] = "raw",
+    compression: Optional[str] = None
 ):
     """
     Upload de arquivo para o MinIO
@@ -136,39 +542,50 @@ async def upload_file(
     Args:
         file: Arquivo a ser enviado
         folder: Pasta dentro do bucket (default: 'raw')
+        compression: 'gzip', 'zstd' ou 'none' (default: MINIO_COMPRESSION)
     
     Returns:
         Informações sobre o arquivo enviado
     """
     try:
-        # Ler conteúdo do arquivo
-        contents = await file.read()
-        file_size = len(contents)
-        
+        compression = _validate_compression(compression)
+
         # Definir chave do objeto (caminho no bucket)
         object_key = f"{folder}/{file.filename}"
         
-        # Upload para MinIO
-        success = minio_client.upload_file(
-            file_data=contents,
+        # Upload para MinIO em streaming, ignorando conteúdo idêntico (hash, compressão
+        # e chamadas S3 numa thread, fora do event loop)
+        result = await asyncio.to_thread(
+            minio_client.upload_stream_dedup,
+            stream=file.file,
             object_name=object_key,
-            content_type=file.content_type or "application/octet-stream"
+            content_type=file.content_type or "application/octet-stream",
+            compression=compression
         )
         
-        if not success:
+        if not result["success"]:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Falha ao fazer upload do arquivo para MinIO"
             )
         
         return UploadResponse(
-            message="Arquivo enviado com sucesso!",
+            message=(
+                "Arquivo idêntico já existe, upload ignorado"
+                if result["deduplicated"] else "Arquivo enviado com sucesso!"
+            ),
             filename=file.filename,
-            size=file_size,
+            size=result["size"],
             bucket=minio_client.bucket_name,
-            object_key=object_key
+            object_key=object_key,
+            deduplicated=result["deduplicated"],
+            bytes_saved=result["bytes_saved"],
+            stored_size=result["stored_size"],
+            compression=result["compression"]
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -231,7 +648,7 @@ async def download_file(file_path: str):
         return JSONResponse(
             content={
                 "filename": file_path,
-                "size": len(file_data),
+                "size": len(file_data),  # Tamanho já descomprimido
                 "message": "Arquivo baixado com sucesso"
             }
         )
@@ -245,6 +662,51 @@ async def download_file(file_path: str):
         )
 
 
+@app.post("/files/bulk-delete", response_model=BulkDeleteResponse, tags=["Data Management"])
+async def bulk_delete_files(request: BulkDeleteRequest):
+    """
+    Remove arquivos em massa do MinIO por prefixo ou lista de chaves
+    
+    Usa DeleteObjects em lotes de 1.000 chaves, executados em paralelo.
+    Com dry_run=True apenas conta os objetos que seriam removidos.
+    
+    Args:
+        request: Prefixo (não vazio) ou lista de chaves, e flag dry_run
+    
+    Returns:
+        Contagem de objetos encontrados/removidos e erros por chave
+    """
+    if not request.prefix and not request.keys:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe um prefixo não vazio ou uma lista de chaves"
+        )
+    
+    try:
+        result = await asyncio.to_thread(
+            minio_client.delete_objects_bulk,
+            prefix=request.prefix,
+            keys=request.keys,
+            dry_run=request.dry_run
+        )
+        
+        return BulkDeleteResponse(
+            matched=result["matched"],
+            deleted=result["deleted"],
+            batches=result["batches"],
+            dry_run=result["dry_run"],
+            duration_seconds=result["duration_seconds"],
+            error_count=len(result["errors"]),
+            errors=result["errors"]
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao remover arquivos em massa: {str(e)}"
+        )
+
+
 @app.delete("/files/{file_path:path}", tags=["Data Management"])
 async def delete_file(file_path: str):
     """
@@ -280,14 +742,19 @@ async def delete_file(file_path: str):
 
 
 @app.post("/ingest/movielens", tags=["Data Ingestion"])
-async def ingest_movielens_dataset():
+async def ingest_movielens_dataset(compression: Optional[str] = None):
     """
     Ingere o dataset MovieLens completo do diretório /data/archive para o MinIO
     
     Este endpoint lê todos os arquivos do dataset e os envia para o MinIO
     organizados por tipo (ratings, users, items, etc.)
+    
+    Args:
+        compression: 'gzip', 'zstd' ou 'none' (default: MINIO_COMPRESSION)
     """
     try:
+        compression = _validate_compression(compression)
+
         archive_path = "/data/archive/ml-100k"
         
         if not os.path.exists(archive_path):
@@ -298,6 +765,7 @@ async def ingest_movielens_dataset():
         
         uploaded_files = []
         errors = []
+        bytes_saved = 0
         
         # Arquivos principais do MovieLens
         files_to_upload = {
@@ -309,25 +777,32 @@ async def ingest_movielens_dataset():
             "u.info": "metadata/u.info"
         }
         
+        def upload(file_path: str, object_key: str):
+            with open(file_path, 'rb') as f:
+                return minio_client.upload_stream_dedup(
+                    stream=f,
+                    object_name=f"movielens/{object_key}",
+                    content_type="text/plain",
+                    compression=compression
+                )
+        
         for filename, object_key in files_to_upload.items():
             file_path = os.path.join(archive_path, filename)
             
             if os.path.exists(file_path):
                 try:
-                    with open(file_path, 'rb') as f:
-                        file_data = f.read()
-                    
-                    success = minio_client.upload_file(
-                        file_data=file_data,
-                        object_name=f"movielens/{object_key}",
-                        content_type="text/plain"
-                    )
+                    # Um arquivo por vez numa thread: o event loop continua atendendo
+                    result = await asyncio.to_thread(upload, file_path, object_key)
                     
-                    if success:
+                    if result["success"]:
+                        bytes_saved += result["bytes_saved"]
                         uploaded_files.append({
                             "filename": filename,
                             "object_key": f"movielens/{object_key}",
-                            "size": len(file_data)
+                            "size": result["size"],
+                            "stored_size": result["stored_size"],
+                            "compression": result["compression"],
+                            "deduplicated": result["deduplicated"]
                         })
                     else:
                         errors.append(f"Falha ao enviar {filename}")
@@ -340,6 +815,8 @@ async def ingest_movielens_dataset():
         return {
             "message": "Ingestão do dataset MovieLens concluída",
             "uploaded_count": len(uploaded_files),
+            "deduplicated_count": sum(1 for f in uploaded_files if f["deduplicated"]),
+            "bytes_saved": bytes_saved,
             "error_count": len(errors),
             "uploaded_files": uploaded_files,
             "errors": errors if errors else None
@@ -369,11 +846,12 @@ async def postgres_health():
             detail="Cliente PostgreSQL não inicializado"
         )
     
-    connected = client.check_connection()
+    connected = health_monitor.is_healthy("postgres")
     
     return {
         "postgres_connected": connected,
         "status": "healthy" if connected else "unhealthy",
+        "check": health_monitor.snapshot()["postgres"],
         "timestamp": datetime.utcnow().isoformat()
     }
 
@@ -459,8 +937,10 @@ async def run_etl_pipeline():
     
     try:
         # Executar ETL
-        etl = MovieLensETL()
-        stats = etl.run_full_etl()
+        MovieLensETL = await _import_job("etl_minio_postgres", "MovieLensETL")
+        # Clientes do worker (sem novo pool por chamada); o ETL roda numa thread
+        etl = MovieLensETL(minio_client=minio_client, pg_client=client)
+        stats = await asyncio.to_thread(etl.run_full_etl)
         
         return {
             "message": "ETL executado com sucesso!",
@@ -560,6 +1040,872 @@ async def get_top_movies(limit: int = 10):
         )
 
 
+# ====================================================================
+# ENDPOINTS DE RECOMENDAÇÃO (PARTE 3)
+# ====================================================================
+
+# Limite de avaliações por requisição em lote
+MAX_BATCH_RATINGS = 10_000
+
+
+async def _submit_ratings(submissions: List[RatingSubmission], ack: bool, response: Response) -> RatingsWriteResponse:
+    """
+    Enfileira avaliações no writer e, com ack, espera a gravação do lote
+
+    Returns:
+        Resposta com status 'written' (201) ou 'queued' (202)
+    """
+    start = datetime.now()
+    now = int(start.timestamp())
+    rows = []
+    for r in submissions:
+        timestamp = r.timestamp if r.timestamp is not None else now
+        try:
+            rated_at = datetime.fromtimestamp(timestamp)
+        except (ValueError, OverflowError, OSError):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Timestamp inválido: {timestamp}"
+            )
+        rows.append((r.user_id, r.movie_id, r.rating, timestamp, rated_at))
+
+    try:
+        future = rating_writer.submit(rows, ack=ack)
+    except RatingQueueFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+    if future is None:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return RatingsWriteResponse(
+            status="queued",
+            count=len(rows),
+            duration_ms=round((datetime.now() - start).total_seconds() * 1000, 3)
+        )
+
+    try:
+        result = await future
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Avaliações não gravadas: {str(e)}"
+        )
+    response.status_code = status.HTTP_201_CREATED
+    return RatingsWriteResponse(
+        status="written",
+        count=len(rows),
+        written=result["written"],
+        rejected=[{"user_id": u, "movie_id": m} for u, m in result["rejected"]],
+        duration_ms=round((datetime.now() - start).total_seconds() * 1000, 3)
+    )
+
+
+@app.post("/ratings", response_model=RatingsWriteResponse, tags=["Ratings"])
+async def submit_rating(rating: RatingSubmission, response: Response, ack: bool = True):
+    """
+    Registra uma avaliação (usuário, filme, nota 1-5)
+    
+    A avaliação entra numa fila em memória gravada em micro-lotes (COPY)
+    pelo writer em background. Uma nova nota para o mesmo par substitui
+    a anterior.
+    
+    Args:
+        rating: user_id, movie_id, rating e timestamp opcional
+        ack: Se True, responde 201 após a gravação; se False, responde 202
+            assim que a avaliação é enfileirada (fire-and-forget)
+    
+    Returns:
+        Status da gravação; pares com usuário ou filme inexistente em 'rejected'
+    """
+    return await _submit_ratings([rating], ack, response)
+
+
+@app.post("/ratings/batch", response_model=RatingsWriteResponse, tags=["Ratings"])
+async def submit_ratings_batch(request: RatingsBatchRequest, response: Response, ack: bool = True):
+    """
+    Registra várias avaliações de uma vez (gravadas no mesmo micro-lote)
+    
+    Args:
+        request: Lista de avaliações
+        ack: Se True, responde 201 após a gravação; se False, 202 ao enfileirar
+    
+    Returns:
+        Status da gravação; pares com usuário ou filme inexistente em 'rejected'
+    """
+    if len(request.ratings) > MAX_BATCH_RATINGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {MAX_BATCH_RATINGS} avaliações por requisição"
+        )
+    return await _submit_ratings(request.ratings, ack, response)
+
+
+@app.get("/ratings/writer", tags=["Ratings"])
+async def rating_writer_status():
+    """
+    Estado do writer de avaliações (fila, lotes gravados, falhas)
+    """
+    return rating_writer.snapshot()
+
+
+@app.get("/recommendations/{user_id}", response_model=RecommendationsResponse, tags=["Recommendations"])
+async def get_recommendations(user_id: int, n: int = 10):
+    """
+    Recomenda os N filmes com maior nota predita para o usuário
+    
+    Args:
+        user_id: ID do usuário
+        n: Número de recomendações (1-100)
+    
+    Returns:
+        Lista de filmes recomendados com a nota predita
+    """
+    if not 1 <= n <= 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="O parâmetro n deve estar entre 1 e 100"
+        )
+    
+    model = get_recommender_model()
+    return RecommendationsResponse(
+        user_id=user_id,
+        model_version=model.model_version,
+        known_user=model.user_index(user_id) is not None,
+        recommendations=model.recommend(user_id, n=n)
+    )
+
+
+@app.get("/recommendations/{user_id}/precomputed", tags=["Recommendations"])
+async def get_precomputed_recommendations(
+    user_id: int,
+    algorithm: str = "hybrid",
+    n: int = 10,
+    model_version: Optional[str] = None
+):
+    """
+    Retorna as recomendações pré-calculadas em lote (tabela recommendations)
+    
+    Uma única leitura indexada por user_id (idx_recommendations_user_id).
+    
+    Args:
+        user_id: ID do usuário
+        algorithm: 'kmeans', 'knn' ou 'hybrid'
+        n: Número de recomendações (1-100)
+        model_version: Versão do modelo (default: última publicada para o algoritmo)
+    """
+    if algorithm not in ALGORITHMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Algoritmo inválido: {algorithm}. Use um de {list(ALGORITHMS)}"
+        )
+    
+    if not 1 <= n <= 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="O parâmetro n deve estar entre 1 e 100"
+        )
+    
+    client = get_pg_client()
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cliente PostgreSQL não inicializado"
+        )
+    
+    try:
+        if model_version is None:
+            model_version = await get_published_version(client, recommendations_event(algorithm))
+        
+        if model_version is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Nenhuma recomendação '{algorithm}' publicada. Execute /recommendations/batch"
+            )
+        
+        results = await asyncio.to_thread(client.get_recommendations, user_id, model_version, algorithm, n)
+        
+        return {
+            "user_id": user_id,
+            "algorithm": algorithm,
+            "model_version": model_version,
+            "total_results": len(results),
+            "recommendations": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao obter recomendações pré-calculadas: {str(e)}"
+        )
+
+
+@app.get("/users/{user_id}/neighbors", tags=["Recommendations"])
+async def get_user_neighbors(user_id: int, k: int = 10):
+    """
+    Retorna os usuários mais similares (índice de vizinhos top-K pré-calculado)
+    
+    Args:
+        user_id: ID do usuário
+        k: Número de vizinhos (limitado ao tamanho do índice)
+    """
+    model = get_recommender_model()
+    
+    if model.user_index(user_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Usuário {user_id} não existe no modelo {model.model_version}"
+        )
+    
+    return {
+        "user_id": user_id,
+        "model_version": model.model_version,
+        "neighbors": model.neighbors(user_id, k=max(1, k))
+    }
+
+
+@app.get("/movies/{movie_id}/similar", tags=["Recommendations"])
+async def get_similar_movies(movie_id: int, n: int = 10, model_version: Optional[str] = None):
+    """
+    Retorna os filmes mais similares ("mais como este") a partir de movie_similarities
+    
+    As similaridades são pré-calculadas em lote (/movies/similarities/build);
+    a consulta é uma busca indexada, sem cálculo no caminho da requisição.
+    
+    Args:
+        movie_id: ID do filme
+        n: Número de filmes (1-100)
+        model_version: Versão das similaridades (default: última publicada)
+    """
+    if not 1 <= n <= 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="O parâmetro n deve estar entre 1 e 100"
+        )
+    
+    client = get_pg_client()
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cliente PostgreSQL não inicializado"
+        )
+    
+    try:
+        if model_version is None:
+            model_version = await get_published_version(client, SIMILARITIES_EVENT)
+        
+        if model_version is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Nenhuma similaridade publicada. Execute /movies/similarities/build"
+            )
+        
+        results = await asyncio.to_thread(client.get_similar_movies, movie_id, model_version, n)
+        
+        return {
+            "movie_id": movie_id,
+            "model_version": model_version,
+            "total_results": len(results),
+            "similar_movies": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao obter filmes similares: {str(e)}"
+        )
+
+
+@app.post("/predict", response_model=PredictResponse, tags=["Recommendations"])
+async def predict_rating(request: PredictRequest):
+    """
+    Prediz a nota de um usuário para um filme (guess() do notebook)
+    
+    Args:
+        request: user_id, movie_id e top_n (número de vizinhos)
+    
+    Returns:
+        Nota predita no intervalo [1, 5]
+    """
+    if request.top_n < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="top_n deve ser maior que zero"
+        )
+    
+    model = get_recommender_model()
+    return PredictResponse(
+        user_id=request.user_id,
+        movie_id=request.movie_id,
+        predicted_rating=round(model.predict(request.user_id, request.movie_id, top_n=request.top_n), 4),
+        model_version=model.model_version
+    )
+
+
+# Limite de pares por requisição de predição em lote
+MAX_BATCH_PREDICTIONS = 200_000
+
+
+@app.post("/predict/batch", response_model=BatchPredictResponse, tags=["Recommendations"])
+async def predict_ratings_batch(request: BatchPredictRequest):
+    """
+    Prediz notas para vários pares (usuário, filme) de uma vez
+    
+    Usa o preditor vetorizado (agrupado por filme). Se 'ratings' for
+    informado, retorna também RMSE e MAE das predições.
+    
+    Args:
+        request: Listas user_ids e movie_ids (mesmo tamanho), ratings opcional e top_n
+    
+    Returns:
+        Notas preditas na mesma ordem dos pares
+    """
+    n_pairs = len(request.user_ids)
+    if n_pairs != len(request.movie_ids) or (request.ratings is not None and len(request.ratings) != n_pairs):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="user_ids, movie_ids e ratings devem ter o mesmo tamanho"
+        )
+    if n_pairs > MAX_BATCH_PREDICTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {MAX_BATCH_PREDICTIONS} pares por requisição"
+        )
+    if request.top_n < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="top_n deve ser maior que zero"
+        )
+    
+    model = get_recommender_model()
+    start = datetime.now()
+    predictions = await asyncio.to_thread(
+        model.predict_batch, request.user_ids, request.movie_ids, request.top_n
+    )
+    
+    return BatchPredictResponse(
+        model_version=model.model_version,
+        count=n_pairs,
+        predictions=predictions.round(4).tolist(),
+        metrics=error_metrics(request.ratings, predictions) if request.ratings is not None else None,
+        duration_ms=round((datetime.now() - start).total_seconds() * 1000, 2)
+    )
+
+
+@app.post("/predict/rf/batch", response_model=BatchPredictResponse, tags=["Recommendations"])
+async def predict_ratings_rf_batch(request: RFBatchPredictRequest):
+    """
+    Prediz notas com o Random Forest para vários pares (usuário, filme)
+    
+    As features vêm do feature store (mesmo lookup do treino) e a
+    floresta é percorrida sobre arrays NumPy, sem o objeto sklearn. Se
+    'ratings' for informado, retorna também RMSE e MAE das predições.
+    
+    Args:
+        request: Listas user_ids e movie_ids (mesmo tamanho) e ratings opcional
+    
+    Returns:
+        Notas preditas na mesma ordem dos pares
+    """
+    n_pairs = len(request.user_ids)
+    if n_pairs != len(request.movie_ids) or (request.ratings is not None and len(request.ratings) != n_pairs):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="user_ids, movie_ids e ratings devem ter o mesmo tamanho"
+        )
+    if n_pairs > MAX_BATCH_PREDICTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {MAX_BATCH_PREDICTIONS} pares por requisição"
+        )
+    
+    forest, store = rf_forest, rf_features
+    if forest is None or store is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Random Forest ou features não carregados. Publique com export_rf_model.py e /features/rf/build"
+        )
+    feature_version = forest_feature_version(forest)
+    if feature_version is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Random Forest {forest.model_version} não registra o feature store usado no treino. "
+                   f"Reexporte com export_rf_model.py --feature-store-version"
+        )
+    if feature_version != store.version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Random Forest {forest.model_version} foi treinado com as features {feature_version}, "
+                   f"mas a API serve {store.version}. Recarregue com /recommender/rf/reload ou reexporte o modelo"
+        )
+    try:
+        columns = forest.column_order(store.feature_names)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    
+    def score():
+        return forest.predict(store.lookup(request.user_ids, request.movie_ids)[:, columns])
+    
+    start = datetime.now()
+    predictions = await asyncio.to_thread(score)
+    
+    return BatchPredictResponse(
+        model_version=forest.model_version,
+        count=n_pairs,
+        predictions=predictions.round(4).tolist(),
+        metrics=error_metrics(request.ratings, predictions) if request.ratings is not None else None,
+        duration_ms=round((datetime.now() - start).total_seconds() * 1000, 2)
+    )
+
+
+@app.post("/recommender/rf/reload", tags=["Recommendations"])
+async def reload_rf_forest(model_version: Optional[str] = None):
+    """
+    Recarrega o Random Forest compacto do MinIO (default: última versão publicada)
+    
+    As features passam para a versão com que o modelo foi treinado. Como
+    em /recommender/reload, os workers seguem o ponteiro LATEST a cada
+    MODEL_REFRESH_INTERVAL segundos.
+    
+    Args:
+        model_version: Versão específica a carregar (opcional)
+    """
+    forest = await asyncio.to_thread(load_rf_models, model_version)
+    
+    if forest is None or (model_version and forest.model_version != model_version):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Random Forest '{model_version or 'LATEST'}' não encontrado no MinIO"
+        )
+    
+    return {
+        "message": "Random Forest carregado com sucesso",
+        "model": forest.metadata
+    }
+
+
+@app.post("/recommender/train", tags=["Recommendations"])
+async def train_recommender(k_clusters: int = 8):
+    """
+    Treina o modelo K-Means + KNN com as avaliações do PostgreSQL e publica no MinIO
+    
+    O novo modelo passa a ser servido imediatamente por este worker.
+    
+    Args:
+        k_clusters: Número de clusters de filmes (default: 8, definido por WCSS)
+    """
+    global recommender_model
+    client = get_pg_client()
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cliente PostgreSQL não inicializado"
+        )
+    
+    try:
+        train_and_publish = await _import_job("train_recommender", "train_and_publish")
+        model = await asyncio.to_thread(
+            train_and_publish,
+            k_clusters=k_clusters,
+            minio_client=minio_client,
+            pg_client=client
+        )
+        recommender_model = model
+        
+        return {
+            "message": "Modelo treinado e publicado com sucesso!",
+            "model": model.metadata,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao treinar modelo: {str(e)}"
+        )
+
+
+@app.post("/recommendations/batch", tags=["Recommendations"])
+async def build_batch_recommendations(algorithm: str = "hybrid", n: int = 10):
+    """
+    Gera o top-N de todos os usuários com o modelo carregado e carrega em recommendations (COPY)
+    
+    Ao final a nova versão passa a ser servida por /recommendations/{user_id}/precomputed.
+    
+    Args:
+        algorithm: 'kmeans', 'knn' ou 'hybrid'
+        n: Recomendações por usuário (1-100)
+    """
+    if algorithm not in ALGORITHMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Algoritmo inválido: {algorithm}. Use um de {list(ALGORITHMS)}"
+        )
+    
+    if not 1 <= n <= 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="O parâmetro n deve estar entre 1 e 100"
+        )
+    
+    model = get_recommender_model()
+    client = get_pg_client()
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cliente PostgreSQL não inicializado"
+        )
+    
+    try:
+        result = await asyncio.to_thread(
+            generate_and_store_recommendations,
+            algorithm=algorithm,
+            n=n,
+            model=model,
+            pg_client=client
+        )
+        set_published_version(recommendations_event(algorithm), result["model_version"])
+        
+        return {
+            "message": "Recomendações geradas e publicadas com sucesso!",
+            "result": result,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao gerar recomendações em lote: {str(e)}"
+        )
+
+
+@app.post("/movies/similarities/build", tags=["Recommendations"])
+async def build_movie_similarities(top_k: int = 50, min_common: int = 5, model_version: Optional[str] = None):
+    """
+    Calcula a similaridade item-item e carrega em movie_similarities (COPY)
+    
+    Ao final a nova versão passa a ser servida por /movies/{movie_id}/similar.
+    
+    Args:
+        top_k: Filmes similares guardados por filme
+        min_common: Mínimo de usuários em comum por par
+        model_version: Versão gravada (default: item_cosine-<timestamp>)
+    """
+    client = get_pg_client()
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cliente PostgreSQL não inicializado"
+        )
+    
+    if top_k < 1 or min_common < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="top_k e min_common devem ser maiores que zero"
+        )
+    
+    if model_version and len(model_version) > 50:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="model_version deve ter no máximo 50 caracteres"
+        )
+    
+    try:
+        build_and_store_similarities = await _import_job("build_movie_similarities", "build_and_store_similarities")
+        result = await asyncio.to_thread(
+            build_and_store_similarities,
+            top_k=top_k,
+            min_common=min_common,
+            model_version=model_version,
+            pg_client=client
+        )
+        set_published_version(SIMILARITIES_EVENT, result["model_version"])
+        
+        return {
+            "message": "Similaridades calculadas e publicadas com sucesso!",
+            "result": result,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao calcular similaridades: {str(e)}"
+        )
+
+
+@app.post("/recommender/elbow", tags=["Recommendations"])
+async def recommender_elbow(k_min: int = 2, k_max: int = 10, minibatch: Optional[bool] = None):
+    """
+    Calcula o WCSS do K-Means para K em [k_min, k_max] (método do cotovelo), em paralelo
+    
+    Os ajustes ficam em cache por (K, versão dos dados) e são
+    reaproveitados pelo treino com o K escolhido.
+    
+    Args:
+        k_min: Menor K
+        k_max: Maior K (no máximo 50)
+        minibatch: Usar MiniBatchKMeans (default: automático pelo volume de avaliações)
+    """
+    if not 2 <= k_min <= k_max <= 50:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use 2 <= k_min <= k_max <= 50"
+        )
+    
+    client = get_pg_client()
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cliente PostgreSQL não inicializado"
+        )
+    
+    try:
+        elbow_report = await _import_job("train_recommender", "elbow_report")
+        report = await asyncio.to_thread(
+            elbow_report,
+            range(k_min, k_max + 1),
+            minibatch=minibatch,
+            pg_client=client
+        )
+        return report
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao calcular cotovelo: {str(e)}"
+        )
+
+
+@app.post("/recommender/grid-search", tags=["Recommendations"])
+async def recommender_grid_search(
+    k_values: str = "2,5,8,12,15",
+    n_values: str = "5,10,20",
+    test_size: float = 0.2,
+    seed: int = 42
+):
+    """
+    Busca em grade de K (clusters) e N (vizinhos) com RMSE/MAE no conjunto de teste completo
+    
+    Cada K é avaliado em um processo (clustering e similaridades reaproveitados
+    para todos os N); resultados ficam em cache por (K, N, versão dos dados).
+    
+    Args:
+        k_values: Valores de K separados por vírgula
+        n_values: Valores de N separados por vírgula
+        test_size: Fração das avaliações usada como teste
+        seed: Semente da divisão treino/teste
+    """
+    try:
+        ks = [int(k) for k in k_values.split(",")]
+        ns = [int(n) for n in n_values.split(",")]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="k_values e n_values devem ser inteiros separados por vírgula"
+        )
+    
+    if not all(2 <= k <= 50 for k in ks) or not all(1 <= n <= 200 for n in ns) or not 0 < test_size < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use K entre 2 e 50, N entre 1 e 200 e 0 < test_size < 1"
+        )
+    
+    client = get_pg_client()
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cliente PostgreSQL não inicializado"
+        )
+    
+    try:
+        grid_search_report = await _import_job("train_recommender", "grid_search_report")
+        return await asyncio.to_thread(
+            grid_search_report,
+            ks, ns,
+            test_size=test_size,
+            seed=seed,
+            pg_client=client
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro na busca em grade: {str(e)}"
+        )
+
+
+@app.post("/recommender/refresh", tags=["Recommendations"])
+async def refresh_recommender():
+    """
+    Atualiza incrementalmente o modelo carregado com as avaliações novas e publica no MinIO
+    
+    Mantém os clusters de filmes e recalcula apenas os usuários afetados,
+    sem refazer o treino completo.
+    """
+    global recommender_model
+    model = get_recommender_model()
+    client = get_pg_client()
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cliente PostgreSQL não inicializado"
+        )
+    
+    try:
+        refresh_and_publish = await _import_job("train_recommender", "refresh_and_publish")
+        new_model = await asyncio.to_thread(
+            refresh_and_publish,
+            base_model=model,
+            minio_client=minio_client,
+            pg_client=client
+        )
+        
+        if new_model is None:
+            return {
+                "message": "Nenhuma avaliação nova; modelo mantido",
+                "model": model.metadata,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        
+        recommender_model = new_model
+        return {
+            "message": "Modelo atualizado e publicado com sucesso!",
+            "model": new_model.metadata,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao atualizar modelo: {str(e)}"
+        )
+
+
+@app.post("/recommender/reload", tags=["Recommendations"])
+async def reload_recommender(model_version: Optional[str] = None):
+    """
+    Recarrega o modelo do MinIO (default: última versão publicada)
+    
+    Vale para o worker que atendeu a requisição; os demais (e este, para
+    uma versão diferente da LATEST) seguem o ponteiro LATEST a cada
+    MODEL_REFRESH_INTERVAL segundos.
+    
+    Args:
+        model_version: Versão específica a carregar (opcional)
+    """
+    model = await asyncio.to_thread(load_recommender_model, model_version)
+    
+    if model is None or (model_version and model.model_version != model_version):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Modelo '{model_version or 'LATEST'}' não encontrado no MinIO"
+        )
+    
+    return {
+        "message": "Modelo carregado com sucesso",
+        "model": model.metadata
+    }
+
+
+@app.post("/features/rf/build", tags=["Recommendations"])
+async def build_rf_features(force: bool = False):
+    """
+    Materializa as features do Random Forest (uma vez por versão dos dados) e publica no MinIO
+    
+    Se a versão dos dados já tem feature store publicado, ele é
+    reaproveitado. Ao final a versão passa a ser servida pela API.
+    
+    Args:
+        force: Recalcula mesmo se a versão já existe
+    """
+    global rf_features
+    client = get_pg_client()
+    
+    if not client:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cliente PostgreSQL não inicializado"
+        )
+    
+    try:
+        materialize_and_publish = await _import_job("build_rf_features", "materialize_and_publish")
+        result = await asyncio.to_thread(materialize_and_publish, client, minio_client, force)
+        rf_features = result.pop("store")
+        
+        return {
+            "message": "Features do Random Forest publicadas com sucesso!",
+            "result": result,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao materializar features: {str(e)}"
+        )
+
+
+@app.get("/features/rf/{user_id}/{movie_id}", tags=["Recommendations"])
+async def get_rf_features(user_id: int, movie_id: int):
+    """
+    Features do Random Forest de um par (usuário, filme), as mesmas usadas no treino
+    
+    Args:
+        user_id: ID do usuário
+        movie_id: ID do filme
+    """
+    store = rf_features
+    if store is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Features do Random Forest não carregadas. Materialize em /features/rf/build"
+        )
+    
+    values = store.lookup([user_id], [movie_id])[0]
+    return {
+        "user_id": user_id,
+        "movie_id": movie_id,
+        "version": store.version,
+        "known_user": bool(user_id in store.user_ids),
+        "known_movie": bool(movie_id in store.movie_ids),
+        "features": {name: float(value) for name, value in zip(store.feature_names, values)}
+    }
+
+
+# Import do módulo (no mestre, com preload): tudo acima desde os imports de terceiros
+startup.record("import", time.perf_counter() - _import_started)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
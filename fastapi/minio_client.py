@@ -3,13 +3,40 @@ Cliente MinIO para gerenciamento de armazenamento de objetos
 Compatível com API S3
 """
 import os
-from typing import Optional, List
+import time
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, BinaryIO, Iterable, Iterator
 import io
 
 import boto3
 from botocore.exceptions import ClientError
 from botocore.client import Config
 
+from instrumentation import instrumented
+from object_cache import ObjectDiskCache
+from object_compression import (
+    COMPRESSION_METADATA_KEY,
+    UNCOMPRESSED_SIZE_METADATA_KEY,
+    compress_stream,
+    normalize_codec,
+    open_decompressed,
+)
+
+
+# Tamanho dos blocos lidos ao calcular o hash de conteúdo (1 MB)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Acima deste tamanho o conteúdo comprimido é mantido em disco, não em memória
+COMPRESSION_SPOOL_SIZE = 32 * 1024 * 1024
+
+# Limite de chaves por requisição DeleteObjects na API S3
+DELETE_BATCH_SIZE = 1000
+
+# Chave de metadado (x-amz-meta-*) com o SHA-256 do conteúdo
+CONTENT_HASH_METADATA_KEY = "content-sha256"
+
 
 class MinIOClient:
     """Cliente para interação com MinIO (compatível com S3)"""
@@ -20,6 +47,10 @@ class MinIOClient:
         self.access_key = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
         self.secret_key = os.getenv("MINIO_SECRET_KEY", "minioadmin123")
         self.bucket_name = os.getenv("MINIO_BUCKET", "movielens-data")
+        # Compressão padrão dos uploads ('gzip', 'zstd' ou vazio para desativar)
+        self.default_compression = normalize_codec(os.getenv("MINIO_COMPRESSION", ""))
+        # Cache local em disco para leituras repetidas (None se desativado)
+        self.cache = ObjectDiskCache.from_env()
         
         # Configurar cliente S3 para usar MinIO
         self.s3_client = boto3.client(
@@ -31,6 +62,7 @@ class MinIOClient:
             region_name='us-east-1'
         )
     
+    @instrumented("minio")
     def check_connection(self) -> bool:
         """
         Verifica se a conexão com MinIO está funcionando
@@ -45,6 +77,7 @@ class MinIOClient:
             print(f"❌ Erro ao conectar com MinIO: {e}")
             return False
     
+    @instrumented("minio")
     def bucket_exists(self) -> bool:
         """
         Verifica se o bucket existe
@@ -58,6 +91,7 @@ class MinIOClient:
         except ClientError:
             return False
     
+    @instrumented("minio")
     def create_bucket_if_not_exists(self) -> bool:
         """
         Cria o bucket se ele não existir
@@ -76,6 +110,7 @@ class MinIOClient:
             print(f"❌ Erro ao criar bucket: {e}")
             return False
     
+    @instrumented("minio")
     def upload_file(
         self,
         file_data: bytes,
@@ -106,6 +141,244 @@ class MinIOClient:
             print(f"❌ Erro ao fazer upload de {object_name}: {e}")
             return False
     
+    @staticmethod
+    def compute_content_hash(stream: BinaryIO) -> Dict:
+        """
+        Calcula MD5 e SHA-256 de um stream lendo em blocos
+        
+        O stream é rebobinado para a posição inicial ao final, pronto
+        para ser enviado ao MinIO sem carregar tudo em memória.
+        
+        Args:
+            stream: Objeto file-like binário (com suporte a seek)
+        
+        Returns:
+            Dicionário com 'md5', 'sha256' (hex) e 'size' em bytes
+        """
+        start = stream.tell()
+        md5 = hashlib.md5()
+        sha256 = hashlib.sha256()
+        size = 0
+        
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+            md5.update(chunk)
+            sha256.update(chunk)
+            size += len(chunk)
+        
+        stream.seek(start)
+        return {
+            'md5': md5.hexdigest(),
+            'sha256': sha256.hexdigest(),
+            'size': size
+        }
+    
+    @staticmethod
+    def _same_content(metadata: Optional[dict], content_hash: Dict, codec: Optional[str] = None) -> bool:
+        """
+        Compara o hash calculado com os metadados de um objeto existente
+        
+        Usa o SHA-256 gravado nos metadados do usuário quando disponível;
+        caso contrário, compara o MD5 com o ETag (válido apenas para
+        uploads simples, sem multipart). Objetos gravados com outra
+        compressão são considerados diferentes.
+        """
+        if not metadata:
+            return False
+        
+        user_metadata = metadata.get('metadata', {})
+        if user_metadata.get(COMPRESSION_METADATA_KEY) != codec:
+            return False
+        
+        stored_size = int(user_metadata.get(UNCOMPRESSED_SIZE_METADATA_KEY, metadata['size']))
+        if stored_size != content_hash['size']:
+            return False
+        
+        stored_sha256 = user_metadata.get(CONTENT_HASH_METADATA_KEY)
+        if stored_sha256:
+            return stored_sha256 == content_hash['sha256']
+        if codec:
+            return False
+        
+        etag = metadata['etag'].strip('"')
+        if '-' in etag:
+            # ETag de upload multipart não é o MD5 do conteúdo
+            return False
+        return etag == content_hash['md5']
+    
+    @instrumented("minio")
+    def upload_stream_dedup(
+        self,
+        stream: BinaryIO,
+        object_name: str,
+        content_type: str = "application/octet-stream",
+        compression: Optional[str] = None
+    ) -> Dict:
+        """
+        Faz upload de um stream apenas se o conteúdo mudou
+        
+        O hash do conteúdo é calculado em blocos e comparado com os
+        metadados do objeto já existente (ETag / SHA-256). Quando o
+        conteúdo é idêntico, a escrita é ignorada. Opcionalmente o
+        conteúdo é comprimido antes do envio e o codec é registrado
+        nos metadados do objeto.
+        
+        Args:
+            stream: Objeto file-like binário (com suporte a seek)
+            object_name: Nome/caminho do objeto no bucket
+            content_type: Tipo de conteúdo do arquivo
+            compression: 'gzip', 'zstd', 'none' ou None (usa MINIO_COMPRESSION)
+        
+        Returns:
+            Dicionário com 'success', 'deduplicated', 'bytes_saved',
+            'size', 'stored_size', 'compression' e 'sha256'
+        """
+        codec = self.default_compression if compression is None else normalize_codec(compression)
+        content_hash = self.compute_content_hash(stream)
+        result = {
+            'success': False,
+            'deduplicated': False,
+            'bytes_saved': 0,
+            'size': content_hash['size'],
+            'stored_size': content_hash['size'],
+            'compression': codec,
+            'sha256': content_hash['sha256']
+        }
+        
+        existing = self.get_object_metadata(object_name)
+        if self._same_content(existing, content_hash, codec):
+            print(f"♻️  Conteúdo idêntico, upload ignorado: {object_name}")
+            result.update(
+                success=True,
+                deduplicated=True,
+                bytes_saved=existing['size'],
+                stored_size=existing['size']
+            )
+            return result
+        
+        metadata = {CONTENT_HASH_METADATA_KEY: content_hash['sha256']}
+        body = stream
+        try:
+            if codec:
+                body = tempfile.SpooledTemporaryFile(max_size=COMPRESSION_SPOOL_SIZE)
+                compress_stream(stream, body, codec)
+                result['stored_size'] = body.tell()
+                body.seek(0)
+                metadata[COMPRESSION_METADATA_KEY] = codec
+                metadata[UNCOMPRESSED_SIZE_METADATA_KEY] = str(content_hash['size'])
+            
+            self.s3_client.upload_fileobj(
+                body,
+                self.bucket_name,
+                object_name,
+                ExtraArgs={
+                    'ContentType': content_type,
+                    'Metadata': metadata
+                }
+            )
+            print(f"✅ Upload realizado: {object_name}")
+            result['success'] = True
+        except ClientError as e:
+            print(f"❌ Erro ao fazer upload de {object_name}: {e}")
+        finally:
+            if body is not stream:
+                body.close()
+        
+        return result
+    
+    @instrumented("minio")
+    def upload_file_dedup(
+        self,
+        file_data: bytes,
+        object_name: str,
+        content_type: str = "application/octet-stream",
+        compression: Optional[str] = None
+    ) -> Dict:
+        """
+        Versão de upload_stream_dedup para dados já em memória
+        
+        Args:
+            file_data: Dados do arquivo em bytes
+            object_name: Nome/caminho do objeto no bucket
+            content_type: Tipo de conteúdo do arquivo
+            compression: 'gzip', 'zstd', 'none' ou None (usa MINIO_COMPRESSION)
+        
+        Returns:
+            Mesmo dicionário retornado por upload_stream_dedup
+        """
+        return self.upload_stream_dedup(io.BytesIO(file_data), object_name, content_type, compression)
+    
+    @instrumented("minio")
+    def open_object_stream(self, object_name: str) -> BinaryIO:
+        """
+        Abre um objeto do MinIO como stream já descomprimido
+        
+        O codec é lido dos metadados do objeto; objetos sem compressão
+        são retornados como o próprio Body da resposta.
+        
+        Args:
+            object_name: Nome/caminho do objeto no bucket
+        
+        Returns:
+            Objeto file-like com o conteúdo original
+        
+        Raises:
+            ClientError: se o objeto não existe ou não pode ser lido
+        """
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name,
+            Key=object_name
+        )
+        codec = response.get('Metadata', {}).get(COMPRESSION_METADATA_KEY)
+        return open_decompressed(response['Body'], codec)
+    
+    def _conditional_fetch(self, object_name: str):
+        """
+        Cria a função de download condicional usada pelo cache em disco
+        
+        Envia If-None-Match com o ETag em cache; a resposta 304 indica que
+        a cópia local continua válida.
+        """
+        def fetch(cached_etag: Optional[str]):
+            params = {'Bucket': self.bucket_name, 'Key': object_name}
+            if cached_etag:
+                params['IfNoneMatch'] = cached_etag
+            try:
+                response = self.s3_client.get_object(**params)
+            except ClientError as e:
+                status_code = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+                if cached_etag and (status_code == 304 or e.response.get('Error', {}).get('Code') == '304'):
+                    return None
+                raise
+            codec = response.get('Metadata', {}).get(COMPRESSION_METADATA_KEY)
+            return response['ETag'], open_decompressed(response['Body'], codec)
+        
+        return fetch
+    
+    @instrumented("minio")
+    def get_cached_path(self, object_name: str) -> str:
+        """
+        Retorna o caminho local (já descomprimido) de um objeto via cache em disco
+        
+        O objeto só é baixado novamente se o ETag mudou desde a última
+        leitura. O arquivo pode ser lido normalmente ou mapeado em memória
+        com ObjectDiskCache.open_mmap. Se o arquivo sumir antes de ser aberto
+        (remoção LRU por outro processo), chame get_cached_path de novo.
+        
+        Args:
+            object_name: Nome/caminho do objeto no bucket
+        
+        Returns:
+            Caminho do arquivo no cache local
+        
+        Raises:
+            RuntimeError: se o cache está desativado (MINIO_CACHE_DIR ausente ou vazio)
+            ClientError: se o objeto não existe ou não pode ser lido
+        """
+        if self.cache is None:
+            raise RuntimeError("Cache local do MinIO desativado (defina MINIO_CACHE_DIR)")
+        return self.cache.get_path(self.bucket_name, object_name, self._conditional_fetch(object_name))
+    
+    @instrumented("minio")
     def download_file(self, object_name: str) -> Optional[bytes]:
         """
         Baixa um arquivo do MinIO
@@ -117,15 +390,16 @@ class MinIOClient:
             Dados do arquivo em bytes ou None se não encontrado
         """
         try:
-            response = self.s3_client.get_object(
-                Bucket=self.bucket_name,
-                Key=object_name
-            )
-            return response['Body'].read()
+            stream = self.open_object_stream(object_name)
+            try:
+                return stream.read()
+            finally:
+                stream.close()
         except ClientError as e:
             print(f"❌ Erro ao baixar {object_name}: {e}")
             return None
     
+    @instrumented("minio")
     def list_objects(self, prefix: str = "") -> List:
         """
         Lista objetos no bucket
@@ -149,6 +423,7 @@ class MinIOClient:
             print(f"❌ Erro ao listar objetos: {e}")
             return []
     
+    @instrumented("minio")
     def delete_file(self, object_name: str) -> bool:
         """
         Remove um arquivo do MinIO
@@ -170,6 +445,126 @@ class MinIOClient:
             print(f"❌ Erro ao remover {object_name}: {e}")
             return False
     
+    def iter_key_batches(
+        self,
+        prefix: Optional[str] = None,
+        keys: Optional[Iterable[str]] = None,
+        batch_size: int = DELETE_BATCH_SIZE
+    ) -> Iterator[List[str]]:
+        """
+        Gera lotes de chaves a partir de um prefixo (listagem paginada) ou de uma lista
+        
+        Args:
+            prefix: Prefixo das chaves a listar
+            keys: Lista explícita de chaves (usada no lugar do prefixo)
+            batch_size: Número máximo de chaves por lote
+        
+        Yields:
+            Listas com até batch_size chaves
+        """
+        if keys is not None:
+            batch = []
+            for key in keys:
+                batch.append(key)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            return
+        
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
+            Bucket=self.bucket_name,
+            Prefix=prefix or "",
+            PaginationConfig={'PageSize': batch_size}
+        )
+        for page in pages:
+            batch = [obj['Key'] for obj in page.get('Contents', [])]
+            if batch:
+                yield batch
+    
+    def _delete_batch(self, batch: List[str]) -> Dict:
+        """Remove um lote de até 1.000 chaves com uma única chamada DeleteObjects"""
+        try:
+            response = self.s3_client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={
+                    'Objects': [{'Key': key} for key in batch],
+                    'Quiet': True
+                }
+            )
+        except ClientError as e:
+            return {
+                'deleted': 0,
+                'errors': [
+                    {'key': key, 'code': e.response.get('Error', {}).get('Code', 'ClientError'), 'message': str(e)}
+                    for key in batch
+                ]
+            }
+        
+        errors = [
+            {'key': err.get('Key'), 'code': err.get('Code'), 'message': err.get('Message')}
+            for err in response.get('Errors', [])
+        ]
+        return {'deleted': len(batch) - len(errors), 'errors': errors}
+    
+    @instrumented("minio")
+    def delete_objects_bulk(
+        self,
+        prefix: Optional[str] = None,
+        keys: Optional[List[str]] = None,
+        dry_run: bool = False,
+        max_workers: int = 8
+    ) -> Dict:
+        """
+        Remove objetos em massa por prefixo ou lista de chaves
+        
+        As chaves são listadas de forma paginada e removidas em lotes de
+        1.000 (DeleteObjects), com vários lotes executados em paralelo.
+        
+        Args:
+            prefix: Prefixo dos objetos a remover
+            keys: Lista explícita de chaves a remover
+            dry_run: Se True, apenas conta os objetos que seriam removidos
+            max_workers: Número de lotes removidos simultaneamente
+        
+        Returns:
+            Dicionário com 'matched', 'deleted', 'batches', 'errors',
+            'dry_run' e 'duration_seconds'
+        """
+        start = time.perf_counter()
+        result = {
+            'matched': 0,
+            'deleted': 0,
+            'batches': 0,
+            'errors': [],
+            'dry_run': dry_run
+        }
+        
+        if dry_run:
+            for batch in self.iter_key_batches(prefix=prefix, keys=keys):
+                result['matched'] += len(batch)
+                result['batches'] += 1
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = []
+                for batch in self.iter_key_batches(prefix=prefix, keys=keys):
+                    result['matched'] += len(batch)
+                    futures.append(executor.submit(self._delete_batch, batch))
+                
+                for future in futures:
+                    batch_result = future.result()
+                    result['deleted'] += batch_result['deleted']
+                    result['errors'].extend(batch_result['errors'])
+                result['batches'] = len(futures)
+            
+            print(f"✅ Remoção em massa: {result['deleted']}/{result['matched']} objetos removidos")
+        
+        result['duration_seconds'] = round(time.perf_counter() - start, 3)
+        return result
+    
+    @instrumented("minio")
     def get_object_metadata(self, object_name: str) -> Optional[dict]:
         """
         Obtém metadados de um objeto
@@ -189,8 +584,11 @@ class MinIOClient:
                 'size': response['ContentLength'],
                 'last_modified': response['LastModified'],
                 'content_type': response.get('ContentType', 'unknown'),
-                'etag': response['ETag']
+                'etag': response['ETag'],
+                'metadata': response.get('Metadata', {})
             }
         except ClientError as e:
-            print(f"❌ Erro ao obter metadados de {object_name}: {e}")
+            # Objeto inexistente é um caso esperado (ex: primeiro upload)
+            if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+                print(f"❌ Erro ao obter metadados de {object_name}: {e}")
             return None
@@ -0,0 +1,217 @@
+"""
+Cache local em disco (read-through) para objetos do MinIO
+Compartilhado entre o ETL e jobs de treinamento que rodam no mesmo container
+"""
+import os
+import json
+import mmap
+import time
+import fcntl
+import hashlib
+import logging
+import tempfile
+import shutil
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Tamanho dos blocos copiados do MinIO para o disco (1 MB)
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Função de download condicional: recebe o ETag em cache (ou None) e retorna
+# None quando o objeto não mudou (HTTP 304) ou (etag, stream) com o conteúdo novo
+FetchFunction = Callable[[Optional[str]], Optional[Tuple[str, BinaryIO]]]
+
+
+class ObjectDiskCache:
+    """Cache em disco com limite de tamanho e remoção LRU, validado por ETag"""
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        Inicializa o cache
+
+        Args:
+            cache_dir: Diretório onde os objetos são armazenados
+            max_bytes: Tamanho máximo ocupado pelo cache em bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ObjectDiskCache"]:
+        """
+        Cria o cache a partir das variáveis de ambiente
+
+        O cache é opcional: MINIO_CACHE_DIR ausente ou vazio o desativa.
+
+        Returns:
+            Instância do cache ou None se desativado
+        """
+        cache_dir = os.getenv("MINIO_CACHE_DIR", "")
+        if not cache_dir:
+            return None
+        max_bytes = int(os.getenv("MINIO_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+        return cls(cache_dir, max_bytes)
+
+    def _entry_paths(self, bucket: str, key: str) -> Tuple[str, str, str]:
+        """Retorna os caminhos (dados, metadados, lock) de uma entrada"""
+        digest = hashlib.sha256(f"{bucket}/{key}".encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, digest)
+        return f"{base}.data", f"{base}.json", f"{base}.lock"
+
+    @contextmanager
+    def _lock(self, lock_path: str) -> Iterator[None]:
+        """Lock exclusivo entre processos (fcntl) para uma entrada do cache"""
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self, meta_path: str) -> Optional[dict]:
+        """Lê os metadados de uma entrada (None se ausente ou corrompida)"""
+        try:
+            with open(meta_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get_path(self, bucket: str, key: str, fetch: FetchFunction) -> str:
+        """
+        Retorna o caminho local de um objeto, baixando-o apenas se mudou
+
+        Se existe uma cópia local, faz um GET condicional com o ETag em
+        cache; caso o MinIO responda 304, a cópia local é reutilizada.
+
+        Args:
+            bucket: Nome do bucket
+            key: Chave do objeto
+            fetch: Função de download condicional (ver FetchFunction)
+
+        Returns:
+            Caminho do arquivo local com o conteúdo do objeto. Outro
+            processo pode removê-lo (LRU) antes de ser aberto: quem abre
+            trata FileNotFoundError chamando get_path de novo.
+        """
+        data_path, meta_path, lock_path = self._entry_paths(bucket, key)
+
+        with self._lock(lock_path):
+            meta = self._read_meta(meta_path)
+            cached_etag = meta["etag"] if meta and os.path.exists(data_path) else None
+
+            fetched = fetch(cached_etag)
+            if fetched is None:
+                self.hits += 1
+                # Atualiza o mtime, usado como referência de acesso na remoção LRU
+                os.utime(data_path, None)
+                return data_path
+
+            self.misses += 1
+            etag, stream = fetched
+            size = self._write_atomic(data_path, stream)
+            with open(meta_path, "w") as f:
+                json.dump({
+                    "bucket": bucket,
+                    "key": key,
+                    "etag": etag,
+                    "size": size,
+                    "cached_at": time.time()
+                }, f)
+            logger.info(f"Cache MinIO atualizado: {bucket}/{key} ({size} bytes)")
+
+        self._evict(keep=data_path)
+        return data_path
+
+    def _write_atomic(self, data_path: str, stream: BinaryIO) -> int:
+        """Grava o stream em arquivo temporário e move para o destino final"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                shutil.copyfileobj(stream, tmp, COPY_CHUNK_SIZE)
+                size = tmp.tell()
+            os.replace(tmp_path, data_path)
+            return size
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        finally:
+            stream.close()
+
+    def _evict(self, keep: Optional[str] = None):
+        """Remove as entradas menos recentemente usadas até caber no limite"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".data"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            if path == keep:
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        if keep and os.path.exists(keep):
+            total += os.path.getsize(keep)
+        if total <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            base = path[:-len(".data")]
+            with self._lock(f"{base}.lock"):
+                for suffix in (".data", ".json"):
+                    try:
+                        os.unlink(base + suffix)
+                    except FileNotFoundError:
+                        pass
+            total -= size
+            logger.info(f"Cache MinIO: entrada removida (LRU) {os.path.basename(base)}")
+            if total <= self.max_bytes:
+                break
+
+    @staticmethod
+    @contextmanager
+    def open_mmap(path: str) -> Iterator[mmap.mmap]:
+        """
+        Abre um arquivo do cache mapeado em memória (somente leitura)
+
+        Args:
+            path: Caminho retornado por get_path
+
+        Yields:
+            Objeto mmap com o conteúdo do arquivo (b"" para arquivos vazios)
+        """
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # mmap não aceita arquivos vazios
+                yield b""
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mm
+            finally:
+                mm.close()
+
+    def stats(self) -> dict:
+        """Retorna estatísticas de uso do cache"""
+        used = sum(
+            os.path.getsize(os.path.join(self.cache_dir, name))
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".data")
+        )
+        return {
+            "cache_dir": self.cache_dir,
+            "max_bytes": self.max_bytes,
+            "used_bytes": used,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,88 @@
+"""
+Compressão transparente de objetos armazenados no MinIO
+Suporta gzip (biblioteca padrão) e zstd (opcional, pacote zstandard)
+"""
+import gzip
+import shutil
+from typing import BinaryIO, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional
+    zstandard = None
+
+
+# Chaves de metadados (x-amz-meta-*) gravadas nos objetos comprimidos
+COMPRESSION_METADATA_KEY = "compression"
+UNCOMPRESSED_SIZE_METADATA_KEY = "uncompressed-size"
+
+# Tamanho dos blocos copiados entre streams (1 MB)
+COPY_CHUNK_SIZE = 1024 * 1024
+
+SUPPORTED_CODECS = ("gzip", "zstd")
+
+
+def normalize_codec(codec: Optional[str]) -> Optional[str]:
+    """
+    Valida e normaliza o nome do codec de compressão
+
+    Args:
+        codec: 'gzip', 'zstd', 'none' ou vazio
+
+    Returns:
+        Nome do codec ou None quando não há compressão
+
+    Raises:
+        ValueError: se o codec não é suportado ou não está instalado
+    """
+    if not codec or codec.lower() == "none":
+        return None
+
+    codec = codec.lower()
+    if codec not in SUPPORTED_CODECS:
+        raise ValueError(f"Codec de compressão não suportado: {codec}")
+    if codec == "zstd" and zstandard is None:
+        raise ValueError("Codec zstd requer o pacote 'zstandard' instalado")
+    return codec
+
+
+def compress_stream(source: BinaryIO, destination: BinaryIO, codec: str, level: Optional[int] = None):
+    """
+    Comprime um stream em outro, bloco a bloco
+
+    Args:
+        source: Stream com os dados originais
+        destination: Stream que recebe os dados comprimidos
+        codec: 'gzip' ou 'zstd'
+        level: Nível de compressão (opcional)
+    """
+    if codec == "gzip":
+        with gzip.GzipFile(fileobj=destination, mode="wb", compresslevel=level or 6, mtime=0) as gz:
+            shutil.copyfileobj(source, gz, COPY_CHUNK_SIZE)
+    elif codec == "zstd":
+        compressor = zstandard.ZstdCompressor(level=level or 3)
+        compressor.copy_stream(source, destination, read_size=COPY_CHUNK_SIZE)
+    else:
+        raise ValueError(f"Codec de compressão não suportado: {codec}")
+
+
+def open_decompressed(stream: BinaryIO, codec: Optional[str]) -> BinaryIO:
+    """
+    Envolve um stream comprimido em um leitor que descomprime sob demanda
+
+    Args:
+        stream: Stream com os dados armazenados (ex: Body do get_object)
+        codec: Codec gravado nos metadados do objeto (None = sem compressão)
+
+    Returns:
+        Objeto file-like com os dados descomprimidos
+    """
+    if not codec:
+        return stream
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("Objeto comprimido com zstd, mas o pacote 'zstandard' não está instalado")
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    raise ValueError(f"Codec de compressão desconhecido: {codec}")
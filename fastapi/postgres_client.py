@@ -4,14 +4,33 @@ Gerencia conexão e operações com o banco de dados PostgreSQL
 """
 
 import psycopg2
-from psycopg2 import pool
+from psycopg2 import pool, sql
 from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
 import os
 import logging
+import tempfile
+import io
+
+from instrumentation import instrumented
 
 logger = logging.getLogger(__name__)
 
+# Buffer do COPY mantido em memória até este tamanho (acima disso vai para disco)
+COPY_SPOOL_SIZE = 64 * 1024 * 1024
+
+# Eventos em db_metadata que registram as versões publicadas dos resultados em lote
+SIMILARITIES_EVENT = "movie_similarities_published"
+RECOMMENDATIONS_EVENT = "recommendations_published"
+
+# Escape do formato texto do COPY: barra invertida, tabulação e quebras de linha
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_line(row: Iterable) -> str:
+    """Linha do COPY FROM STDIN (formato texto) com os valores escapados e None como NULL"""
+    return "\t".join("\\N" if value is None else str(value).translate(COPY_ESCAPES) for value in row) + "\n"
+
 
 class PostgreSQLClient:
     """Cliente para interação com PostgreSQL"""
@@ -60,6 +79,7 @@ class PostgreSQLClient:
         except Exception as e:
             logger.error(f"Erro ao retornar conexão: {e}")
     
+    @instrumented("postgres")
     def check_connection(self) -> bool:
         """Verifica se a conexão com PostgreSQL está funcionando"""
         conn = None
@@ -78,6 +98,7 @@ class PostgreSQLClient:
             if conn:
                 self.return_connection(conn)
     
+    @instrumented("postgres")
     def execute_query(self, query: str, params: tuple = None, fetch: bool = True) -> Optional[List[Dict]]:
         """
         Executa uma query SQL
@@ -115,6 +136,7 @@ class PostgreSQLClient:
             if conn:
                 self.return_connection(conn)
     
+    @instrumented("postgres")
     def execute_many(self, query: str, data: List[tuple]) -> int:
         """
         Executa insert/update em lote
@@ -145,6 +167,7 @@ class PostgreSQLClient:
             if conn:
                 self.return_connection(conn)
     
+    @instrumented("postgres")
     def get_table_count(self, table_name: str) -> int:
         """Retorna o número de registros em uma tabela"""
         try:
@@ -154,6 +177,7 @@ class PostgreSQLClient:
             logger.error(f"Erro ao contar registros de {table_name}: {e}")
             return 0
     
+    @instrumented("postgres")
     def get_tables(self) -> List[str]:
         """Lista todas as tabelas do banco"""
         query = """
@@ -170,6 +194,7 @@ class PostgreSQLClient:
             logger.error(f"Erro ao listar tabelas: {e}")
             return []
     
+    @instrumented("postgres")
     def get_table_info(self) -> Dict[str, int]:
         """Retorna informações sobre todas as tabelas"""
         tables = self.get_tables()
@@ -178,6 +203,7 @@ class PostgreSQLClient:
             info[table] = self.get_table_count(table)
         return info
     
+    @instrumented("postgres")
     def truncate_table(self, table_name: str, cascade: bool = True):
         """
         Limpa uma tabela
@@ -194,6 +220,7 @@ class PostgreSQLClient:
             logger.error(f"Erro ao limpar tabela {table_name}: {e}")
             raise
     
+    @instrumented("postgres")
     def insert_movie(self, movie_data: Dict) -> int:
         """
         Insere um filme no banco
@@ -237,6 +264,7 @@ class PostgreSQLClient:
             if conn:
                 self.return_connection(conn)
     
+    @instrumented("postgres")
     def insert_user(self, user_data: Dict) -> int:
         """
         Insere um usuário no banco
@@ -271,6 +299,7 @@ class PostgreSQLClient:
             if conn:
                 self.return_connection(conn)
     
+    @instrumented("postgres")
     def insert_ratings_batch(self, ratings_data: List[Dict]) -> int:
         """
         Insere múltiplas avaliações em batch (muito mais rápido)
@@ -320,6 +349,7 @@ class PostgreSQLClient:
             if conn:
                 self.return_connection(conn)
     
+    @instrumented("postgres")
     def insert_rating(self, rating_data: Dict) -> int:
         """
         Insere uma avaliação no banco
@@ -354,6 +384,281 @@ class PostgreSQLClient:
             if conn:
                 self.return_connection(conn)
     
+    @instrumented("postgres")
+    def copy_records(
+        self,
+        table_name: str,
+        columns: List[str],
+        rows: Iterable[tuple],
+        replace: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Carrega linhas em lote com COPY FROM STDIN (muito mais rápido que INSERT)
+        
+        Args:
+            table_name: Nome da tabela
+            columns: Colunas na ordem dos valores de cada linha
+            rows: Tuplas com os valores (None vira NULL)
+            replace: Se informado (coluna -> valor), remove antes as linhas que
+                casam com esses valores na mesma transação (recarga idempotente)
+            
+        Returns:
+            Número de linhas carregadas
+        """
+        conn = None
+        count = 0
+        with tempfile.SpooledTemporaryFile(max_size=COPY_SPOOL_SIZE, mode="w+") as buffer:
+            for row in rows:
+                buffer.write(copy_line(row))
+                count += 1
+            buffer.seek(0)
+            
+            try:
+                conn = self.get_connection()
+                cursor = conn.cursor()
+                table = sql.Identifier(table_name)
+                if replace:
+                    conditions = sql.SQL(" AND ").join(
+                        sql.SQL("{} = %s").format(sql.Identifier(column)) for column in replace
+                    )
+                    cursor.execute(
+                        sql.SQL("DELETE FROM {} WHERE {}").format(table, conditions),
+                        tuple(replace.values())
+                    )
+                cursor.copy_expert(
+                    sql.SQL("COPY {} ({}) FROM STDIN").format(
+                        table, sql.SQL(", ").join(map(sql.Identifier, columns))
+                    ).as_string(conn),
+                    buffer
+                )
+                conn.commit()
+                cursor.close()
+                logger.info(f"{count} linhas carregadas em {table_name} via COPY")
+                return count
+            except Exception as e:
+                if conn:
+                    conn.rollback()
+                logger.error(f"Erro ao carregar {table_name} via COPY: {e}")
+                raise
+            finally:
+                if conn:
+                    self.return_connection(conn)
+    
+    @instrumented("postgres")
+    def upsert_ratings(self, rows: List[tuple]) -> Dict[str, Any]:
+        """
+        Grava um lote de avaliações com COPY + upsert em uma única transação
+
+        As linhas vão por COPY para uma tabela temporária da sessão e de lá
+        para ratings com INSERT ... ON CONFLICT: uma nova nota do mesmo
+        (usuário, filme) substitui a anterior e renova created_at (para a
+        atualização incremental do modelo). Dentro do lote, vale a última
+        ocorrência de cada par. Pares com usuário ou filme inexistente são
+        rejeitados sem abortar o lote.
+
+        Args:
+            rows: Tuplas (user_id, movie_id, rating, timestamp, rated_at)
+
+        Returns:
+            Dicionário com 'written' (pares gravados) e 'rejected' (lista de (user_id, movie_id))
+        """
+        if not rows:
+            return {"written": 0, "rejected": []}
+
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(copy_line(row))
+        buffer.seek(0)
+
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS ratings_incoming (
+                    seq SERIAL,
+                    user_id INTEGER,
+                    movie_id INTEGER,
+                    rating INTEGER,
+                    timestamp BIGINT,
+                    rated_at TIMESTAMP
+                ) ON COMMIT DELETE ROWS
+            """)
+            cursor.copy_expert(
+                "COPY ratings_incoming (user_id, movie_id, rating, timestamp, rated_at) FROM STDIN",
+                buffer
+            )
+            cursor.execute("""
+                INSERT INTO ratings (user_id, movie_id, rating, timestamp, rated_at)
+                SELECT DISTINCT ON (i.user_id, i.movie_id)
+                    i.user_id, i.movie_id, i.rating, i.timestamp, i.rated_at
+                FROM ratings_incoming i
+                JOIN users u ON u.user_id = i.user_id
+                JOIN movies m ON m.movie_id = i.movie_id
+                ORDER BY i.user_id, i.movie_id, i.seq DESC
+                ON CONFLICT (user_id, movie_id) DO UPDATE SET
+                    rating = EXCLUDED.rating,
+                    timestamp = EXCLUDED.timestamp,
+                    rated_at = EXCLUDED.rated_at,
+                    created_at = CURRENT_TIMESTAMP
+            """)
+            written = cursor.rowcount
+            cursor.execute("""
+                SELECT DISTINCT i.user_id, i.movie_id
+                FROM ratings_incoming i
+                WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = i.user_id)
+                   OR NOT EXISTS (SELECT 1 FROM movies m WHERE m.movie_id = i.movie_id)
+            """)
+            rejected = [tuple(row) for row in cursor.fetchall()]
+            conn.commit()
+            cursor.close()
+            return {"written": written, "rejected": rejected}
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            logger.error(f"Erro ao gravar lote de ratings: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+
+    @instrumented("postgres")
+    def get_similar_movies(self, movie_id: int, model_version: str, limit: int = 10) -> List[Dict]:
+        """
+        Retorna os filmes mais similares a um filme (tabela movie_similarities)
+        
+        Cada par é gravado uma única vez (movie_id_1 < movie_id_2), então o
+        filme é procurado nas duas colunas; cada lado usa seu índice
+        (movie_id_x, model_version, similarity_score DESC).
+        
+        Args:
+            movie_id: ID do filme
+            model_version: Versão das similaridades
+            limit: Número máximo de filmes
+            
+        Returns:
+            Lista de dicionários com movie_id, title e similarity_score
+        """
+        query = """
+        SELECT s.movie_id, m.title, s.similarity_score
+        FROM (
+            (SELECT movie_id_2 AS movie_id, similarity_score
+             FROM movie_similarities
+             WHERE movie_id_1 = %(movie_id)s AND model_version = %(model_version)s
+             ORDER BY similarity_score DESC
+             LIMIT %(limit)s)
+            UNION ALL
+            (SELECT movie_id_1 AS movie_id, similarity_score
+             FROM movie_similarities
+             WHERE movie_id_2 = %(movie_id)s AND model_version = %(model_version)s
+             ORDER BY similarity_score DESC
+             LIMIT %(limit)s)
+        ) s
+        JOIN movies m ON m.movie_id = s.movie_id
+        ORDER BY s.similarity_score DESC
+        LIMIT %(limit)s
+        """
+        return self.execute_query(query, {"movie_id": movie_id, "model_version": model_version, "limit": limit})
+    
+    @instrumented("postgres")
+    def get_recommendations(self, user_id: int, model_version: str, algorithm: str, limit: int = 10) -> List[Dict]:
+        """
+        Retorna as recomendações pré-calculadas de um usuário (tabela recommendations)
+        
+        A busca por user_id usa idx_recommendations_user_id; cada usuário tem
+        poucas linhas (top-N por versão e algoritmo), filtradas e ordenadas em memória.
+        
+        Args:
+            user_id: ID do usuário
+            model_version: Versão do modelo que gerou as recomendações
+            algorithm: 'kmeans', 'knn' ou 'hybrid'
+            limit: Número máximo de filmes
+            
+        Returns:
+            Lista de dicionários com movie_id, title, predicted_rating e recommendation_score
+        """
+        query = """
+        SELECT r.movie_id, m.title, r.predicted_rating, r.recommendation_score
+        FROM recommendations r
+        JOIN movies m ON m.movie_id = r.movie_id
+        WHERE r.user_id = %(user_id)s
+          AND r.model_version = %(model_version)s
+          AND r.algorithm = %(algorithm)s
+        ORDER BY r.recommendation_score DESC
+        LIMIT %(limit)s
+        """
+        return self.execute_query(query, {
+            "user_id": user_id,
+            "model_version": model_version,
+            "algorithm": algorithm,
+            "limit": limit
+        })
+    
+    @instrumented("postgres")
+    def get_published_version(self, event: str) -> Optional[str]:
+        """Última versão registrada em db_metadata para o evento (None se nenhuma)"""
+        results = self.execute_query(
+            "SELECT description FROM db_metadata WHERE event = %s ORDER BY id DESC LIMIT 1",
+            (event,)
+        )
+        return results[0]["description"] if results else None
+    
+    @instrumented("postgres")
+    def publish_version(self, event: str, model_version: str):
+        """Registra em db_metadata a versão de um resultado em lote servida pela API"""
+        self.execute_query(
+            "INSERT INTO db_metadata (event, description) VALUES (%s, %s)",
+            (event, model_version),
+            fetch=False
+        )
+    
+    @instrumented("postgres")
+    def prune_versions(self, table_name: str, event: str, keep: int, match: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Remove de uma tabela de resultados em lote as versões fora das `keep` últimas publicadas
+
+        As versões mantidas são as `keep` publicadas mais recentemente no
+        evento de db_metadata; linhas de versões nunca publicadas também
+        são removidas.
+
+        Args:
+            table_name: Tabela com a coluna model_version
+            event: Evento de db_metadata com as versões publicadas
+            keep: Versões mantidas (>= 1)
+            match: Restringe a remoção às linhas que casam com esses valores (coluna -> valor)
+
+        Returns:
+            Número de linhas removidas
+        """
+        if keep < 1:
+            raise ValueError("keep deve ser maior que zero")
+        conditions = [sql.SQL("{} = %s").format(sql.Identifier(column)) for column in (match or {})]
+        conditions.append(sql.SQL("""(model_version IS NULL OR model_version NOT IN (
+            SELECT description FROM db_metadata WHERE event = %s AND description IS NOT NULL
+            GROUP BY description ORDER BY MAX(id) DESC LIMIT %s
+        ))"""))
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                sql.SQL("DELETE FROM {} WHERE {}").format(sql.Identifier(table_name), sql.SQL(" AND ").join(conditions)),
+                (*(match or {}).values(), event, keep)
+            )
+            deleted = cursor.rowcount
+            conn.commit()
+            cursor.close()
+            logger.info(f"{deleted} linhas de versões antigas removidas de {table_name} ({event})")
+            return deleted
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            logger.error(f"Erro ao remover versões antigas de {table_name}: {e}")
+            raise
+        finally:
+            if conn:
+                self.return_connection(conn)
+    
     def close(self):
         """Fecha o pool de conexões"""
         if self.connection_pool:
@@ -0,0 +1,236 @@
+"""
+Gravação de avaliações em micro-lotes: fila em memória + writer em background
+As requisições só enfileiram; o writer grava a cada N linhas ou M ms com COPY
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from psycopg2 import DataError, IntegrityError
+
+logger = logging.getLogger(__name__)
+
+# Erros causados pelo conteúdo das linhas: repetir o mesmo lote falharia para sempre
+ROW_ERRORS = (DataError, IntegrityError)
+
+# Últimas linhas descartadas mantidas para inspeção em /ratings/writer
+DEAD_LETTERS_KEPT = 100
+
+
+class RatingQueueFull(Exception):
+    """Fila de avaliações cheia (o banco não está acompanhando a taxa de escrita)"""
+
+
+class RatingWriter:
+    """Fila de avaliações gravadas em lote por uma tarefa asyncio em background"""
+
+    def __init__(
+        self,
+        get_client: Callable[[], Any],
+        flush_rows: Optional[int] = None,
+        flush_ms: Optional[float] = None,
+        max_queued: Optional[int] = None,
+        retry_delay: Optional[float] = None
+    ):
+        """
+        Inicializa o writer
+
+        Args:
+            get_client: Função que retorna o PostgreSQLClient atual (ou None se indisponível)
+            flush_rows: Grava assim que a fila atingir este número de linhas
+            flush_ms: Tempo máximo (ms) que uma linha espera na fila
+            max_queued: Limite de linhas na fila (acima disso, submit falha)
+            retry_delay: Espera (s) antes de tentar novamente após falha do banco
+        """
+        self.get_client = get_client
+        self.flush_rows = flush_rows or int(os.getenv("RATINGS_FLUSH_ROWS", "1000"))
+        self.flush_ms = flush_ms or float(os.getenv("RATINGS_FLUSH_MS", "50"))
+        self.max_queued = max_queued or int(os.getenv("RATINGS_QUEUE_MAX", "100000"))
+        self.retry_delay = retry_delay or float(os.getenv("RATINGS_RETRY_DELAY", "1"))
+
+        # Cada entrada é uma submissão: (linhas, future do chamador ou None)
+        self._queue: Deque[Tuple[List[tuple], Optional[asyncio.Future]]] = deque()
+        self._queued_rows = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._dead_letters: Deque[Dict[str, Any]] = deque(maxlen=DEAD_LETTERS_KEPT)
+        self._stats = {
+            "submitted": 0,
+            "written": 0,
+            "rejected": 0,
+            "dead_lettered": 0,
+            "flushes": 0,
+            "failures": 0,
+            "last_flush_rows": 0,
+            "last_flush_ms": None,
+            "last_error": None
+        }
+
+    @property
+    def queued(self) -> int:
+        return self._queued_rows
+
+    def submit(self, rows: List[tuple], ack: bool = True) -> Optional[asyncio.Future]:
+        """
+        Enfileira avaliações (sem I/O; chamado no caminho da requisição)
+
+        Args:
+            rows: Tuplas (user_id, movie_id, rating, timestamp, rated_at)
+            ack: Se True, retorna um future resolvido quando o lote for gravado
+
+        Returns:
+            Future com {'written', 'rejected'} desta submissão, ou None (fire-and-forget)
+        """
+        if self._queued_rows + len(rows) > self.max_queued:
+            raise RatingQueueFull(f"Fila de avaliações cheia ({self._queued_rows} linhas)")
+        future = asyncio.get_running_loop().create_future() if ack else None
+        was_empty = not self._queue
+        self._queue.append((rows, future))
+        self._queued_rows += len(rows)
+        self._stats["submitted"] += len(rows)
+        # Acorda o writer na primeira linha (inicia o prazo de M ms) e ao completar N linhas
+        if (was_empty or self._queued_rows >= self.flush_rows) and self._wakeup is not None:
+            self._wakeup.set()
+        return future
+
+    def _take_batch(self) -> List[Tuple[List[tuple], Optional[asyncio.Future]]]:
+        """Retira submissões inteiras da fila até completar flush_rows linhas"""
+        batch, rows = [], 0
+        while self._queue and rows < self.flush_rows:
+            entry = self._queue.popleft()
+            batch.append(entry)
+            rows += len(entry[0])
+        self._queued_rows -= rows
+        return batch
+
+    async def _write(self, client: Any, rows: List[tuple]) -> Dict[str, Any]:
+        """
+        Grava linhas isolando as que o banco recusa pelo conteúdo
+
+        Se o lote falha com DataError/IntegrityError, ele é dividido ao
+        meio até isolar as linhas inválidas, que são descartadas (dead
+        letter) e devolvidas como rejeitadas; as metades são gravadas em
+        ordem, então a última nota de cada par continua valendo.
+
+        Returns:
+            Dicionário com 'written' e 'rejected', como upsert_ratings
+        """
+        try:
+            return await asyncio.to_thread(client.upsert_ratings, rows)
+        except ROW_ERRORS as e:
+            if len(rows) == 1:
+                user_id, movie_id, *_ = rows[0]
+                self._stats["dead_lettered"] += 1
+                self._dead_letters.append({"row": list(rows[0]), "error": str(e).strip(), "at": datetime.utcnow().isoformat()})
+                logger.error(f"Avaliação descartada (usuário {user_id}, filme {movie_id}): {e}")
+                return {"written": 0, "rejected": [(user_id, movie_id)]}
+            middle = len(rows) // 2
+            first = await self._write(client, rows[:middle])
+            second = await self._write(client, rows[middle:])
+            return {"written": first["written"] + second["written"], "rejected": first["rejected"] + second["rejected"]}
+
+    async def _flush(self, batch: List[Tuple[List[tuple], Optional[asyncio.Future]]]) -> bool:
+        """
+        Grava um lote; em falha do banco, os futures recebem a exceção e as
+        linhas fire-and-forget voltam para o início da fila (linhas
+        inválidas não voltam: são descartadas por _write)
+
+        Returns:
+            True se o lote foi gravado
+        """
+        rows = [row for entry_rows, _ in batch for row in entry_rows]
+        start = time.perf_counter()
+        try:
+            client = self.get_client()
+            if client is None:
+                raise ConnectionError("PostgreSQL indisponível")
+            result = await self._write(client, rows)
+        except Exception as e:
+            self._stats["failures"] += 1
+            self._stats["last_error"] = str(e)
+            retry = [(entry_rows, None) for entry_rows, future in batch if future is None]
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            for entry in reversed(retry):
+                self._queue.appendleft(entry)
+                self._queued_rows += len(entry[0])
+            logger.error(f"Falha ao gravar lote de {len(rows)} avaliações: {e}")
+            return False
+
+        rejected = set(result["rejected"])
+        for entry_rows, future in batch:
+            if future is not None and not future.done():
+                entry_rejected = [(u, m) for u, m, *_ in entry_rows if (u, m) in rejected]
+                future.set_result({"written": len(entry_rows) - len(entry_rejected), "rejected": entry_rejected})
+
+        self._stats["flushes"] += 1
+        self._stats["written"] += result["written"]
+        self._stats["rejected"] += len(rejected)
+        self._stats["last_flush_rows"] = len(rows)
+        self._stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        self._stats["last_error"] = None
+        return True
+
+    def _discard_queue(self):
+        """Descarta o que restou na fila (banco indisponível no encerramento)"""
+        logger.error(f"{self._queued_rows} avaliações descartadas no encerramento")
+        error = ConnectionError("Writer encerrado sem conseguir gravar no PostgreSQL")
+        for _, future in self._queue:
+            if future is not None and not future.done():
+                future.set_exception(error)
+        self._queue.clear()
+        self._queued_rows = 0
+
+    async def _loop(self):
+        """Laço do writer: espera N linhas ou M ms desde a primeira linha pendente"""
+        while True:
+            if not self._queue:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if self._queued_rows < self.flush_rows and not self._stopping:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_ms / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            if not await self._flush(self._take_batch()):
+                if self._stopping:
+                    self._discard_queue()
+                    return
+                await asyncio.sleep(self.retry_delay)
+
+    async def start(self):
+        """Inicia o writer em background"""
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Writer de avaliações iniciado (lotes de {self.flush_rows} linhas ou {self.flush_ms} ms)")
+
+    async def stop(self):
+        """Para o writer depois de gravar o que ainda estiver na fila"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Contadores do writer e tamanho atual da fila"""
+        return {
+            **self._stats,
+            "queued": self._queued_rows,
+            "dead_letters": list(self._dead_letters),
+            "flush_rows": self.flush_rows,
+            "flush_ms": self.flush_ms,
+            "checked_at": datetime.utcnow().isoformat()
+        }
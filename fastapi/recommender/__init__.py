@@ -0,0 +1,37 @@
+"""
+Sistema de recomendação K-Means + KNN (Parte 3) servido pela API
+
+Os submódulos são importados no primeiro acesso a um nome exportado:
+a API importa só o que serve (NumPy), e scikit-learn/SciPy, usados
+pelo treino e pelos jobs em lote, ficam fora da inicialização.
+"""
+import importlib
+
+# Nome exportado -> submódulo que o define
+_EXPORTS = {
+    "KMeansKNNModel": "model",
+    "DEFAULT_K_CLUSTERS": "training",
+    "load_ratings_from_postgres": "training",
+    "train_model": "training",
+    "get_latest_version": "storage",
+    "load_model_from_minio": "storage",
+    "save_model_to_minio": "storage",
+    "item_similarity_pairs": "similarity",
+    "ALGORITHMS": "batch",
+    "recommend_all_users": "batch",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,301 @@
+"""
+Índice aproximado de vizinhos entre usuários (LSH por projeções aleatórias)
+Evita o cosseno de todos contra todos do notebook (Steps 7-8) quando há muitos usuários
+"""
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .neighbors import merge_neighbor_candidates, neighbor_rows
+
+logger = logging.getLogger(__name__)
+
+# Parâmetros padrão do índice (mais tabelas/janela = mais recall, mais tempo)
+DEFAULT_TABLES = 8
+DEFAULT_WINDOW = 64
+DEFAULT_BITS = 24
+
+# A partir deste número de usuários o treino usa o índice aproximado (method='auto')
+ANN_MIN_USERS = 20_000
+
+# Consultas processadas por bloco na busca em lote (limita memória a bloco x candidatos x d)
+QUERY_BLOCK_SIZE = 512
+
+NEIGHBOR_METHODS = ("auto", "exact", "lsh")
+
+
+class LSHIndex:
+    """
+    Índice LSH de hiperplanos aleatórios sobre vetores normalizados
+
+    Cada tabela ordena os itens pelo código de n_bits sinais de projeção;
+    com a ordenação lexicográfica, itens vizinhos na tabela compartilham
+    o prefixo mais longo do código (como as folhas de uma árvore de
+    projeções aleatórias). Os candidatos de uma consulta são os `window`
+    itens de cada lado da sua posição em cada tabela, reordenados pelo
+    cosseno exato.
+
+    Itens são identificados pela linha em `vectors`; inserções e remoções
+    mantêm as tabelas ordenadas sem reconstruir o índice.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        n_tables: int = DEFAULT_TABLES,
+        n_bits: int = DEFAULT_BITS,
+        window: int = DEFAULT_WINDOW,
+        seed: int = 42
+    ):
+        """
+        Args:
+            dim: Dimensão dos vetores
+            n_tables: Tabelas de hash independentes
+            n_bits: Hiperplanos por tabela (até 62)
+            window: Itens lidos de cada lado da posição da consulta, por tabela
+            seed: Semente dos hiperplanos
+        """
+        if not 1 <= n_bits <= 62:
+            raise ValueError("n_bits deve estar entre 1 e 62")
+        self.dim = dim
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.window = window
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((n_tables, dim, n_bits)).astype(np.float32)
+        self._weights = (1 << np.arange(n_bits - 1, -1, -1, dtype=np.int64))
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.codes = [np.empty(0, dtype=np.int64) for _ in range(n_tables)]
+        self.items = [np.empty(0, dtype=np.int32) for _ in range(n_tables)]
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, **params) -> "LSHIndex":
+        """Cria o índice com todas as linhas de vectors"""
+        index = cls(vectors.shape[1], **params)
+        index.vectors = vectors
+        index.insert(np.arange(len(vectors)))
+        return index
+
+    def params(self) -> Dict:
+        return {"n_tables": self.n_tables, "n_bits": self.n_bits, "window": self.window, "seed": self.seed}
+
+    def __len__(self) -> int:
+        return len(self.items[0])
+
+    def _hash(self, vectors: np.ndarray) -> np.ndarray:
+        """Códigos [n_tables, len(vectors)] dos vetores em cada tabela"""
+        bits = np.einsum("nd,tdb->tnb", np.asarray(vectors, dtype=np.float32), self.planes) > 0
+        return bits.astype(np.int64) @ self._weights
+
+    def insert(self, ids: np.ndarray):
+        """
+        Insere itens (linhas de self.vectors) nas tabelas
+
+        Cada tabela recebe os novos códigos nas posições de busca binária,
+        sem reordenar os itens existentes.
+        """
+        ids = np.asarray(ids, dtype=np.int32)
+        if len(ids) == 0:
+            return
+        codes = self._hash(self.vectors[ids])
+        for t in range(self.n_tables):
+            order = np.argsort(codes[t], kind="stable")
+            positions = np.searchsorted(self.codes[t], codes[t][order])
+            self.codes[t] = np.insert(self.codes[t], positions, codes[t][order])
+            self.items[t] = np.insert(self.items[t], positions, ids[order])
+
+    def remove(self, ids: np.ndarray):
+        """Remove itens das tabelas"""
+        ids = np.asarray(ids)
+        if len(ids) == 0:
+            return
+        for t in range(self.n_tables):
+            keep = ~np.isin(self.items[t], ids)
+            self.codes[t] = self.codes[t][keep]
+            self.items[t] = self.items[t][keep]
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Acrescenta vetores novos ao índice
+
+        Returns:
+            Ids (linhas) atribuídos aos novos vetores
+        """
+        start = len(self.vectors)
+        self.vectors = np.concatenate([self.vectors, np.asarray(vectors, dtype=np.float32)])
+        ids = np.arange(start, len(self.vectors))
+        self.insert(ids)
+        return ids
+
+    def update(self, vectors: np.ndarray, changed: np.ndarray, mapping: Optional[np.ndarray] = None):
+        """
+        Troca a matriz de vetores e re-hasheia apenas as linhas alteradas
+
+        Args:
+            vectors: Nova matriz de vetores [N', d]
+            changed: Linhas (na nova matriz) com vetor novo ou alterado
+            mapping: Linha nova de cada linha antiga (quando a numeração muda)
+        """
+        if mapping is not None:
+            self.items = [mapping[items].astype(np.int32) for items in self.items]
+        self.vectors = vectors
+        changed = np.asarray(changed)
+        self.remove(changed)
+        self.insert(changed)
+
+    def copy(self) -> "LSHIndex":
+        """Cópia independente das tabelas (os vetores são compartilhados até o próximo update)"""
+        index = LSHIndex(self.dim, **self.params())
+        index.vectors = self.vectors
+        index.codes = [codes.copy() for codes in self.codes]
+        index.items = [items.copy() for items in self.items]
+        return index
+
+    def _candidates(self, codes: np.ndarray, window: int) -> np.ndarray:
+        """Ids candidatos [len(consultas), n_tables * (2 * window + 1)] a partir dos códigos"""
+        n_items = len(self)
+        span = min(2 * window + 1, n_items)
+        offsets = np.arange(span)
+        candidates = []
+        for t in range(self.n_tables):
+            positions = np.searchsorted(self.codes[t], codes[t])
+            # Janela deslocada nas bordas para ter sempre `span` itens
+            starts = np.clip(positions - window, 0, n_items - span)
+            candidates.append(self.items[t][starts[:, None] + offsets])
+        return np.concatenate(candidates, axis=1)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        exclude: Optional[np.ndarray] = None,
+        block_size: int = QUERY_BLOCK_SIZE
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        K vizinhos aproximados de várias consultas
+
+        Args:
+            queries: Vetores normalizados [Q, d]
+            k: Vizinhos por consulta
+            exclude: Id excluído de cada consulta (o próprio usuário) ou None
+            block_size: Consultas por bloco
+
+        Returns:
+            Tupla (ids int32 [Q, k], sims float32 [Q, k]) em ordem decrescente
+
+        A janela é ampliada se necessário para que cada tabela forneça ao
+        menos k candidatos.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        k = max(0, min(k, len(self) - (exclude is not None)))
+        ids = np.zeros((len(queries), k), dtype=np.int32)
+        sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        if k == 0 or len(queries) == 0:
+            return ids, sims
+
+        window = max(self.window, (k + 1) // 2)
+        for start in range(0, len(queries), block_size):
+            block = slice(start, start + block_size)
+            block_queries = queries[block]
+            # Ordenar os ids agrupa as repetições (um item pode vir de várias
+            # tabelas) e melhora a localidade da leitura dos vetores
+            candidates = np.sort(self._candidates(self._hash(block_queries), window), axis=1)
+            candidate_sims = np.matmul(self.vectors[candidates], block_queries[:, :, None])[:, :, 0]
+            candidate_sims[:, 1:][candidates[:, 1:] == candidates[:, :-1]] = -np.inf
+            if exclude is not None:
+                candidate_sims[candidates == np.asarray(exclude)[block, None]] = -np.inf
+
+            ids[block], sims[block] = merge_neighbor_candidates(
+                ids[block, :0], sims[block, :0], candidates, candidate_sims, k
+            )
+        return ids, sims
+
+    def query(self, vector: np.ndarray, k: int = 10, exclude: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """K vizinhos aproximados de um único vetor"""
+        exclude = None if exclude is None else np.array([exclude])
+        ids, sims = self.search(np.asarray(vector)[None, :], k, exclude)
+        valid = np.isfinite(sims[0])
+        return ids[0][valid], sims[0][valid]
+
+    def knn_graph(self, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Índice de vizinhos aproximado de todos os itens (mesmo formato de build_neighbor_index)"""
+        items = np.arange(len(self.vectors))
+        return self.search(self.vectors, k, exclude=items)
+
+
+def resolve_neighbor_method(method: str, n_users: int) -> str:
+    """Método efetivo do índice de vizinhos ('auto' escolhe pelo número de usuários)"""
+    if method not in NEIGHBOR_METHODS:
+        raise ValueError(f"Método inválido: {method}. Use um de {NEIGHBOR_METHODS}")
+    if method == "auto":
+        return "lsh" if n_users >= ANN_MIN_USERS else "exact"
+    return method
+
+
+def recall_benchmark(
+    vectors: np.ndarray,
+    k: int = 10,
+    configs: Iterable[Dict] = ({},),
+    n_queries: int = 1000,
+    seed: int = 0
+) -> List[Dict]:
+    """
+    Compara o índice LSH com a busca exata (recall@K e latência)
+
+    Args:
+        vectors: Vetores normalizados dos usuários [N, d]
+        k: Vizinhos por consulta (recall@K)
+        configs: Parâmetros do LSHIndex a avaliar (n_tables, n_bits, window)
+        n_queries: Usuários sorteados como consultas
+        seed: Semente do sorteio
+
+    Returns:
+        Lista com uma linha por configuração (e uma para a busca exata):
+        parâmetros, recall_at_k, build_seconds, query_p50_ms, query_p99_ms
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+
+    start = time.perf_counter()
+    exact_ids, exact_sims = neighbor_rows(vectors, queries, k)
+    exact_seconds = time.perf_counter() - start
+    # Vizinhos empatados com o k-ésimo também contam como acerto
+    threshold = exact_sims[:, -1:] - 1e-6
+
+    results = [{
+        "method": "exact",
+        "recall_at_k": 1.0,
+        "build_seconds": None,
+        "query_mean_ms": round(exact_seconds / len(queries) * 1000, 4),
+        "query_p50_ms": None,
+        "query_p99_ms": None
+    }]
+    for config in configs:
+        start = time.perf_counter()
+        index = LSHIndex.build(vectors, **config)
+        build_seconds = time.perf_counter() - start
+
+        latencies = np.empty(len(queries))
+        found = np.empty((len(queries), k), dtype=np.float32)
+        for i, u in enumerate(queries):
+            start = time.perf_counter()
+            _, sims = index.query(vectors[u], k, exclude=int(u))
+            latencies[i] = time.perf_counter() - start
+            found[i] = np.pad(sims, (0, k - len(sims)), constant_values=-np.inf)
+
+        recall = float((found >= threshold).sum() / found.size)
+        results.append({
+            "method": "lsh",
+            **index.params(),
+            "recall_at_k": round(recall, 4),
+            "build_seconds": round(build_seconds, 3),
+            "query_mean_ms": round(float(latencies.mean()) * 1000, 4),
+            "query_p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 4),
+            "query_p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 4)
+        })
+        logger.info(f"LSH {index.params()}: recall@{k}={recall:.4f}, p50={results[-1]['query_p50_ms']}ms")
+    return results
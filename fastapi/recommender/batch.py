@@ -0,0 +1,188 @@
+"""
+Recomendações em lote para todos os usuários (tabela recommendations)
+Pontua filmes por blocos de usuários com os algoritmos kmeans, knn ou hybrid
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from .model import KMeansKNNModel
+
+logger = logging.getLogger(__name__)
+
+# Valores aceitos na coluna recommendations.algorithm
+ALGORITHMS = ("kmeans", "knn", "hybrid")
+
+# Usuários pontuados por bloco (memória ~ bloco x n_filmes x 4 bytes por matriz)
+USER_CHUNK_SIZE = 256
+
+# Peso do KNN no algoritmo hybrid (o restante vem do kmeans)
+HYBRID_KNN_WEIGHT = 0.5
+
+# Encolhimento do desvio de cada filme em relação ao seu cluster (kmeans)
+MOVIE_OFFSET_SHRINKAGE = 10.0
+
+
+class BatchScorer:
+    """Pontua todos os filmes para blocos de usuários com matrizes esparsas"""
+
+    def __init__(self, model: KMeansKNNModel, n_neighbors: int = 50, min_support: int = 3):
+        """
+        Prepara as estruturas compartilhadas entre os blocos
+
+        Args:
+            model: Modelo treinado
+            n_neighbors: Vizinhos considerados no knn (limitado ao índice)
+            min_support: Mínimo de vizinhos que avaliaram o filme (knn)
+        """
+        self.model = model
+        self.n_neighbors = min(n_neighbors, model.neighbor_ids.shape[1])
+        self.min_support = min_support
+
+        # SciPy só é importado pelos jobs em lote: a API usa apenas ALGORITHMS
+        from scipy import sparse
+
+        # Avaliações usuário x filme (CSR) e sua estrutura binária
+        shape = (model.n_users, model.n_movies)
+        self.ratings = sparse.csr_matrix((model.user_ratings, model.user_movies, model.user_indptr), shape=shape)
+        self.rated = sparse.csr_matrix(
+            (np.ones(len(model.user_movies), dtype=np.float32), model.user_movies, model.user_indptr),
+            shape=shape
+        )
+
+        # kmeans: desvio (encolhido) de cada filme em relação à média do seu cluster
+        counts = model.movie_counts.astype(np.float64)
+        sums = model.movie_means * counts
+        cluster_sums = np.bincount(model.movie_clusters, weights=sums, minlength=model.k_clusters)
+        cluster_counts = np.bincount(model.movie_clusters, weights=counts, minlength=model.k_clusters)
+        cluster_means = np.divide(
+            cluster_sums, cluster_counts,
+            out=np.full(model.k_clusters, model.global_mean), where=cluster_counts > 0
+        )
+        offsets = (sums - counts * cluster_means[model.movie_clusters]) / (counts + MOVIE_OFFSET_SHRINKAGE)
+        self.movie_offsets = offsets.astype(np.float32)
+
+    def kmeans_scores(self, users: np.ndarray) -> np.ndarray:
+        """
+        Nota média do usuário no cluster do filme, ajustada pelo desvio do filme
+
+        Clusters que o usuário nunca avaliou (0 na utility clustered
+        matrix) ficam com -inf.
+        """
+        cluster_means = self.model.user_cluster_means[users][:, self.model.movie_clusters]
+        scores = cluster_means + self.movie_offsets
+        scores[cluster_means == 0] = -np.inf
+        return scores
+
+    def knn_scores(self, users: np.ndarray) -> np.ndarray:
+        """
+        Média das notas dos vizinhos ponderada pela similaridade (mesma regra do recommend())
+        """
+        from scipy import sparse
+
+        n_rows = len(users)
+        neighbors = self.model.neighbor_ids[users, :self.n_neighbors]
+        sims = self.model.neighbor_sims[users, :self.n_neighbors]
+
+        rows = np.repeat(np.arange(n_rows), neighbors.shape[1])
+        shape = (n_rows, self.model.n_users)
+        weights = sparse.csr_matrix((sims.ravel(), (rows, neighbors.ravel())), shape=shape)
+        presence = sparse.csr_matrix((np.ones(rows.size, dtype=np.float32), (rows, neighbors.ravel())), shape=shape)
+
+        numerator = (weights @ self.ratings).toarray()
+        denominator = (abs(weights) @ self.rated).toarray()
+        support = (presence @ self.rated).toarray()
+
+        valid = (denominator > 0) & (support >= self.min_support)
+        scores = np.full(numerator.shape, -np.inf, dtype=np.float32)
+        scores[valid] = numerator[valid] / denominator[valid]
+        return scores
+
+    def scores(self, users: np.ndarray, algorithm: str) -> np.ndarray:
+        """
+        Matriz [len(users), n_filmes] de scores, com -inf nos filmes já avaliados
+
+        Args:
+            users: Índices internos dos usuários
+            algorithm: 'kmeans', 'knn' ou 'hybrid'
+        """
+        if algorithm == "kmeans":
+            scores = self.kmeans_scores(users)
+        elif algorithm == "knn":
+            scores = self.knn_scores(users)
+        elif algorithm == "hybrid":
+            kmeans = self.kmeans_scores(users)
+            knn = self.knn_scores(users)
+            scores = np.where(
+                np.isfinite(knn),
+                HYBRID_KNN_WEIGHT * knn + (1 - HYBRID_KNN_WEIGHT) * kmeans,
+                kmeans
+            )
+            # Cluster nunca avaliado: usa apenas o knn
+            scores = np.where(np.isfinite(scores), scores, knn)
+        else:
+            raise ValueError(f"Algoritmo inválido: {algorithm}. Use um de {ALGORITHMS}")
+
+        # Excluir filmes já avaliados
+        rated = self.rated[users]
+        scores[np.repeat(np.arange(len(users)), np.diff(rated.indptr)), rated.indices] = -np.inf
+        return scores
+
+    def top_n(self, users: np.ndarray, algorithm: str, n: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Top-n filmes por usuário de um bloco
+
+        Returns:
+            Tupla (user_ids, movie_ids, scores) com as recomendações válidas do bloco
+        """
+        scores = self.scores(users, algorithm)
+        n = min(n, self.model.n_movies)
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        keep = np.isfinite(top_scores)
+
+        user_ids = np.broadcast_to(self.model.user_ids[users][:, None], top.shape)[keep]
+        return user_ids, self.model.movie_ids[top[keep]], top_scores[keep]
+
+
+def recommend_all_users(
+    model: KMeansKNNModel,
+    algorithm: str = "hybrid",
+    n: int = 10,
+    chunk_size: int = USER_CHUNK_SIZE,
+    max_workers: Optional[int] = 4,
+    n_neighbors: int = 50,
+    min_support: int = 3
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Gera o top-n de todos os usuários do modelo, bloco a bloco
+
+    Os blocos são pontuados em paralelo (threads; os produtos de
+    matrizes do NumPy/SciPy liberam o GIL) e devolvidos em ordem.
+
+    Args:
+        model: Modelo treinado
+        algorithm: 'kmeans', 'knn' ou 'hybrid'
+        n: Recomendações por usuário
+        chunk_size: Usuários por bloco
+        max_workers: Threads de pontuação
+        n_neighbors: Vizinhos considerados no knn
+        min_support: Mínimo de vizinhos que avaliaram o filme (knn)
+
+    Yields:
+        Tuplas (user_ids, movie_ids, scores) de cada bloco
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Algoritmo inválido: {algorithm}. Use um de {ALGORITHMS}")
+
+    scorer = BatchScorer(model, n_neighbors=n_neighbors, min_support=min_support)
+    chunks = [
+        np.arange(start, min(start + chunk_size, model.n_users))
+        for start in range(0, model.n_users, chunk_size)
+    ]
+    logger.info(f"Recomendações em lote ({algorithm}): {model.n_users} usuários em {len(chunks)} blocos")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(lambda users: scorer.top_n(users, algorithm, n), chunks)
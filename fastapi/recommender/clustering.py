@@ -0,0 +1,392 @@
+"""
+Busca do K do K-Means (método do cotovelo) em paralelo, com cache por (K, versão dos dados, parâmetros do ajuste)
+Substitui o laço sequencial K=2..10 do notebook (Step 5)
+"""
+import glob
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+logger = logging.getLogger(__name__)
+
+# Faixa de K testada pelo notebook
+DEFAULT_K_RANGE = range(2, 11)
+
+# Acima deste número de avaliações, o modo automático usa MiniBatchKMeans
+MINIBATCH_MIN_RATINGS = 5_000_000
+MINIBATCH_BATCH_SIZE = 4096
+
+# Iterações máximas de cada algoritmo (parte da chave do cache)
+KMEANS_MAX_ITER = 300
+MINIBATCH_MAX_ITER = 100
+
+# Versões dos dados mantidas no cache de ajustes (as mais recentes)
+CLUSTER_CACHE_VERSIONS = 3
+
+# Intervalo de amostragem da memória residente durante um ajuste (s)
+MEMORY_SAMPLE_INTERVAL = 0.02
+
+# Matriz compartilhada com os processos de ajuste (enviada uma vez por processo)
+_worker_matrix = None
+
+
+def _rss_bytes() -> int:
+    """Memória residente atual do processo (0 se /proc indisponível)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class PeakMemory:
+    """Mede o pico de memória residente do processo, por amostragem em thread"""
+
+    def __enter__(self):
+        self.peak = _rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(MEMORY_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+    @property
+    def peak_mb(self) -> float:
+        return round(self.peak / 1024 / 1024, 2)
+
+
+def matrix_version(matrix: sparse.csr_matrix) -> str:
+    """
+    Versão dos dados de uma matriz CSR (hash do conteúdo)
+
+    A matriz é canônica (índices ordenados), então a versão não depende
+    da ordem em que as avaliações foram lidas do banco.
+    """
+    matrix.sort_indices()
+    digest = hashlib.sha256()
+    digest.update(np.asarray(matrix.shape, dtype=np.int64).tobytes())
+    for array in (matrix.indptr, matrix.indices, matrix.data):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def fit_signature(
+    minibatch: bool = False,
+    n_init: int = 10,
+    random_state: int = 42,
+    warm_start: bool = False
+) -> str:
+    """
+    Parâmetros que determinam um ajuste, usados na chave do cache
+
+    Um ajuste com MiniBatchKMeans, outro n_init/random_state ou partindo
+    de centros de outra versão (warm start) nunca é servido a quem pede
+    o K-Means completo.
+    """
+    algorithm = "minibatch_kmeans" if minibatch else "kmeans"
+    max_iter = MINIBATCH_MAX_ITER if minibatch else KMEANS_MAX_ITER
+    n_init = 1 if warm_start else n_init
+    return f"{algorithm}-n{n_init}-s{random_state}-i{max_iter}" + ("-warm" if warm_start else "")
+
+
+class ClusterCache:
+    """Cache em disco de ajustes do K-Means por (K, versão dos dados, parâmetros do ajuste)"""
+
+    def __init__(self, cache_dir: str, max_versions: int = CLUSTER_CACHE_VERSIONS):
+        """
+        Args:
+            cache_dir: Diretório do cache (<dir>/<versão>/k<K>_<assinatura>.npz)
+            max_versions: Versões dos dados mantidas (as usadas mais recentemente)
+        """
+        self.cache_dir = cache_dir
+        self.max_versions = max_versions
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["ClusterCache"]:
+        """Cria o cache a partir de KMEANS_CACHE_DIR (opcional: ausente ou vazio desabilita)"""
+        cache_dir = os.getenv("KMEANS_CACHE_DIR", "")
+        max_versions = int(os.getenv("KMEANS_CACHE_VERSIONS", str(CLUSTER_CACHE_VERSIONS)))
+        return cls(cache_dir, max_versions) if cache_dir else None
+
+    def _path(self, k: int, data_version: str, signature: str) -> str:
+        return os.path.join(self.cache_dir, data_version, f"k{k}_{signature}.npz")
+
+    def get(self, k: int, data_version: str, signature: str) -> Optional[Dict]:
+        """Ajuste em cache (labels, centers, wcss, ...) ou None"""
+        path = self._path(k, data_version, signature)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                fit = {name: npz[name] for name in npz.files}
+        except (OSError, ValueError):
+            return None
+        self._touch(data_version)
+        return fit
+
+    def put(self, k: int, data_version: str, signature: str, fit: Dict):
+        """Grava um ajuste (escrita atômica via arquivo temporário) e remove versões antigas"""
+        path = self._path(k, data_version, signature)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                labels=fit["labels"],
+                centers=fit["centers"],
+                wcss=np.float64(fit["wcss"]),
+                fit_seconds=np.float64(fit["fit_seconds"]),
+                peak_memory_mb=np.float64(fit["peak_memory_mb"])
+            )
+        os.replace(tmp_path, path)
+        self._touch(data_version)
+        self.prune(keep=data_version)
+
+    def _touch(self, data_version: str):
+        try:
+            os.utime(os.path.join(self.cache_dir, data_version))
+        except OSError:
+            pass
+
+    def prune(self, keep: Optional[str] = None):
+        """Remove as versões dos dados menos usadas além de max_versions (nunca keep)"""
+        versions = [
+            entry for entry in os.scandir(self.cache_dir)
+            if entry.is_dir() and entry.name != keep
+        ]
+        versions.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in versions[max(0, self.max_versions - (1 if keep else 0)):]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            logger.info(f"Cache do K-Means: versão {entry.name} removida")
+
+    def latest_centers(self, k: int, n_features: int, exclude_version: str) -> Optional[np.ndarray]:
+        """Centros mais recentes para K, de outra versão com a mesma dimensão (warm start)"""
+        pattern = os.path.join(self.cache_dir, "*", f"k{k}_*.npz")
+        paths = sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True)
+        for path in paths:
+            if os.path.basename(os.path.dirname(path)) == exclude_version:
+                continue
+            try:
+                with np.load(path, allow_pickle=False) as npz:
+                    centers = npz["centers"]
+            except (OSError, ValueError, KeyError):
+                continue
+            if centers.shape == (k, n_features):
+                return centers
+        return None
+
+
+def process_pool_context():
+    """
+    Contexto dos pools de processos do K-Means: forkserver (spawn onde não existe)
+
+    Os pools são criados de dentro da API, com o pool do psycopg2 e as
+    threads do boto3 ativos; um fork direto copiaria esse estado. O
+    servidor de forks é um processo novo, que importa este módulo
+    (scikit-learn) uma única vez para todos os pools.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def limit_worker_threads(threads_per_worker: int):
+    """Limita as threads do BLAS/OpenMP de um processo (evita sobrecarga com vários processos)"""
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads_per_worker)
+    except ImportError:
+        pass
+
+
+def _init_worker(matrix, threads_per_worker: int):
+    """Inicializa um processo de ajuste: recebe a matriz e limita threads do BLAS/OpenMP"""
+    global _worker_matrix
+    _worker_matrix = matrix
+    limit_worker_threads(threads_per_worker)
+
+
+def fit_kmeans(
+    matrix,
+    k: int,
+    n_init: int = 10,
+    random_state: int = 42,
+    minibatch: bool = False,
+    init_centers: Optional[np.ndarray] = None
+) -> Dict:
+    """
+    Ajusta o K-Means para um K e mede tempo e pico de memória residente do processo
+
+    Args:
+        matrix: Matriz filmes x usuários (densa ou esparsa); None usa a do processo
+        k: Número de clusters
+        n_init: Inicializações (ignorado com warm start)
+        random_state: Semente
+        minibatch: Se True, usa MiniBatchKMeans
+        init_centers: Centros iniciais (warm start com n_init=1)
+
+    Returns:
+        Dicionário com k, labels, centers, wcss, fit_seconds e peak_memory_mb
+    """
+    matrix = _worker_matrix if matrix is None else matrix
+    init = init_centers if init_centers is not None else "k-means++"
+    n_init = 1 if init_centers is not None else n_init
+
+    if minibatch:
+        model = MiniBatchKMeans(
+            n_clusters=k, init=init, n_init=n_init, random_state=random_state,
+            batch_size=MINIBATCH_BATCH_SIZE, max_iter=MINIBATCH_MAX_ITER
+        )
+    else:
+        model = KMeans(n_clusters=k, init=init, n_init=n_init, random_state=random_state, max_iter=KMEANS_MAX_ITER)
+
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        labels = model.fit_predict(matrix)
+        fit_seconds = time.perf_counter() - start
+
+    return {
+        "k": k,
+        "labels": labels.astype(np.int32),
+        "centers": np.asarray(model.cluster_centers_, dtype=np.float64),
+        "wcss": float(model.inertia_),
+        "fit_seconds": round(fit_seconds, 3),
+        "peak_memory_mb": memory.peak_mb
+    }
+
+
+def _fit_in_worker(k: int, n_init: int, random_state: int, minibatch: bool, init_centers) -> Dict:
+    return fit_kmeans(None, k, n_init, random_state, minibatch, init_centers)
+
+
+def elbow_search(
+    matrix,
+    k_values: Iterable[int] = DEFAULT_K_RANGE,
+    data_version: Optional[str] = None,
+    n_init: int = 10,
+    random_state: int = 42,
+    minibatch: Optional[bool] = None,
+    max_workers: Optional[int] = None,
+    cache: Optional[ClusterCache] = None,
+    warm_start: bool = True
+) -> List[Dict]:
+    """
+    Calcula o WCSS de vários K em paralelo (um processo por K)
+
+    Ajustes já em cache para (K, versão dos dados, parâmetros) não são
+    refeitos. Com warm_start, um K sem cache parte dos centros de outra
+    versão dos dados (mesma dimensão) com uma única inicialização; esse
+    ajuste fica no cache com assinatura própria, e só volta a ser usado
+    por outra busca do cotovelo com warm_start.
+
+    Args:
+        matrix: Matriz filmes x usuários (CSR)
+        k_values: Valores de K
+        data_version: Versão dos dados (default: hash da matriz)
+        n_init: Inicializações do K-Means
+        random_state: Semente
+        minibatch: Usar MiniBatchKMeans (None = automático pelo número de avaliações)
+        max_workers: Processos (default: número de CPUs, limitado ao número de K)
+        cache: Cache de ajustes (opcional)
+        warm_start: Reaproveitar centros de outra versão dos dados
+
+    Returns:
+        Lista (ordenada por K) com k, wcss, fit_seconds, peak_memory_mb,
+        algorithm, cached e warm_started
+    """
+    k_values = sorted(set(int(k) for k in k_values))
+    data_version = data_version or matrix_version(matrix)
+    if minibatch is None:
+        minibatch = matrix.nnz >= MINIBATCH_MIN_RATINGS
+    algorithm = "minibatch_kmeans" if minibatch else "kmeans"
+
+    results = {}
+    pending = []
+    signatures = [fit_signature(minibatch, n_init, random_state)]
+    if warm_start:
+        signatures.append(fit_signature(minibatch, n_init, random_state, warm_start=True))
+    for k in k_values:
+        cached, warm_cached = None, False
+        for signature in (signatures if cache else []):
+            cached = cache.get(k, data_version, signature)
+            if cached is not None:
+                warm_cached = signature.endswith("-warm")
+                break
+        if cached is not None:
+            results[k] = {
+                "k": k,
+                "wcss": float(cached["wcss"]),
+                "fit_seconds": float(cached["fit_seconds"]),
+                "peak_memory_mb": float(cached["peak_memory_mb"]),
+                "algorithm": algorithm,
+                "cached": True,
+                "warm_started": warm_cached
+            }
+        else:
+            pending.append(k)
+
+    if pending:
+        cpu_count = os.cpu_count() or 1
+        max_workers = max(1, min(max_workers or cpu_count, len(pending)))
+        threads_per_worker = max(1, cpu_count // max_workers)
+        logger.info(f"Cotovelo {data_version}: K={pending} em {max_workers} processos ({algorithm})")
+
+        init_centers = {
+            k: (cache.latest_centers(k, matrix.shape[1], data_version) if cache and warm_start else None)
+            for k in pending
+        }
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=process_pool_context(),
+            initializer=_init_worker,
+            initargs=(matrix, threads_per_worker)
+        ) as executor:
+            futures = {
+                k: executor.submit(_fit_in_worker, k, n_init, random_state, minibatch, init_centers[k])
+                for k in pending
+            }
+            for k, future in futures.items():
+                fit = future.result()
+                if cache:
+                    warm = init_centers[k] is not None
+                    cache.put(k, data_version, fit_signature(minibatch, n_init, random_state, warm), fit)
+                results[k] = {
+                    "k": k,
+                    "wcss": fit["wcss"],
+                    "fit_seconds": fit["fit_seconds"],
+                    "peak_memory_mb": fit["peak_memory_mb"],
+                    "algorithm": algorithm,
+                    "cached": False,
+                    "warm_started": init_centers[k] is not None
+                }
+
+    return [results[k] for k in k_values]
+
+
+def suggest_k(results: List[Dict]) -> Optional[int]:
+    """
+    K sugerido pelo cotovelo: mínimo da segunda diferença do WCSS (regra do notebook)
+    """
+    if len(results) < 3:
+        return results[0]["k"] if results else None
+    wcss = np.array([r["wcss"] for r in results])
+    return int(results[int(np.argmin(np.diff(wcss, 2))) + 1]["k"])
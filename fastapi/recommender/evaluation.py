@@ -0,0 +1,160 @@
+"""
+Métricas de avaliação do sistema de recomendação
+"""
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# Nota mínima para um filme ser considerado relevante (Step 15 do notebook)
+RELEVANCE_THRESHOLD = 4.0
+
+# Valores de K avaliados por padrão (Step 15 do notebook)
+DEFAULT_RANKING_K = (5, 10, 20)
+
+
+def error_metrics(actuals: np.ndarray, predictions: np.ndarray) -> Dict[str, float]:
+    """
+    Calcula RMSE e MAE (Steps 10-11 do notebook)
+
+    Args:
+        actuals: Notas reais
+        predictions: Notas preditas
+
+    Returns:
+        Dicionário com 'rmse', 'mae' e 'n_predictions'
+    """
+    actuals = np.asarray(actuals, dtype=np.float64)
+    predictions = np.asarray(predictions, dtype=np.float64)
+    errors = actuals - predictions
+    return {
+        "rmse": float(np.sqrt(np.mean(errors ** 2))) if len(errors) else 0.0,
+        "mae": float(np.mean(np.abs(errors))) if len(errors) else 0.0,
+        "n_predictions": int(len(errors))
+    }
+
+
+def _mean(values: np.ndarray, mask: np.ndarray) -> float:
+    return float(values[mask].mean()) if mask.any() else 0.0
+
+
+def _dense_codes(ids: np.ndarray) -> np.ndarray:
+    """Códigos inteiros não negativos dos ids (os próprios ids quando já são inteiros pequenos)"""
+    if np.issubdtype(ids.dtype, np.integer) and len(ids) and ids.min() >= 0 and ids.max() <= 4 * len(ids) + 1024:
+        return ids.astype(np.int64, copy=False)
+    return np.unique(ids, return_inverse=True)[1].reshape(-1).astype(np.int64)
+
+
+def ranking_metrics(
+    user_ids: np.ndarray,
+    movie_ids: np.ndarray,
+    actuals: np.ndarray,
+    predictions: np.ndarray,
+    k_values: Iterable[int] = DEFAULT_RANKING_K,
+    threshold: float = RELEVANCE_THRESHOLD,
+    n_items: Optional[int] = None
+) -> Dict:
+    """
+    Precision@K, Recall@K, NDCG@K, MAP@K e cobertura por usuário (Step 15 do notebook)
+
+    Os filmes de teste de cada usuário são ordenados pela nota predita
+    (empates na ordem de entrada); relevantes são os com nota real >=
+    threshold. As métricas são calculadas por usuário e depois
+    promediadas (o notebook ordenava todas as predições juntas). Uma
+    única ordenação (usuário, -predição) serve a todos os K: as somas por
+    usuário saem de somas acumuladas sobre o vetor ordenado, sem laço
+    por usuário.
+
+    - Precision@K: relevantes no top-K / K (média sobre todos os usuários)
+    - Recall@K: relevantes no top-K / relevantes do usuário
+    - NDCG@K: ganho binário com desconto log2(posição + 1)
+    - MAP@K: média da precisão nas posições relevantes / min(K, relevantes)
+    - Cobertura@K: fração dos filmes que aparece em algum top-K
+    Recall, NDCG e MAP consideram só usuários com ao menos um relevante.
+
+    Args:
+        user_ids: Usuário de cada predição
+        movie_ids: Filme de cada predição
+        actuals: Notas reais
+        predictions: Notas preditas (NaN fica no fim do ranking)
+        k_values: Tamanhos do top-K
+        threshold: Nota mínima de um filme relevante
+        n_items: Tamanho do catálogo para a cobertura (default: filmes distintos nas predições)
+
+    Returns:
+        Dicionário com n_users, n_users_with_relevant, n_predictions,
+        threshold, map (sem corte) e by_k (lista com k, precision, recall,
+        ndcg, map e coverage)
+    """
+    user_ids = np.asarray(user_ids)
+    movie_ids = np.asarray(movie_ids)
+    actuals = np.asarray(actuals, dtype=np.float64)
+    scores = np.nan_to_num(np.asarray(predictions, dtype=np.float64), nan=-np.inf)
+    k_values = sorted(set(int(k) for k in k_values))
+    n_items = n_items or len(np.unique(movie_ids))
+
+    if len(user_ids) == 0:
+        empty = {"precision": 0.0, "recall": 0.0, "ndcg": 0.0, "map": 0.0, "coverage": 0.0}
+        return {"n_users": 0, "n_users_with_relevant": 0, "n_predictions": 0, "threshold": threshold,
+                "map": 0.0, "by_k": [{"k": k, **empty} for k in k_values]}
+
+    # Ordem: usuário, predição decrescente. Em vez de lexsort (várias
+    # ordenações estáveis), a posição global da predição vira parte de uma
+    # chave inteira única; empates de predição seguem a ordem de entrada
+    n = len(scores)
+    score_rank = np.empty(n, dtype=np.int64)
+    score_rank[np.argsort(-scores, kind="stable")] = np.arange(n)
+    user_codes = _dense_codes(user_ids)
+    order = np.argsort(user_codes * n + score_rank)
+    users = user_codes[order]
+    relevant = (actuals[order] >= threshold).astype(np.float64)
+
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    rank = np.arange(n) - np.repeat(starts, sizes)
+
+    def prefix_sums(values: np.ndarray):
+        """Função que soma values nas primeiras `cutoff` posições de cada usuário"""
+        cumulative = np.r_[0.0, np.cumsum(values)]
+        return lambda cutoff: cumulative[starts + cutoff] - cumulative[starts]
+
+    hits_in = prefix_sums(relevant)
+    n_relevant = hits_in(sizes)
+    has_relevant = n_relevant > 0
+    discounts = 1.0 / np.log2(np.arange(2, sizes.max() + 2))
+    ideal_dcg = np.r_[0.0, np.cumsum(discounts)]
+
+    # Relevantes até cada posição (inclusive), dentro do usuário
+    cumulative_hits = np.r_[0.0, np.cumsum(relevant)]
+    hits_so_far = cumulative_hits[1:] - np.repeat(cumulative_hits[starts], sizes)
+    precision_in = prefix_sums(relevant * hits_so_far / (rank + 1))
+    dcg_in = prefix_sums(relevant * discounts[rank])
+
+    # Melhor posição de cada filme em qualquer usuário (cobertura@K = filmes com posição < K)
+    item_codes = _dense_codes(movie_ids)[order]
+    best_rank = np.full(item_codes.max() + 1, n, dtype=np.int64)
+    np.minimum.at(best_rank, item_codes, rank)
+
+    by_k = []
+    for k in k_values:
+        cutoff = np.minimum(k, sizes)
+        hits = hits_in(cutoff)
+        idcg = ideal_dcg[np.minimum(k, n_relevant).astype(np.int64)]
+        ap = precision_in(cutoff) / np.maximum(np.minimum(k, n_relevant), 1)
+        by_k.append({
+            "k": k,
+            "precision": float((hits / k).mean()),
+            "recall": _mean(hits / np.maximum(n_relevant, 1), has_relevant),
+            "ndcg": _mean(dcg_in(cutoff) / np.where(idcg > 0, idcg, 1), has_relevant),
+            "map": _mean(ap, has_relevant),
+            "coverage": float(np.count_nonzero(best_rank < k) / n_items)
+        })
+
+    full_ap = precision_in(sizes) / np.maximum(n_relevant, 1)
+    return {
+        "n_users": int(len(starts)),
+        "n_users_with_relevant": int(has_relevant.sum()),
+        "n_predictions": int(n),
+        "threshold": threshold,
+        "map": _mean(full_ap, has_relevant),
+        "by_k": by_k
+    }
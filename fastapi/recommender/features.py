@@ -0,0 +1,418 @@
+"""
+Feature store do Random Forest (Steps 13-14 do notebook)
+Features de usuário, de filme e de usuário x filme são materializadas uma vez por
+versão dos dados, em colunas tipadas (um .npy por coluna) no MinIO, com codificações
+fixas: treino, teste e inferência online leem as mesmas features pelo mesmo lookup
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+from .model import lookup_ids
+from .storage import MANIFEST_NAME, fetch_bundle, mark_bundle_loaded, prune_local_bundles, read_arrays, upload_bundle, write_arrays
+
+logger = logging.getLogger(__name__)
+
+FEATURE_PREFIX = "features/rf"
+LATEST_POINTER = f"{FEATURE_PREFIX}/LATEST"
+STORE_FORMAT = "rf-features/1"
+
+# 19 gêneros do MovieLens (colunas da tabela movies)
+GENRE_COLUMNS = (
+    "unknown", "action", "adventure", "animation", "childrens", "comedy",
+    "crime", "documentary", "drama", "fantasy", "film_noir", "horror",
+    "musical", "mystery", "romance", "sci_fi", "thriller", "war", "western"
+)
+
+# Vocabulário fixo de ocupações (u.occupation) em ordem alfabética: os códigos
+# coincidem com os do LabelEncoder do notebook, mas não dependem da partição
+OCCUPATIONS = (
+    "administrator", "artist", "doctor", "educator", "engineer", "entertainment",
+    "executive", "healthcare", "homemaker", "lawyer", "librarian", "marketing",
+    "none", "other", "programmer", "retired", "salesman", "scientist", "student",
+    "technician", "writer"
+)
+
+# Gênero: M=1, F=0 (como no notebook); valores desconhecidos recebem UNKNOWN_CODE
+GENDER_CODES = {"F": 0, "M": 1}
+UNKNOWN_CODE = -1
+
+# Peso (em avaliações) da média global nas médias por usuário, filme e gênero
+PRIOR_WEIGHT = 5.0
+
+# Colunas de cada tabela, na ordem do vetor de features
+USER_FEATURES = ("age", "gender_enc", "occupation_enc", "user_n_ratings", "user_mean_rating", "user_std_rating")
+MOVIE_FEATURES = ("release_year",) + GENRE_COLUMNS + ("movie_n_ratings", "movie_mean_rating")
+PAIR_FEATURES = ("user_genre_affinity",)
+FEATURE_NAMES = USER_FEATURES + MOVIE_FEATURES + PAIR_FEATURES
+
+# Máximo de linhas montadas de uma vez no lookup (limita a memória do gather por gênero)
+LOOKUP_BLOCK_SIZE = 1_000_000
+
+
+def local_feature_root() -> str:
+    """Diretório local das versões do feature store (FEATURE_STORE_DIR)"""
+    return os.getenv("FEATURE_STORE_DIR", os.path.join(tempfile.gettempdir(), "rf-features"))
+
+
+def load_feature_tables_from_postgres(pg_client) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Lê usuários e filmes do PostgreSQL como colunas NumPy
+
+    Returns:
+        Tupla (users, movies): dicionários coluna -> array, ordenados por id
+    """
+    users = pg_client.execute_query("SELECT user_id, age, gender, occupation FROM users ORDER BY user_id")
+    movies = pg_client.execute_query(
+        f"SELECT movie_id, release_date, {', '.join(GENRE_COLUMNS)} FROM movies ORDER BY movie_id"
+    )
+    user_columns = {
+        "user_id": np.array([row["user_id"] for row in users], dtype=np.int32),
+        "age": np.array([row["age"] if row["age"] is not None else -1 for row in users], dtype=np.int16),
+        "gender": np.array([row["gender"] or "" for row in users]),
+        "occupation": np.array([row["occupation"] or "" for row in users]),
+    }
+    movie_columns = {
+        "movie_id": np.array([row["movie_id"] for row in movies], dtype=np.int32),
+        "release_date": np.array([row["release_date"] for row in movies], dtype="datetime64[D]"),
+    }
+    for genre in GENRE_COLUMNS:
+        movie_columns[genre] = np.array([bool(row[genre]) for row in movies], dtype=np.uint8)
+    logger.info(f"{len(users)} usuários e {len(movies)} filmes carregados do PostgreSQL")
+    return user_columns, movie_columns
+
+
+def encode_gender(values) -> np.ndarray:
+    """Codifica gêneros ('M'/'F') em int8; outros valores viram UNKNOWN_CODE"""
+    values = np.char.upper(np.char.strip(np.asarray(values, dtype=str)))
+    codes = np.full(len(values), UNKNOWN_CODE, dtype=np.int8)
+    for gender, code in GENDER_CODES.items():
+        codes[values == gender] = code
+    return codes
+
+
+def encode_occupation(values) -> np.ndarray:
+    """Codifica ocupações pelo vocabulário fixo OCCUPATIONS (int8); desconhecidas viram UNKNOWN_CODE"""
+    values = np.char.lower(np.char.strip(np.asarray(values, dtype=str)))
+    vocabulary = np.array(OCCUPATIONS)
+    positions = np.minimum(np.searchsorted(vocabulary, values), len(vocabulary) - 1)
+    return np.where(vocabulary[positions] == values, positions, UNKNOWN_CODE).astype(np.int8)
+
+
+def release_years(dates) -> np.ndarray:
+    """
+    Ano de lançamento de cada data (date, datetime64 ou ISO 8601); -1 se ausente
+
+    Returns:
+        Array int16
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    years = dates.astype("datetime64[Y]").astype(np.int64) + 1970
+    return np.where(np.isnat(dates), -1, years).astype(np.int16)
+
+
+def feature_data_version(users: Mapping, movies: Mapping, ratings: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> str:
+    """Versão do feature store: formato + usuários + filmes + avaliações usadas nos agregados"""
+    digest = hashlib.sha256(STORE_FORMAT.encode("utf-8"))
+    for name in ("user_id", "age", "gender", "occupation"):
+        digest.update(np.ascontiguousarray(np.asarray(users[name]).astype(str)).tobytes())
+    digest.update(np.ascontiguousarray(np.asarray(movies["movie_id"], dtype=np.int64)).tobytes())
+    digest.update(np.ascontiguousarray(release_years(movies["release_date"])).tobytes())
+    for genre in GENRE_COLUMNS:
+        digest.update(np.ascontiguousarray(np.asarray(movies[genre], dtype=np.uint8)).tobytes())
+    for array, dtype in zip(ratings, (np.int64, np.int64, np.float32)):
+        digest.update(np.ascontiguousarray(np.asarray(array, dtype=dtype)).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _shrunk_mean(sums: np.ndarray, counts: np.ndarray, prior: np.ndarray) -> np.ndarray:
+    """Média com PRIOR_WEIGHT avaliações fictícias no valor prior"""
+    return ((sums + PRIOR_WEIGHT * prior) / (counts + PRIOR_WEIGHT)).astype(np.float32)
+
+
+def materialize_features(
+    users: Mapping,
+    movies: Mapping,
+    ratings: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    version: Optional[str] = None
+) -> "RFFeatureStore":
+    """
+    Calcula as features do Random Forest a partir das tabelas e das avaliações
+
+    Substitui o encode_features() do notebook (Step 13): gênero e
+    ocupação usam codificações fixas (iguais no treino, no teste e
+    online), o ano de lançamento é extraído uma vez e os agregados de
+    avaliações (contagem e média por usuário e por filme, desvio por
+    usuário, média por usuário x gênero) vêm apenas das avaliações
+    informadas — para avaliar um modelo, passe só as de treino.
+
+    Args:
+        users: Colunas user_id, age, gender, occupation (dict de arrays ou DataFrame)
+        movies: Colunas movie_id, release_date e os 19 gêneros
+        ratings: Tupla (user_ids, movie_ids, ratings) usada nos agregados
+        version: Versão gravada (default: feature_data_version dos dados)
+
+    Returns:
+        RFFeatureStore com as colunas materializadas
+    """
+    user_ids = np.asarray(users["user_id"], dtype=np.int32)
+    movie_ids = np.asarray(movies["movie_id"], dtype=np.int32)
+    user_order, movie_order = np.argsort(user_ids, kind="stable"), np.argsort(movie_ids, kind="stable")
+    user_ids, movie_ids = user_ids[user_order], movie_ids[movie_order]
+    n_users, n_movies = len(user_ids), len(movie_ids)
+
+    rating_users, rating_movies, rating_values = ratings
+    rating_values = np.asarray(rating_values, dtype=np.float64)
+    user_idx = lookup_ids(user_ids, rating_users)
+    movie_idx = lookup_ids(movie_ids, rating_movies)
+    known = (user_idx >= 0) & (movie_idx >= 0)
+    user_idx, movie_idx, rating_values = user_idx[known], movie_idx[known], rating_values[known]
+    if (~known).any():
+        logger.warning(f"{int((~known).sum())} avaliações ignoradas (usuário ou filme fora das tabelas)")
+
+    global_mean = float(rating_values.mean()) if len(rating_values) else 3.0
+    global_std = float(rating_values.std()) if len(rating_values) else 1.0
+
+    user_counts = np.bincount(user_idx, minlength=n_users).astype(np.float64)
+    user_sums = np.bincount(user_idx, weights=rating_values, minlength=n_users)
+    user_squares = np.bincount(user_idx, weights=rating_values ** 2, minlength=n_users)
+    user_means = _shrunk_mean(user_sums, user_counts, global_mean)
+    user_variance = _shrunk_mean(user_squares, user_counts, global_mean ** 2 + global_std ** 2) - user_means.astype(np.float64) ** 2
+    movie_counts = np.bincount(movie_idx, minlength=n_movies).astype(np.float64)
+    movie_sums = np.bincount(movie_idx, weights=rating_values, minlength=n_movies)
+
+    genres = np.column_stack([np.asarray(movies[g], dtype=np.uint8)[movie_order] for g in GENRE_COLUMNS])
+    years = release_years(np.asarray(movies["release_date"])[movie_order])
+    known_years = years[years >= 0]
+    year_fill = int(np.median(known_years)) if len(known_years) else 1995
+
+    # Usuário x gênero: somas e contagens por (usuário, gênero) via matriz esparsa usuários x filmes
+    # (SciPy importado aqui: a API só faz lookup no feature store)
+    from scipy import sparse
+
+    rated = sparse.csr_matrix((rating_values, (user_idx, movie_idx)), shape=(n_users, n_movies))
+    rated_count = sparse.csr_matrix((np.ones(len(user_idx)), (user_idx, movie_idx)), shape=(n_users, n_movies))
+    genre_sums = np.asarray(rated @ genres.astype(np.float64))
+    genre_counts = np.asarray(rated_count @ genres.astype(np.float64))
+    user_genre_means = _shrunk_mean(genre_sums, genre_counts, user_means[:, None].astype(np.float64))
+
+    columns = {
+        "user_ids": user_ids,
+        "age": np.asarray(users["age"], dtype=np.int16)[user_order],
+        "gender_enc": encode_gender(np.asarray(users["gender"])[user_order]),
+        "occupation_enc": encode_occupation(np.asarray(users["occupation"])[user_order]),
+        "user_n_ratings": user_counts.astype(np.int32),
+        "user_mean_rating": user_means,
+        "user_std_rating": np.sqrt(np.maximum(user_variance, 0)).astype(np.float32),
+        "user_genre_means": user_genre_means,
+        "movie_ids": movie_ids,
+        "release_year": np.where(years >= 0, years, year_fill).astype(np.int16),
+        "movie_n_ratings": movie_counts.astype(np.int32),
+        "movie_mean_rating": _shrunk_mean(movie_sums, movie_counts, global_mean),
+    }
+    for i, genre in enumerate(GENRE_COLUMNS):
+        columns[genre] = np.ascontiguousarray(genres[:, i])
+
+    known_ages = columns["age"][columns["age"] >= 0]
+    metadata = {
+        "version": version or feature_data_version(users, movies, ratings),
+        "created_at": datetime.now().isoformat(),
+        "n_ratings": int(len(rating_values)),
+        "global_mean": global_mean,
+        "global_std": global_std,
+        "prior_weight": PRIOR_WEIGHT,
+        "encodings": {"gender": GENDER_CODES, "occupation": list(OCCUPATIONS), "unknown": UNKNOWN_CODE},
+        "release_year_fill": year_fill,
+        # Valores usados para usuários e filmes ausentes do feature store
+        "defaults": {
+            "age": float(np.median(known_ages)) if len(known_ages) else 30.0,
+            "gender_enc": float(UNKNOWN_CODE),
+            "occupation_enc": float(UNKNOWN_CODE),
+            "user_n_ratings": 0.0,
+            "user_mean_rating": global_mean,
+            "user_std_rating": global_std,
+            "release_year": float(year_fill),
+            **{genre: 0.0 for genre in GENRE_COLUMNS},
+            "movie_n_ratings": 0.0,
+            "movie_mean_rating": global_mean,
+        },
+        "feature_names": list(FEATURE_NAMES),
+    }
+    store = RFFeatureStore(columns, metadata)
+    logger.info(f"Features do Random Forest {store.version}: {n_users} usuários, {n_movies} filmes, {len(rating_values)} avaliações")
+    return store
+
+
+class RFFeatureStore:
+    """Features materializadas do Random Forest, com lookup vetorizado por (usuário, filme)"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], metadata: Dict):
+        """
+        Inicializa o feature store a partir das colunas materializadas
+
+        As colunas tipadas são reunidas em duas tabelas float32 (usuários
+        e filmes), com uma linha extra de valores default no fim para ids
+        desconhecidos.
+
+        Args:
+            columns: Colunas gravadas por materialize_features
+            metadata: Versão, encodings, defaults e nomes das features
+        """
+        self.columns = dict(columns)
+        self.metadata = dict(metadata)
+        self.version = metadata["version"]
+        self.feature_names = tuple(metadata.get("feature_names", FEATURE_NAMES))
+        defaults = metadata["defaults"]
+
+        self.user_ids = np.asarray(columns["user_ids"])
+        self.movie_ids = np.asarray(columns["movie_ids"])
+        self._user_table = self._table(USER_FEATURES, defaults)
+        self._movie_table = self._table(MOVIE_FEATURES, defaults)
+        user_means = np.asarray(columns["user_mean_rating"], dtype=np.float32)
+        self._user_genre_means = np.vstack([
+            np.asarray(columns["user_genre_means"], dtype=np.float32),
+            np.full((1, len(GENRE_COLUMNS)), defaults["user_mean_rating"], dtype=np.float32)
+        ])
+        self._user_means = np.r_[user_means, np.float32(defaults["user_mean_rating"])]
+        self._genre_slice = slice(MOVIE_FEATURES.index(GENRE_COLUMNS[0]), MOVIE_FEATURES.index(GENRE_COLUMNS[-1]) + 1)
+
+    def _table(self, names: Tuple[str, ...], defaults: Dict) -> np.ndarray:
+        """Tabela float32 [linhas + 1, colunas] (última linha = defaults)"""
+        table = np.column_stack([np.asarray(self.columns[name], dtype=np.float32) for name in names])
+        return np.vstack([table, np.array([[defaults[name] for name in names]], dtype=np.float32)])
+
+    @property
+    def n_users(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def n_movies(self) -> int:
+        return len(self.movie_ids)
+
+    def lookup(self, user_ids, movie_ids) -> np.ndarray:
+        """
+        Matriz de features para pares (usuário, filme), na ordem de FEATURE_NAMES
+
+        Usuários e filmes ausentes recebem os valores default (média
+        global, códigos desconhecidos, etc.).
+
+        Args:
+            user_ids: Ids externos dos usuários
+            movie_ids: Ids externos dos filmes (mesmo tamanho)
+
+        Returns:
+            Array float32 [n, len(feature_names)]
+        """
+        user_idx = lookup_ids(self.user_ids, user_ids)
+        movie_idx = lookup_ids(self.movie_ids, movie_ids)
+        if len(user_idx) != len(movie_idx):
+            raise ValueError("user_ids e movie_ids devem ter o mesmo tamanho")
+        user_idx[user_idx < 0] = self.n_users
+        movie_idx[movie_idx < 0] = self.n_movies
+
+        n_user, n_movie = len(USER_FEATURES), len(MOVIE_FEATURES)
+        features = np.empty((len(user_idx), len(FEATURE_NAMES)), dtype=np.float32)
+        for start in range(0, len(user_idx), LOOKUP_BLOCK_SIZE):
+            block = slice(start, start + LOOKUP_BLOCK_SIZE)
+            users, movies = user_idx[block], movie_idx[block]
+            features[block, :n_user] = self._user_table[users]
+            movie_rows = self._movie_table[movies]
+            features[block, n_user:n_user + n_movie] = movie_rows
+
+            # Afinidade: média das médias do usuário nos gêneros do filme (sem gênero: média do usuário)
+            genres = movie_rows[:, self._genre_slice]
+            n_genres = genres.sum(axis=1)
+            affinity = np.einsum("ij,ij->i", self._user_genre_means[users], genres)
+            features[block, -1] = np.where(n_genres > 0, affinity / np.maximum(n_genres, 1), self._user_means[users])
+        return features
+
+
+def write_feature_store(store: RFFeatureStore, directory: str) -> Dict:
+    """
+    Grava o feature store como bundle local (um .npy por coluna + manifest.json)
+
+    Returns:
+        Manifest gravado
+    """
+    manifest = {
+        "format": STORE_FORMAT,
+        "version": store.version,
+        "metadata": store.metadata,
+        "arrays": write_arrays(store.columns, directory)
+    }
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_feature_store(directory: str, mmap: bool = True) -> RFFeatureStore:
+    """Abre um feature store gravado por write_feature_store"""
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    return RFFeatureStore(read_arrays(directory, manifest, mmap), manifest["metadata"])
+
+
+def save_features_to_minio(minio_client, store: RFFeatureStore, set_latest: bool = True) -> str:
+    """
+    Publica uma versão do feature store no MinIO (features/rf/<versão>/)
+
+    Args:
+        minio_client: Instância de MinIOClient
+        store: Features materializadas
+        set_latest: Se True, aponta features/rf/LATEST para esta versão
+
+    Returns:
+        Chave do manifest gravado
+    """
+    with tempfile.TemporaryDirectory(prefix="rf-features-") as directory:
+        manifest = write_feature_store(store, directory)
+        key = upload_bundle(minio_client, directory, manifest, store.version, FEATURE_PREFIX)
+
+    if set_latest:
+        set_latest_feature_version(minio_client, store.version)
+
+    logger.info(f"Features do Random Forest {store.version} gravadas em {FEATURE_PREFIX}/{store.version}/")
+    return key
+
+
+def set_latest_feature_version(minio_client, version: str):
+    """Aponta features/rf/LATEST para uma versão publicada"""
+    pointer = minio_client.upload_file_dedup(version.encode("utf-8"), LATEST_POINTER, "text/plain", compression="none")
+    if not pointer["success"]:
+        raise RuntimeError("Falha ao atualizar ponteiro LATEST do feature store")
+
+
+def get_latest_feature_version(minio_client) -> Optional[str]:
+    """Versão apontada por features/rf/LATEST (None se nenhuma foi publicada)"""
+    data = minio_client.download_file(LATEST_POINTER)
+    return data.decode("utf-8").strip() if data else None
+
+
+def load_features_from_minio(minio_client, version: Optional[str] = None) -> Optional[RFFeatureStore]:
+    """
+    Carrega uma versão do feature store do MinIO (default: LATEST)
+
+    As colunas são copiadas uma vez para FEATURE_STORE_DIR e abertas
+    com mmap; chamadas seguintes com a mesma versão não baixam nada.
+
+    Returns:
+        RFFeatureStore ou None se a versão não existe
+    """
+    latest = get_latest_feature_version(minio_client)
+    version = version or latest
+    if not version:
+        return None
+    directory = fetch_bundle(minio_client, version, local_feature_root(), FEATURE_PREFIX)
+    if directory is None:
+        return None
+    store = load_feature_store(directory)
+    mark_bundle_loaded(directory)
+    prune_local_bundles(local_feature_root(), protect=[latest] if latest else [])
+    logger.info(f"Features do Random Forest {store.version} carregadas ({store.n_users} usuários, {store.n_movies} filmes)")
+    return store
@@ -0,0 +1,280 @@
+"""
+Random Forest compacto para inferência online (Step 14 do notebook)
+As árvores do RandomForestRegressor são achatadas em arrays NumPy contíguos
+(feature, threshold, filhos, valor) e percorridas de forma vetorizada, sem o objeto sklearn
+"""
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from .storage import MANIFEST_NAME, fetch_bundle, mark_bundle_loaded, prune_local_bundles, read_arrays, upload_bundle, write_arrays
+
+logger = logging.getLogger(__name__)
+
+FOREST_PREFIX = "models/rf"
+LATEST_POINTER = f"{FOREST_PREFIX}/LATEST"
+FOREST_FORMAT = "rf-forest/1"
+
+# Arrays do modelo; os nós de todas as árvores ficam concatenados
+ARRAY_FIELDS = (
+    "tree_roots",      # int32 [T]  índice do nó raiz de cada árvore
+    "feature",         # int32 [N]  feature testada no nó (0 nas folhas)
+    "threshold",       # float32 [N] vai à esquerda se x <= threshold (+inf nas folhas)
+    "children",        # int32 [N, 2] filhos esquerdo e direito (o próprio nó nas folhas)
+    "value",           # float32 [N] predição da folha
+)
+
+# Pares (amostra, árvore) percorridos por passada: limita a memória do predict e mantém
+# os nós das árvores da passada no cache (lotes grandes passam poucas árvores por vez)
+PREDICT_BLOCK_SIZE = 100_000
+
+
+def local_forest_root() -> str:
+    """Diretório local das versões do Random Forest (RF_MODEL_DIR)"""
+    return os.getenv("RF_MODEL_DIR", os.path.join(tempfile.gettempdir(), "rf-models"))
+
+
+def float32_thresholds(thresholds: np.ndarray) -> np.ndarray:
+    """
+    Converte thresholds float64 do sklearn em float32 sem mudar nenhuma decisão
+
+    O sklearn compara entradas float32 com thresholds float64; usando o
+    maior float32 <= threshold, x <= t continua valendo para todo x float32.
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    rounded = thresholds.astype(np.float32)
+    above = rounded.astype(np.float64) > thresholds
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def export_forest(estimator, feature_names: Optional[Sequence[str]] = None, metadata: Optional[Dict] = None) -> "CompactForest":
+    """
+    Achata um RandomForestRegressor (ou uma árvore de regressão) em arrays contíguos
+
+    Args:
+        estimator: Modelo sklearn treinado (estimators_ ou tree_)
+        feature_names: Nomes das features, na ordem do treino (default: feature_names_in_ do modelo)
+        metadata: Informações extras gravadas com o modelo
+
+    Returns:
+        CompactForest equivalente ao modelo
+    """
+    trees = [tree.tree_ for tree in getattr(estimator, "estimators_", [estimator])]
+    if feature_names is None:
+        if not hasattr(estimator, "feature_names_in_"):
+            raise ValueError("Informe feature_names: o modelo foi treinado sem nomes de features")
+        feature_names = estimator.feature_names_in_
+    feature_names = [str(name) for name in feature_names]
+    if len(feature_names) != trees[0].n_features:
+        raise ValueError(f"O modelo usa {trees[0].n_features} features, {len(feature_names)} nomes informados")
+
+    sizes = np.array([tree.node_count for tree in trees], dtype=np.int64)
+    offsets = np.r_[0, np.cumsum(sizes)[:-1]]
+    feature, threshold, children, value = [], [], [], []
+    for tree, offset in zip(trees, offsets):
+        nodes = np.arange(tree.node_count, dtype=np.int64) + offset
+        leaf = tree.children_left < 0
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(np.where(leaf, np.inf, float32_thresholds(tree.threshold)))
+        children.append(np.column_stack([
+            np.where(leaf, nodes, tree.children_left + offset),
+            np.where(leaf, nodes, tree.children_right + offset)
+        ]))
+        value.append(tree.value[:, 0, 0])
+
+    arrays = {
+        "tree_roots": offsets.astype(np.int32),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float32),
+        "children": np.concatenate(children).astype(np.int32),
+        "value": np.concatenate(value).astype(np.float32),
+    }
+    metadata = {
+        "model_version": f"random_forest-{datetime.now():%Y%m%dT%H%M%S}",
+        **(metadata or {}),
+        "n_trees": len(trees),
+        "max_depth": int(max(tree.max_depth for tree in trees)),
+        "feature_names": feature_names,
+    }
+    return CompactForest(arrays, metadata)
+
+
+class CompactForest:
+    """Floresta de regressão em arrays NumPy, com predição vetorizada por blocos"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], metadata: Dict):
+        """
+        Inicializa a floresta a partir dos arrays exportados
+
+        Args:
+            arrays: Dicionário com todos os campos de ARRAY_FIELDS
+            metadata: model_version, max_depth, feature_names, ...
+        """
+        missing = [name for name in ARRAY_FIELDS if name not in arrays]
+        if missing:
+            raise ValueError(f"Arrays ausentes na floresta: {missing}")
+        for name in ARRAY_FIELDS:
+            setattr(self, name, arrays[name])
+
+        self.metadata = dict(metadata)
+        self.model_version = metadata.get("model_version", "unknown")
+        self.max_depth = int(metadata["max_depth"])
+        self.feature_names = list(metadata["feature_names"])
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.tree_roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.value)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(getattr(self, name).nbytes for name in ARRAY_FIELDS))
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Retorna os arrays da floresta (para serialização)"""
+        return {name: getattr(self, name) for name in ARRAY_FIELDS}
+
+    def column_order(self, feature_names: Sequence[str]) -> np.ndarray:
+        """
+        Posição de cada feature do modelo numa matriz com as colunas feature_names
+
+        Raises:
+            ValueError: se alguma feature do modelo não está disponível
+        """
+        positions = {name: i for i, name in enumerate(feature_names)}
+        missing = [name for name in self.feature_names if name not in positions]
+        if missing:
+            raise ValueError(f"Features ausentes para o modelo {self.model_version}: {missing}")
+        return np.array([positions[name] for name in self.feature_names], dtype=np.int64)
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """
+        Prediz a nota de cada linha (média das folhas de todas as árvores)
+
+        Os pares (linha, árvore) de uma passada descem juntos, um nível
+        por iteração: as folhas apontam para si mesmas, então max_depth
+        iterações bastam. Cada passada cobre até PREDICT_BLOCK_SIZE pares:
+        lotes pequenos percorrem todas as árvores de uma vez, lotes
+        grandes poucas árvores por passada.
+
+        Args:
+            features: Matriz [n, n_features] com as colunas em feature_names (ou uma linha)
+
+        Returns:
+            Array float64 [n] com as predições
+        """
+        features = np.atleast_2d(np.ascontiguousarray(features, dtype=np.float32))
+        n_rows, n_features = features.shape
+        if n_features != len(self.feature_names):
+            raise ValueError(f"Esperadas {len(self.feature_names)} features, recebidas {n_features}")
+
+        n_trees = self.n_trees
+        trees_per_pass = max(1, min(n_trees, PREDICT_BLOCK_SIZE // max(n_rows, 1)))
+        rows_per_pass = max(1, PREDICT_BLOCK_SIZE // trees_per_pass)
+        flat = features.reshape(-1)
+        children = self.children.reshape(-1)
+        predictions = np.zeros(n_rows, dtype=np.float64)
+        for start in range(0, n_rows, rows_per_pass):
+            stop = min(start + rows_per_pass, n_rows)
+            for first_tree in range(0, n_trees, trees_per_pass):
+                roots = self.tree_roots[first_tree:first_tree + trees_per_pass]
+                # Deslocamento de cada par (linha, árvore) no vetor achatado de features
+                row_offsets = np.repeat(np.arange(start, stop, dtype=np.intp) * n_features, len(roots))
+                nodes = np.tile(roots, stop - start).astype(np.intp)
+                for _ in range(self.max_depth):
+                    go_right = np.take(flat, np.take(self.feature, nodes) + row_offsets) > np.take(self.threshold, nodes)
+                    nodes = np.take(children, 2 * nodes + go_right)
+                leaves = np.take(self.value, nodes).reshape(stop - start, len(roots))
+                predictions[start:stop] += leaves.sum(axis=1, dtype=np.float64)
+        predictions /= max(n_trees, 1)
+        return predictions
+
+
+def write_forest(forest: CompactForest, directory: str) -> Dict:
+    """
+    Grava a floresta como bundle local (um .npy por array + manifest.json)
+
+    Returns:
+        Manifest gravado
+    """
+    manifest = {
+        "format": FOREST_FORMAT,
+        "model_version": forest.model_version,
+        "metadata": forest.metadata,
+        "arrays": write_arrays(forest.arrays(), directory)
+    }
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_forest(directory: str, mmap: bool = True) -> CompactForest:
+    """Abre uma floresta gravada por write_forest"""
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    return CompactForest(read_arrays(directory, manifest, mmap), manifest["metadata"])
+
+
+def save_forest_to_minio(minio_client, forest: CompactForest, set_latest: bool = True) -> str:
+    """
+    Publica uma versão da floresta no MinIO (models/rf/<versão>/)
+
+    Args:
+        minio_client: Instância de MinIOClient
+        forest: Floresta exportada
+        set_latest: Se True, aponta models/rf/LATEST para esta versão
+
+    Returns:
+        Chave do manifest gravado
+    """
+    with tempfile.TemporaryDirectory(prefix="rf-forest-") as directory:
+        manifest = write_forest(forest, directory)
+        key = upload_bundle(minio_client, directory, manifest, forest.model_version, FOREST_PREFIX)
+
+    if set_latest:
+        pointer = minio_client.upload_file_dedup(forest.model_version.encode("utf-8"), LATEST_POINTER, "text/plain", compression="none")
+        if not pointer["success"]:
+            raise RuntimeError("Falha ao atualizar ponteiro LATEST do Random Forest")
+
+    logger.info(f"Random Forest {forest.model_version} gravado em {FOREST_PREFIX}/{forest.model_version}/")
+    return key
+
+
+def get_latest_forest_version(minio_client) -> Optional[str]:
+    """Versão apontada por models/rf/LATEST (None se nenhuma foi publicada)"""
+    data = minio_client.download_file(LATEST_POINTER)
+    return data.decode("utf-8").strip() if data else None
+
+
+def load_forest_from_minio(minio_client, model_version: Optional[str] = None) -> Optional[CompactForest]:
+    """
+    Carrega uma versão da floresta do MinIO (default: LATEST)
+
+    Os arrays são copiados uma vez para RF_MODEL_DIR e abertos com
+    mmap, compartilhados entre os workers da API.
+
+    Returns:
+        CompactForest ou None se a versão não existe
+    """
+    latest = get_latest_forest_version(minio_client)
+    model_version = model_version or latest
+    if not model_version:
+        return None
+    directory = fetch_bundle(minio_client, model_version, local_forest_root(), FOREST_PREFIX)
+    if directory is None:
+        return None
+    forest = load_forest(directory)
+    mark_bundle_loaded(directory)
+    prune_local_bundles(local_forest_root(), protect=[latest] if latest else [])
+    logger.info(f"Random Forest {forest.model_version} carregado ({forest.n_trees} árvores, {forest.n_nodes} nós, {forest.nbytes / 1e6:.1f} MB)")
+    return forest
+
@@ -0,0 +1,333 @@
+"""
+Busca em grade de hiperparâmetros (K clusters x N vizinhos) em paralelo
+Substitui o evaluate_model() do notebook (Step 12): clustering por K feito uma vez,
+todos os N avaliados sobre as mesmas similaridades e o conjunto de teste completo
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .clustering import ClusterCache, fit_kmeans, fit_signature, limit_worker_threads, matrix_version, process_pool_context
+from .evaluation import error_metrics, ranking_metrics
+from .model import KMeansKNNModel
+from .training import assemble_arrays, build_utility_matrix, cluster_user_means, normalize_user_vectors
+
+logger = logging.getLogger(__name__)
+
+# Grade do notebook
+DEFAULT_K_VALUES = (2, 5, 8, 12, 15)
+DEFAULT_N_VALUES = (5, 10, 20)
+
+# Corte das métricas de ranking registradas em cada resultado
+RANKING_K = 10
+
+# Versão do formato dos resultados em cache (mudar ao adicionar métricas)
+RESULT_FORMAT = 2
+
+# Descritores dos arrays compartilhados com os processos da busca (anexados a cada tarefa)
+_shared_descriptors = None
+
+
+class SharedArrays:
+    """Arrays NumPy em memória compartilhada (multiprocessing.shared_memory)"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        """Copia os arrays para blocos de memória compartilhada"""
+        self._blocks = []
+        self.descriptors = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self._blocks.append(block)
+            self.descriptors[name] = (block.name, array.shape, array.dtype.str)
+
+    @staticmethod
+    @contextmanager
+    def attach(descriptors: Dict[str, Tuple]) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Anexa os blocos em outro processo, sem cópia, e os fecha na saída
+
+        Os arrays não podem ser usados depois do bloco with.
+
+        Yields:
+            Dicionário de arrays somente leitura
+        """
+        arrays, blocks = {}, []
+        try:
+            for name, (block_name, shape, dtype) in descriptors.items():
+                block = shared_memory.SharedMemory(name=block_name)
+                blocks.append(block)
+                array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+                array.flags.writeable = False
+                arrays[name] = array
+            yield arrays
+        finally:
+            arrays.clear()
+            for block in blocks:
+                try:
+                    block.close()
+                except BufferError:
+                    # Ainda há views (ex.: no traceback de uma exceção); o mapeamento sai com o processo
+                    logger.warning(f"Bloco compartilhado {block.name} com views ativas; não foi fechado")
+
+    def close(self):
+        """Libera os blocos (chamar no processo que os criou)"""
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GridResultCache:
+    """Cache em disco de resultados da busca por (K, N, versão dos dados)"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["GridResultCache"]:
+        """Cria o cache a partir de GRID_SEARCH_CACHE_DIR (vazio desabilita)"""
+        cache_dir = os.getenv("GRID_SEARCH_CACHE_DIR", "/tmp/grid-search-cache")
+        return cls(cache_dir) if cache_dir else None
+
+    def _path(self, k: int, n: int, data_version: str) -> str:
+        return os.path.join(self.cache_dir, data_version, f"k{k}_n{n}_v{RESULT_FORMAT}.json")
+
+    def get(self, k: int, n: int, data_version: str) -> Optional[Dict]:
+        try:
+            with open(self._path(k, n, data_version)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, k: int, n: int, data_version: str, result: Dict):
+        path = self._path(k, n, data_version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+
+def grid_data_version(train_version: str, test_users: np.ndarray, test_movies: np.ndarray, test_ratings: np.ndarray) -> str:
+    """Versão dos dados da busca: matriz de treino + conjunto de teste"""
+    digest = hashlib.sha256(train_version.encode("utf-8"))
+    for array in (test_users, test_movies, test_ratings):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _init_grid_worker(descriptors: Dict[str, Tuple], threads_per_worker: int):
+    """Inicializa um processo da busca: guarda os descritores dos arrays compartilhados"""
+    global _shared_descriptors
+    _shared_descriptors = descriptors
+    limit_worker_threads(threads_per_worker)
+
+
+def _evaluate_k(
+    k: int,
+    n_values: List[int],
+    random_state: int,
+    train_version: str,
+    cluster_cache_dir: Optional[str]
+) -> Dict:
+    """
+    Avalia um K para todos os N: clustering, utility clustered matrix e similaridades uma vez
+
+    Executado nos processos da busca; os arrays compartilhados são
+    anexados durante a tarefa e fechados ao final.
+    """
+    with SharedArrays.attach(_shared_descriptors) as arrays:
+        return _evaluate_k_arrays(arrays, k, n_values, random_state, train_version, cluster_cache_dir)
+
+
+def _evaluate_k_arrays(
+    arrays: Dict[str, np.ndarray],
+    k: int,
+    n_values: List[int],
+    random_state: int,
+    train_version: str,
+    cluster_cache_dir: Optional[str]
+) -> Dict:
+    """Corpo de _evaluate_k sobre os arrays já anexados"""
+    start = time.perf_counter()
+
+    n_users, n_movies = len(arrays["user_ids"]), len(arrays["movie_ids"])
+    movie_matrix = build_utility_matrix(
+        arrays["train_movie_idx"], arrays["train_user_idx"], arrays["train_ratings"], n_movies, n_users
+    )
+
+    cache = ClusterCache(cluster_cache_dir) if cluster_cache_dir else None
+    signature = fit_signature(random_state=random_state)
+    cached = cache.get(k, train_version, signature) if cache else None
+    if cached is not None:
+        movie_clusters = cached["labels"].astype(np.int32)
+    else:
+        fit = fit_kmeans(movie_matrix, k, random_state=random_state)
+        movie_clusters = fit["labels"]
+        if cache:
+            cache.put(k, train_version, signature, fit)
+    cluster_seconds = time.perf_counter() - start
+
+    user_cluster_means = cluster_user_means(
+        arrays["train_user_idx"], arrays["train_movie_idx"], arrays["train_ratings"],
+        movie_clusters, n_users, k
+    )
+    model_arrays = {name: arrays[name] for name in arrays if not name.startswith(("train_", "test_"))}
+    model_arrays.update({
+        "movie_clusters": movie_clusters,
+        "user_cluster_means": user_cluster_means,
+        "user_vectors": normalize_user_vectors(user_cluster_means),
+        # Índice de vizinhos não é usado na avaliação
+        "neighbor_ids": np.empty((n_users, 0), dtype=np.int32),
+        "neighbor_sims": np.empty((n_users, 0), dtype=np.float32),
+    })
+    model = KMeansKNNModel(model_arrays, {"model_version": f"grid-k{k}", "global_mean": float(arrays["global_mean"][0])})
+
+    predict_start = time.perf_counter()
+    predictions = model.predict_batch_multi(arrays["test_user_ids"], arrays["test_movie_ids"], n_values)
+    predict_seconds = time.perf_counter() - predict_start
+
+    results = {}
+    for n in n_values:
+        ranking = ranking_metrics(
+            arrays["test_user_ids"], arrays["test_movie_ids"], arrays["test_ratings"], predictions[n], (RANKING_K,)
+        )["by_k"][0]
+        results[n] = {
+            "k": k,
+            "n": n,
+            **error_metrics(arrays["test_ratings"], predictions[n]),
+            **{f"{metric}_at_{RANKING_K}": round(ranking[metric], 6)
+               for metric in ("precision", "recall", "ndcg", "map", "coverage")},
+            "cluster_seconds": round(cluster_seconds, 3),
+            "predict_seconds": round(predict_seconds, 3)
+        }
+    return results
+
+
+def grid_search(
+    train: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    test: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    k_values: Iterable[int] = DEFAULT_K_VALUES,
+    n_values: Iterable[int] = DEFAULT_N_VALUES,
+    random_state: int = 42,
+    max_workers: Optional[int] = None,
+    cluster_cache: Optional[ClusterCache] = None,
+    result_cache: Optional[GridResultCache] = None
+) -> Dict:
+    """
+    Avalia RMSE/MAE e métricas de ranking@10 no conjunto de teste completo para cada (K, N)
+
+    Os arrays de treino/teste e os índices de avaliações (independentes
+    de K) são montados uma vez e compartilhados com os processos por
+    memória compartilhada. Cada processo trata um K: o clustering e as
+    similaridades são calculados uma vez e reaproveitados para todos os
+    N. Resultados ficam em cache por (K, N, versão dos dados).
+
+    Args:
+        train: Tupla (user_ids, movie_ids, ratings) de treino
+        test: Tupla (user_ids, movie_ids, ratings) de teste
+        k_values: Valores de K (clusters)
+        n_values: Valores de N (vizinhos)
+        random_state: Semente do K-Means
+        max_workers: Processos (default: número de CPUs, limitado ao número de K)
+        cluster_cache: Cache de ajustes do K-Means (opcional)
+        result_cache: Cache de resultados (opcional)
+
+    Returns:
+        Dicionário com data_version, best, total_seconds e results (lista por K, N)
+    """
+    start = time.perf_counter()
+    k_values = sorted(set(int(k) for k in k_values))
+    n_values = sorted(set(int(n) for n in n_values))
+
+    train_users, train_movies, train_ratings = (np.asarray(a) for a in train)
+    train_ratings = train_ratings.astype(np.float32)
+    test_users, test_movies, test_ratings = (np.asarray(a) for a in test)
+
+    unique_users, user_idx = np.unique(train_users, return_inverse=True)
+    unique_movies, movie_idx = np.unique(train_movies, return_inverse=True)
+    train_version = matrix_version(
+        build_utility_matrix(movie_idx, user_idx, train_ratings, len(unique_movies), len(unique_users))
+    )
+    data_version = grid_data_version(train_version, test_users, test_movies, test_ratings)
+
+    results = {}
+    pending = []
+    for k in k_values:
+        cached = [result_cache.get(k, n, data_version) for n in n_values] if result_cache else [None]
+        if all(r is not None for r in cached):
+            for r in cached:
+                results[(k, r["n"])] = {**r, "cached": True}
+        else:
+            pending.append(k)
+
+    if pending:
+        # Partes do modelo que não dependem de K (ids, médias, índices CSR/CSC)
+        n_users = len(unique_users)
+        placeholder = np.zeros((n_users, 1), dtype=np.float32)
+        base = assemble_arrays(
+            unique_users, unique_movies, user_idx, movie_idx, train_ratings,
+            np.zeros(len(unique_movies), dtype=np.int32), placeholder, placeholder
+        )
+        for name in ("movie_clusters", "user_cluster_means", "user_vectors"):
+            del base[name]
+        base.update({
+            "train_user_idx": user_idx.astype(np.int32),
+            "train_movie_idx": movie_idx.astype(np.int32),
+            "train_ratings": train_ratings,
+            "test_user_ids": test_users,
+            "test_movie_ids": test_movies,
+            "test_ratings": test_ratings.astype(np.float32),
+            "global_mean": np.array([train_ratings.mean() if len(train_ratings) else 3.0]),
+        })
+
+        cpu_count = os.cpu_count() or 1
+        max_workers = max(1, min(max_workers or cpu_count, len(pending)))
+        logger.info(f"Busca em grade {data_version}: K={pending} x N={n_values} em {max_workers} processos")
+
+        with SharedArrays(base) as shared:
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=process_pool_context(),
+                initializer=_init_grid_worker,
+                initargs=(shared.descriptors, max(1, cpu_count // max_workers))
+            ) as executor:
+                futures = {
+                    k: executor.submit(
+                        _evaluate_k, k, n_values, random_state, train_version,
+                        cluster_cache.cache_dir if cluster_cache else None
+                    )
+                    for k in pending
+                }
+                for k, future in futures.items():
+                    for n, result in future.result().items():
+                        if result_cache:
+                            result_cache.put(k, n, data_version, result)
+                        results[(k, n)] = {**result, "cached": False}
+
+    ordered = [results[(k, n)] for k in k_values for n in n_values]
+    best = min(ordered, key=lambda r: r["rmse"]) if ordered else None
+    return {
+        "data_version": data_version,
+        "n_test": int(len(test_ratings)),
+        "best": {"k": best["k"], "n": best["n"], "rmse": best["rmse"]} if best else None,
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "results": ordered
+    }
@@ -0,0 +1,295 @@
+"""
+Atualização incremental do modelo K-Means + KNN a partir de novas avaliações
+Mantém os clusters de filmes e recalcula apenas o que as novas avaliações afetam
+"""
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .ann import LSHIndex
+from .model import KMeansKNNModel, gather_rows
+from .neighbors import SIMILARITY_BLOCK_SIZE, build_neighbor_index, merge_neighbor_candidates, neighbor_rows
+from .training import assemble_arrays, cluster_user_means, normalize_user_vectors
+
+logger = logging.getLogger(__name__)
+
+# Acima desta fração de usuários afetados, o índice de vizinhos é recalculado inteiro
+FULL_REBUILD_FRACTION = 0.5
+
+
+def merge_ratings(
+    model: KMeansKNNModel,
+    user_ids: np.ndarray,
+    movie_ids: np.ndarray,
+    ratings: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Junta as avaliações do modelo com as novas (a nova prevalece em (usuário, filme) repetido)
+
+    Returns:
+        Tupla (user_ids, movie_ids, ratings) com ids externos, sem pares repetidos
+    """
+    old_users = np.repeat(model.user_ids, np.diff(model.user_indptr))
+    old_movies = model.movie_ids[model.user_movies]
+
+    all_users = np.concatenate([old_users, np.asarray(user_ids, dtype=np.int64)])
+    all_movies = np.concatenate([old_movies, np.asarray(movie_ids, dtype=np.int64)])
+    all_ratings = np.concatenate([model.user_ratings, np.asarray(ratings, dtype=np.float32)])
+
+    # Primeira ocorrência na ordem invertida = última avaliação de cada par
+    keys = all_users.astype(np.int64) * (int(all_movies.max()) + 1) + all_movies
+    _, last = np.unique(keys[::-1], return_index=True)
+    keep = len(keys) - 1 - last
+    return all_users[keep], all_movies[keep], all_ratings[keep]
+
+
+def changed_ratings(
+    model: KMeansKNNModel,
+    user_ids: np.ndarray,
+    movie_ids: np.ndarray,
+    ratings: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Remove as avaliações que o modelo já tem com a mesma nota
+
+    A leitura incremental usa uma janela que se sobrepõe à anterior
+    (ver ratings_watermark); as avaliações relidas sem mudança não
+    devem marcar o usuário como tocado.
+
+    Returns:
+        Tupla (user_ids, movie_ids, ratings) só com pares novos ou com nota alterada
+    """
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    ratings = np.asarray(ratings, dtype=np.float32)
+    if len(ratings) == 0 or len(model.user_ratings) == 0:
+        return user_ids, movie_ids, ratings
+
+    old_users = np.repeat(model.user_ids, np.diff(model.user_indptr)).astype(np.int64)
+    old_movies = model.movie_ids[model.user_movies].astype(np.int64)
+    base = int(max(old_movies.max(), movie_ids.max())) + 1
+    old_keys = old_users * base + old_movies
+    order = np.argsort(old_keys)
+    old_keys, old_ratings = old_keys[order], model.user_ratings[order]
+
+    keys = user_ids * base + movie_ids
+    position = np.minimum(np.searchsorted(old_keys, keys), len(old_keys) - 1)
+    unchanged = (old_keys[position] == keys) & (old_ratings[position] == ratings)
+    return user_ids[~unchanged], movie_ids[~unchanged], ratings[~unchanged]
+
+
+def assign_new_movie_clusters(
+    new_movies: np.ndarray,
+    user_idx: np.ndarray,
+    movie_idx: np.ndarray,
+    ratings: np.ndarray,
+    user_cluster_means: np.ndarray
+) -> np.ndarray:
+    """
+    Escolhe o cluster de filmes novos sem refazer o K-Means
+
+    Cada filme novo vai para o cluster cujas médias (dos usuários que
+    o avaliaram) mais se aproximam das notas recebidas (menor erro
+    quadrático médio). Filmes sem informação vão para o maior cluster.
+
+    Args:
+        new_movies: Índices (novos) dos filmes sem cluster
+        user_idx: Índice do usuário de cada avaliação
+        movie_idx: Índice do filme de cada avaliação
+        ratings: Nota de cada avaliação
+        user_cluster_means: Utility clustered matrix [U, K] antes da atualização
+
+    Returns:
+        Array int32 [len(new_movies)] com o cluster de cada filme novo
+    """
+    k_clusters = user_cluster_means.shape[1]
+    position = np.full(int(movie_idx.max()) + 1 if len(movie_idx) else 0, -1, dtype=np.int64)
+    position[new_movies] = np.arange(len(new_movies))
+
+    selected = position[movie_idx] >= 0
+    rows = position[movie_idx[selected]]
+    means = user_cluster_means[user_idx[selected]]
+    observed = means > 0
+    errors = (ratings[selected, None] - means) ** 2 * observed
+
+    cells = rows[:, None] * k_clusters + np.arange(k_clusters)
+    size = len(new_movies) * k_clusters
+    error_sums = np.bincount(cells.ravel(), weights=errors.ravel(), minlength=size).reshape(-1, k_clusters)
+    counts = np.bincount(cells.ravel(), weights=observed.ravel(), minlength=size).reshape(-1, k_clusters)
+    mean_errors = np.divide(error_sums, counts, out=np.full_like(error_sums, np.inf), where=counts > 0)
+
+    largest = int(np.argmax((user_cluster_means > 0).sum(axis=0)))
+    clusters = np.where(np.isfinite(mean_errors).any(axis=1), mean_errors.argmin(axis=1), largest)
+    return clusters.astype(np.int32)
+
+
+def update_neighbor_index(
+    old_ids: np.ndarray,
+    old_sims: np.ndarray,
+    user_vectors: np.ndarray,
+    touched: np.ndarray,
+    k: int,
+    block_size: int = SIMILARITY_BLOCK_SIZE,
+    ann_index: Optional[LSHIndex] = None
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Atualiza o índice de vizinhos após mudança nos vetores dos usuários tocados
+
+    Linhas dos usuários tocados, e das que tinham um usuário tocado entre
+    os vizinhos, são recalculadas contra todos os usuários. As demais não
+    perderam nenhum vizinho; basta combiná-las com a nova similaridade
+    aos usuários tocados. O resultado é idêntico a um recálculo completo.
+    Com ann_index (já atualizado com os novos vetores), as linhas
+    recalculadas usam a busca aproximada em vez de todos os usuários.
+
+    Args:
+        old_ids: Índice anterior [U, k], já nos índices novos (linhas de usuários novos ignoradas)
+        old_sims: Similaridades anteriores [U, k]
+        user_vectors: Vetores atualizados [U, d]
+        touched: Índices dos usuários com vetor alterado (inclui usuários novos)
+        k: Vizinhos por usuário
+        block_size: Usuários por bloco
+        ann_index: Índice LSH sobre user_vectors (opcional)
+
+    Returns:
+        Tupla (neighbor_ids, neighbor_sims, linhas recalculadas)
+    """
+    n_users = len(user_vectors)
+    is_touched = np.zeros(n_users, dtype=bool)
+    is_touched[touched] = True
+
+    affected = is_touched | is_touched[old_ids].any(axis=1)
+    if affected.sum() > FULL_REBUILD_FRACTION * n_users or old_ids.shape[1] != min(k, n_users - 1):
+        if ann_index is not None:
+            neighbor_ids, neighbor_sims = ann_index.knn_graph(k)
+        else:
+            neighbor_ids, neighbor_sims = build_neighbor_index(user_vectors, k, block_size)
+        return neighbor_ids, neighbor_sims, n_users
+
+    neighbor_ids = old_ids.astype(np.int32)
+    neighbor_sims = old_sims.astype(np.float32)
+
+    recompute = np.flatnonzero(affected)
+    if ann_index is not None:
+        neighbor_ids[recompute], neighbor_sims[recompute] = ann_index.search(user_vectors[recompute], k, exclude=recompute)
+    else:
+        neighbor_ids[recompute], neighbor_sims[recompute] = neighbor_rows(user_vectors, recompute, k, block_size)
+
+    rest = np.flatnonzero(~affected)
+    touched_vectors = user_vectors[touched].T
+    for start in range(0, len(rest), block_size):
+        block = rest[start:start + block_size]
+        candidate_sims = user_vectors[block] @ touched_vectors
+        candidate_ids = np.broadcast_to(touched.astype(np.int32), candidate_sims.shape)
+        neighbor_ids[block], neighbor_sims[block] = merge_neighbor_candidates(
+            neighbor_ids[block], neighbor_sims[block], candidate_ids, candidate_sims, k
+        )
+
+    return neighbor_ids, neighbor_sims, len(recompute)
+
+
+def update_model(
+    model: KMeansKNNModel,
+    user_ids: np.ndarray,
+    movie_ids: np.ndarray,
+    ratings: np.ndarray,
+    model_version: Optional[str] = None
+) -> KMeansKNNModel:
+    """
+    Gera uma nova versão do modelo incorporando novas avaliações
+
+    Os clusters de filmes existentes são mantidos (filmes novos são
+    atribuídos ao cluster mais próximo). Apenas as linhas da utility
+    clustered matrix e os vetores dos usuários com avaliações novas são
+    recalculados; o índice de vizinhos é atualizado com update_neighbor_index.
+    Em modelos com índice aproximado (neighbor_method='lsh'), o índice LSH
+    da versão atual é copiado e só os usuários tocados são reinseridos.
+
+    Args:
+        model: Versão atual do modelo
+        user_ids: ID do usuário de cada nova avaliação
+        movie_ids: ID do filme de cada nova avaliação
+        ratings: Nota de cada nova avaliação
+        model_version: Versão do novo modelo (default: kmeans_knn-<timestamp>)
+
+    Returns:
+        Novo modelo (o modelo original não é alterado)
+    """
+    start = datetime.now()
+    all_users, all_movies, all_ratings = merge_ratings(model, user_ids, movie_ids, ratings)
+
+    unique_users, user_idx = np.unique(all_users, return_inverse=True)
+    unique_movies, movie_idx = np.unique(all_movies, return_inverse=True)
+    n_users, k_clusters = len(unique_users), model.k_clusters
+
+    # Posição de cada usuário/filme antigo nos novos índices (nenhum é removido)
+    old_users = np.searchsorted(unique_users, model.user_ids)
+    old_movies = np.searchsorted(unique_movies, model.movie_ids)
+
+    user_cluster_means = np.zeros((n_users, k_clusters), dtype=np.float32)
+    user_cluster_means[old_users] = model.user_cluster_means
+    user_vectors = np.zeros((n_users, k_clusters), dtype=np.float32)
+    user_vectors[old_users] = model.user_vectors
+
+    movie_clusters = np.full(len(unique_movies), -1, dtype=np.int32)
+    movie_clusters[old_movies] = model.movie_clusters
+    new_movies = np.flatnonzero(movie_clusters < 0)
+    if len(new_movies):
+        movie_clusters[new_movies] = assign_new_movie_clusters(
+            new_movies, user_idx, movie_idx, all_ratings, user_cluster_means
+        )
+
+    arrays = assemble_arrays(
+        unique_users, unique_movies, user_idx, movie_idx, all_ratings,
+        movie_clusters, user_cluster_means, user_vectors
+    )
+
+    # Linhas da utility clustered matrix e vetores dos usuários tocados
+    touched = np.unique(np.searchsorted(unique_users, np.asarray(user_ids)))
+    positions = gather_rows(arrays["user_indptr"], touched)
+    local_users = np.repeat(np.arange(len(touched)), np.diff(arrays["user_indptr"])[touched])
+    touched_means = cluster_user_means(
+        local_users, arrays["user_movies"][positions], arrays["user_ratings"][positions],
+        movie_clusters, len(touched), k_clusters
+    )
+    user_cluster_means[touched] = touched_means
+    user_vectors[touched] = normalize_user_vectors(touched_means)
+
+    # Índice de vizinhos: linhas de usuários novos começam vazias (são recalculadas)
+    index_neighbors = int(model.metadata.get("index_neighbors", model.neighbor_ids.shape[1]))
+    old_ids = np.zeros((n_users, model.neighbor_ids.shape[1]), dtype=np.int32)
+    old_sims = np.full(old_ids.shape, -np.inf, dtype=np.float32)
+    old_ids[old_users] = old_users[model.neighbor_ids]
+    old_sims[old_users] = model.neighbor_sims
+    ann_index = None
+    if model.metadata.get("neighbor_method") == "lsh":
+        ann_index = model.ann_index().copy()
+        ann_index.update(user_vectors, touched, mapping=old_users)
+    arrays["neighbor_ids"], arrays["neighbor_sims"], refreshed_rows = update_neighbor_index(
+        old_ids, old_sims, user_vectors, touched, index_neighbors, ann_index=ann_index
+    )
+
+    metadata = dict(model.metadata)
+    metadata.update({
+        "model_version": model_version or f"kmeans_knn-{start:%Y%m%dT%H%M%S}",
+        "parent_version": model.model_version,
+        "n_users": int(n_users),
+        "n_movies": int(len(unique_movies)),
+        "n_ratings": int(len(all_ratings)),
+        "global_mean": float(all_ratings.mean()) if len(all_ratings) else 3.0,
+        "incremental_ratings": int(len(ratings)),
+        "refreshed_users": int(len(touched)),
+        "refreshed_neighbor_rows": int(refreshed_rows),
+        "trained_at": start.isoformat(),
+        "training_seconds": round((datetime.now() - start).total_seconds(), 3)
+    })
+    logger.info(
+        f"Modelo {metadata['model_version']} atualizado a partir de {model.model_version}: "
+        f"{len(ratings)} avaliações, {len(touched)} usuários, {refreshed_rows} linhas do índice recalculadas "
+        f"em {metadata['training_seconds']}s"
+    )
+    updated = KMeansKNNModel(arrays, metadata)
+    updated.set_ann_index(ann_index)
+    return updated
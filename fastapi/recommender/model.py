@@ -0,0 +1,380 @@
+"""
+Modelo K-Means + KNN compacto para servir recomendações online
+Reproduz a função guess() do notebook (Parte 3) sobre arrays NumPy contíguos
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .ann import LSHIndex
+from .neighbors import build_neighbor_index
+
+
+# Arrays que compõem o modelo (todos obrigatórios)
+ARRAY_FIELDS = (
+    "user_ids",            # int32 [U]   id externo de cada usuário (ordenado)
+    "movie_ids",           # int32 [M]   id externo de cada filme (ordenado)
+    "movie_clusters",      # int32 [M]   cluster K-Means de cada filme
+    "user_cluster_means",  # float32 [U, K] utility clustered matrix
+    "user_vectors",        # float32 [U, K] vetores centralizados e normalizados (cosseno = produto interno)
+    "user_means",          # float32 [U] média das notas de cada usuário
+    "movie_means",         # float32 [M] média das notas de cada filme
+    "movie_counts",        # int32 [M]   número de avaliações de cada filme
+    "movie_indptr",        # int64 [M+1] CSC: avaliações agrupadas por filme
+    "movie_users",         # int32 [R]   índice do usuário de cada avaliação (CSC)
+    "movie_ratings",       # float32 [R] nota de cada avaliação (CSC)
+    "user_indptr",         # int64 [U+1] CSR: avaliações agrupadas por usuário
+    "user_movies",         # int32 [R]   índice do filme de cada avaliação (CSR)
+    "user_ratings",        # float32 [R] nota de cada avaliação (CSR)
+    "neighbor_ids",        # int32 [U, N] índice dos N usuários mais similares (ordem decrescente)
+    "neighbor_sims",       # float32 [U, N] similaridade com cada vizinho
+)
+
+# Arrays que podem ser reconstruídos se ausentes (modelos publicados antes do índice)
+DERIVED_ARRAY_FIELDS = ("neighbor_ids", "neighbor_sims")
+
+
+def gather_rows(indptr: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Posições (nos arrays CSR/CSC) de todas as entradas das linhas informadas
+
+    Args:
+        indptr: Ponteiros de início de cada linha (tamanho n_linhas + 1)
+        rows: Índices das linhas desejadas
+
+    Returns:
+        Array int64 com as posições, linha a linha, na ordem de rows
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return np.arange(total, dtype=np.int64) + offsets
+
+
+def lookup_ids(sorted_ids: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """
+    Converte ids externos em índices internos de forma vetorizada
+
+    Args:
+        sorted_ids: Ids conhecidos, em ordem crescente
+        query: Ids a converter
+
+    Returns:
+        Array int64 com o índice de cada id (-1 se desconhecido)
+    """
+    query = np.asarray(query)
+    if len(sorted_ids) == 0:
+        return np.full(len(query), -1, dtype=np.int64)
+    positions = np.searchsorted(sorted_ids, query)
+    positions = np.minimum(positions, len(sorted_ids) - 1)
+    return np.where(sorted_ids[positions] == query, positions, -1).astype(np.int64)
+
+
+# Máximo de similaridades (linhas x avaliadores) calculadas de uma vez no predict_batch
+BATCH_BLOCK_SIZE = 4_000_000
+
+
+class KMeansKNNModel:
+    """Modelo K-Means (filmes) + KNN (usuários) em arrays NumPy"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], metadata: Dict):
+        """
+        Inicializa o modelo a partir dos arrays treinados
+
+        Args:
+            arrays: Dicionário com todos os campos de ARRAY_FIELDS
+            metadata: Informações do modelo (model_version, k_clusters, global_mean, ...)
+        """
+        missing = [name for name in ARRAY_FIELDS if name not in arrays and name not in DERIVED_ARRAY_FIELDS]
+        if missing:
+            raise ValueError(f"Arrays ausentes no modelo: {missing}")
+
+        if "neighbor_ids" not in arrays or "neighbor_sims" not in arrays:
+            arrays = dict(arrays)
+            arrays["neighbor_ids"], arrays["neighbor_sims"] = build_neighbor_index(arrays["user_vectors"])
+
+        for name in ARRAY_FIELDS:
+            setattr(self, name, arrays[name])
+
+        self.metadata = dict(metadata)
+        self.model_version = metadata.get("model_version", "unknown")
+        self.global_mean = float(metadata.get("global_mean", 3.0))
+        self._ann_index = None
+
+    @property
+    def n_users(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def n_movies(self) -> int:
+        return len(self.movie_ids)
+
+    @property
+    def k_clusters(self) -> int:
+        return self.user_vectors.shape[1]
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Retorna os arrays do modelo (para serialização)"""
+        return {name: getattr(self, name) for name in ARRAY_FIELDS}
+
+    def user_index(self, user_id: int) -> Optional[int]:
+        """Índice interno de um usuário (None se desconhecido); busca binária em user_ids"""
+        index = int(lookup_ids(self.user_ids, [user_id])[0])
+        return index if index >= 0 else None
+
+    def movie_index(self, movie_id: int) -> Optional[int]:
+        """Índice interno de um filme (None se desconhecido); busca binária em movie_ids"""
+        index = int(lookup_ids(self.movie_ids, [movie_id])[0])
+        return index if index >= 0 else None
+
+    def predict(self, user_id: int, movie_id: int, top_n: int = 10) -> float:
+        """
+        Prediz a nota de um usuário para um filme (adaptado do guess() do notebook)
+
+        Usa os top_n usuários mais similares, entre os que avaliaram o
+        filme, e calcula a média das notas ponderada pela similaridade.
+        Diferente do notebook, os fallbacks (usuário ou filme desconhecido,
+        filme sem avaliações, similaridade nula) usam médias só das notas
+        reais; no notebook as médias incluem as células zeradas da matriz
+        de utilidade.
+
+        Args:
+            user_id: ID do usuário
+            movie_id: ID do filme
+            top_n: Número de vizinhos mais próximos
+
+        Returns:
+            Nota predita no intervalo [1, 5]
+        """
+        u = self.user_index(user_id)
+        m = self.movie_index(movie_id)
+
+        if u is None:
+            return float(self.movie_means[m]) if m is not None else self.global_mean
+        if m is None:
+            return float(self.user_means[u])
+
+        start, end = self.movie_indptr[m], self.movie_indptr[m + 1]
+        if start == end:
+            return float(self.movie_means[m])
+
+        raters = self.movie_users[start:end]
+        ratings = self.movie_ratings[start:end]
+        sims = self.user_vectors[raters] @ self.user_vectors[u]
+
+        if len(sims) > top_n:
+            top = np.argpartition(-sims, top_n - 1)[:top_n]
+            sims = sims[top]
+            ratings = ratings[top]
+
+        sim_sum = np.abs(sims).sum()
+        if sim_sum == 0:
+            return float(self.movie_means[m])
+
+        prediction = float((sims * ratings).sum() / sim_sum)
+        return max(1.0, min(5.0, prediction))
+
+    def predict_batch(self, user_ids: np.ndarray, movie_ids: np.ndarray, top_n: int = 10) -> np.ndarray:
+        """
+        Prediz notas para vários pares (usuário, filme) de forma vetorizada
+
+        Mesmo resultado de predict() par a par, mas os pares são agrupados
+        por filme: para cada filme, as similaridades entre os usuários do
+        lote e quem avaliou o filme são calculadas com um único produto
+        de matrizes, e os top_n vizinhos são escolhidos com argpartition.
+
+        Args:
+            user_ids: IDs dos usuários
+            movie_ids: IDs dos filmes (mesmo tamanho de user_ids)
+            top_n: Número de vizinhos mais próximos
+
+        Returns:
+            Array float64 com as notas preditas, na ordem dos pares
+        """
+        return self.predict_batch_multi(user_ids, movie_ids, [top_n])[top_n]
+
+    def predict_batch_multi(self, user_ids: np.ndarray, movie_ids: np.ndarray, top_ns: List[int]) -> Dict[int, np.ndarray]:
+        """
+        Prediz notas para vários pares com vários valores de top_n de uma só vez
+
+        As similaridades de cada filme são calculadas uma única vez; os
+        max(top_ns) vizinhos são ordenados e cada top_n usa o prefixo
+        correspondente (somas acumuladas). Usado pela busca em grade de N.
+
+        Args:
+            user_ids: IDs dos usuários
+            movie_ids: IDs dos filmes (mesmo tamanho de user_ids)
+            top_ns: Valores de top_n
+
+        Returns:
+            Dicionário top_n -> array float64 com as notas preditas
+        """
+        top_ns = sorted(set(int(n) for n in top_ns))
+        max_n = top_ns[-1]
+        users = lookup_ids(self.user_ids, user_ids)
+        movies = lookup_ids(self.movie_ids, movie_ids)
+        if len(users) != len(movies):
+            raise ValueError("user_ids e movie_ids devem ter o mesmo tamanho")
+
+        base = np.full(len(users), self.global_mean, dtype=np.float64)
+
+        # Fallbacks: usuário ou filme desconhecido (mesmas regras do predict)
+        unknown_user = users < 0
+        unknown_movie = movies < 0
+        only_movie = unknown_user & ~unknown_movie
+        base[only_movie] = self.movie_means[movies[only_movie]]
+        only_user = ~unknown_user & unknown_movie
+        base[only_user] = self.user_means[users[only_user]]
+        predictions = {n: base.copy() for n in top_ns}
+
+        known = np.flatnonzero(~unknown_user & ~unknown_movie)
+        if len(known) == 0:
+            return predictions
+
+        # Agrupar os pares conhecidos por filme
+        order = known[np.argsort(movies[known], kind="stable")]
+        sorted_movies = movies[order]
+        boundaries = np.flatnonzero(np.diff(sorted_movies)) + 1
+        for rows in np.split(order, boundaries):
+            m = movies[rows[0]]
+            start, end = self.movie_indptr[m], self.movie_indptr[m + 1]
+            if start == end:
+                for n in top_ns:
+                    predictions[n][rows] = self.movie_means[m]
+                continue
+
+            rater_vectors = self.user_vectors[self.movie_users[start:end]]
+            rater_ratings = self.movie_ratings[start:end]
+            n_raters = end - start
+            chunk = max(1, BATCH_BLOCK_SIZE // n_raters)
+
+            for offset in range(0, len(rows), chunk):
+                chunk_rows = rows[offset:offset + chunk]
+                sims = self.user_vectors[users[chunk_rows]] @ rater_vectors.T
+                if n_raters > max_n:
+                    top = np.argpartition(-sims, max_n - 1, axis=1)[:, :max_n]
+                    sims = np.take_along_axis(sims, top, axis=1)
+                    ratings = rater_ratings[top]
+                else:
+                    ratings = np.broadcast_to(rater_ratings, sims.shape)
+
+                if len(top_ns) > 1:
+                    # Vizinhos em ordem decrescente: cada top_n é um prefixo
+                    by_sim = np.argsort(-sims, axis=1, kind="stable")
+                    sims = np.take_along_axis(sims, by_sim, axis=1)
+                    ratings = np.take_along_axis(ratings, by_sim, axis=1)
+
+                numerators = np.cumsum(sims * ratings, axis=1, dtype=np.float64)
+                denominators = np.cumsum(np.abs(sims), axis=1, dtype=np.float64)
+                for n in top_ns:
+                    column = min(n, sims.shape[1]) - 1
+                    numerator = numerators[:, column]
+                    denominator = denominators[:, column]
+                    weighted = np.clip(
+                        np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0),
+                        1.0, 5.0
+                    )
+                    predictions[n][chunk_rows] = np.where(denominator > 0, weighted, self.movie_means[m])
+
+        return predictions
+
+    def ann_index(self) -> LSHIndex:
+        """Índice LSH sobre user_vectors (criado na primeira chamada, com os parâmetros do treino)"""
+        if self._ann_index is None:
+            self._ann_index = LSHIndex.build(self.user_vectors, **self.metadata.get("ann_params", {}))
+        return self._ann_index
+
+    def set_ann_index(self, index: Optional[LSHIndex]):
+        """Associa um índice LSH já construído (evita reconstruí-lo)"""
+        self._ann_index = index
+
+    def neighbors(self, user_id: int, k: int = 10) -> List[Dict]:
+        """
+        Usuários mais similares, lidos do índice de vizinhos em O(k)
+
+        Args:
+            user_id: ID do usuário
+            k: Número de vizinhos (limitado ao tamanho do índice)
+
+        Returns:
+            Lista de dicionários com 'user_id' e 'similarity'
+        """
+        u = self.user_index(user_id)
+        if u is None:
+            return []
+        ids = self.neighbor_ids[u, :k]
+        sims = self.neighbor_sims[u, :k]
+        return [
+            {"user_id": int(self.user_ids[v]), "similarity": round(float(sim), 4)}
+            for v, sim in zip(ids, sims)
+        ]
+
+    def recommend(self, user_id: int, n: int = 10, n_neighbors: int = 50, min_support: int = 3) -> List[Dict]:
+        """
+        Recomenda os n filmes com maior nota predita que o usuário ainda não avaliou
+
+        As notas são agregadas a partir dos n_neighbors usuários mais
+        similares (média ponderada pela similaridade, como no guess()),
+        lidos do índice de vizinhos pré-calculado. Usuários desconhecidos
+        recebem os filmes mais bem avaliados.
+
+        Args:
+            user_id: ID do usuário
+            n: Número de recomendações
+            n_neighbors: Número de vizinhos considerados (limitado ao tamanho do índice)
+            min_support: Mínimo de vizinhos que avaliaram o filme
+
+        Returns:
+            Lista de dicionários com 'movie_id' e 'predicted_rating'
+        """
+        u = self.user_index(user_id)
+        if u is None:
+            return self.popular(n)
+
+        neighbors = self.neighbor_ids[u, :n_neighbors]
+        if len(neighbors) == 0:
+            return self.popular(n)
+
+        # Avaliações dos vizinhos (CSR), com o peso de similaridade de cada um
+        positions = gather_rows(self.user_indptr, neighbors)
+        lengths = self.user_indptr[neighbors + 1] - self.user_indptr[neighbors]
+        weights = np.repeat(self.neighbor_sims[u, :n_neighbors], lengths)
+        movies = self.user_movies[positions]
+        ratings = self.user_ratings[positions]
+
+        numerator = np.bincount(movies, weights=weights * ratings, minlength=self.n_movies)
+        denominator = np.bincount(movies, weights=np.abs(weights), minlength=self.n_movies)
+
+        support = np.bincount(movies, minlength=self.n_movies)
+
+        scores = np.full(self.n_movies, -np.inf)
+        valid = (denominator > 0) & (support >= min_support)
+        scores[valid] = numerator[valid] / denominator[valid]
+
+        # Excluir filmes já avaliados pelo usuário
+        scores[self.user_movies[self.user_indptr[u]:self.user_indptr[u + 1]]] = -np.inf
+
+        return self._top_scores(scores, n)
+
+    def popular(self, n: int = 10, min_ratings: int = 20) -> List[Dict]:
+        """Filmes com maior média de avaliações (fallback para usuários novos)"""
+        scores = np.where(self.movie_counts >= min_ratings, self.movie_means, -np.inf).astype(np.float64)
+        return self._top_scores(scores, n)
+
+    def _top_scores(self, scores: np.ndarray, n: int) -> List[Dict]:
+        """Seleciona os n maiores scores finitos, em ordem decrescente"""
+        n = min(n, int(np.isfinite(scores).sum()))
+        if n <= 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            {
+                "movie_id": int(self.movie_ids[i]),
+                "predicted_rating": round(float(min(5.0, max(1.0, scores[i]))), 4)
+            }
+            for i in top
+        ]
@@ -0,0 +1,115 @@
+"""
+Índice de vizinhos mais próximos (top-K) entre usuários
+Substitui a matriz de similaridade N x N do notebook (Steps 7-8) por arrays N x K
+"""
+from typing import Tuple
+
+import numpy as np
+
+# Vizinhos guardados por usuário no índice
+DEFAULT_INDEX_NEIGHBORS = 100
+
+# Usuários processados por bloco ao calcular similaridades (limita memória a bloco x N)
+SIMILARITY_BLOCK_SIZE = 2048
+
+
+def build_neighbor_index(
+    user_vectors: np.ndarray,
+    k: int = DEFAULT_INDEX_NEIGHBORS,
+    block_size: int = SIMILARITY_BLOCK_SIZE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula os K vizinhos mais similares de cada usuário
+
+    As similaridades são calculadas em blocos de usuários (produto
+    interno dos vetores normalizados = cosseno) e os top-K de cada linha
+    são selecionados com argpartition, sem ordenar a linha inteira.
+
+    Args:
+        user_vectors: Vetores normalizados [N, d]
+        k: Número de vizinhos por usuário
+        block_size: Usuários por bloco
+
+    Returns:
+        Tupla (neighbor_ids int32 [N, k], neighbor_sims float32 [N, k]),
+        com cada linha em ordem decrescente de similaridade
+    """
+    return neighbor_rows(user_vectors, np.arange(len(user_vectors)), k, block_size)
+
+
+def neighbor_rows(
+    user_vectors: np.ndarray,
+    rows: np.ndarray,
+    k: int = DEFAULT_INDEX_NEIGHBORS,
+    block_size: int = SIMILARITY_BLOCK_SIZE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula os K vizinhos de um subconjunto de usuários (contra todos os usuários)
+
+    Args:
+        user_vectors: Vetores normalizados [N, d]
+        rows: Índices dos usuários cujas linhas serão calculadas
+        k: Número de vizinhos por usuário
+        block_size: Usuários por bloco
+
+    Returns:
+        Tupla (neighbor_ids int32 [len(rows), k], neighbor_sims float32 [len(rows), k])
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    n_users = len(user_vectors)
+    k = max(0, min(k, n_users - 1))
+    neighbor_ids = np.empty((len(rows), k), dtype=np.int32)
+    neighbor_sims = np.empty((len(rows), k), dtype=np.float32)
+    if k == 0:
+        return neighbor_ids, neighbor_sims
+
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        sims = user_vectors[block] @ user_vectors.T
+        # O próprio usuário não é vizinho de si mesmo
+        sims[np.arange(len(block)), block] = -np.inf
+
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1, kind="stable")
+
+        neighbor_ids[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+        neighbor_sims[start:start + len(block)] = np.take_along_axis(top_sims, order, axis=1)
+
+    return neighbor_ids, neighbor_sims
+
+
+def merge_neighbor_candidates(
+    neighbor_ids: np.ndarray,
+    neighbor_sims: np.ndarray,
+    candidate_ids: np.ndarray,
+    candidate_sims: np.ndarray,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Combina listas de vizinhos existentes com novos candidatos, mantendo os top-K
+
+    Args:
+        neighbor_ids: Vizinhos atuais [R, k_atual]
+        neighbor_sims: Similaridades atuais [R, k_atual]
+        candidate_ids: Novos candidatos [R, C] (sem repetir os atuais)
+        candidate_sims: Similaridade com cada candidato [R, C]
+        k: Vizinhos mantidos por linha
+
+    Returns:
+        Tupla (neighbor_ids int32 [R, k], neighbor_sims float32 [R, k]) em ordem decrescente
+    """
+    ids = np.concatenate([neighbor_ids, candidate_ids], axis=1)
+    sims = np.concatenate([neighbor_sims, candidate_sims], axis=1)
+    k = min(k, ids.shape[1])
+    if k == 0:
+        return ids[:, :0].astype(np.int32), sims[:, :0].astype(np.float32)
+
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    top_sims = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-top_sims, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    return (
+        np.take_along_axis(ids, top, axis=1).astype(np.int32),
+        np.take_along_axis(sims, top, axis=1).astype(np.float32)
+    )
@@ -0,0 +1,103 @@
+"""
+Similaridade item-item (filme x filme) para a tabela movie_similarities
+Calcula o cosseno ajustado entre filmes e mantém apenas os top-K de cada um
+"""
+import logging
+from typing import Tuple
+
+import numpy as np
+from scipy import sparse
+
+from .training import build_utility_matrix
+
+logger = logging.getLogger(__name__)
+
+# Filmes similares guardados por filme
+DEFAULT_SIMILAR_MOVIES = 50
+
+# Mínimo de usuários em comum para considerar a similaridade entre dois filmes
+MIN_COMMON_RATERS = 5
+
+# Filmes processados por bloco (memória ~ bloco x n_filmes x 8 bytes)
+ITEM_BLOCK_SIZE = 512
+
+
+def item_similarity_pairs(
+    user_ids: np.ndarray,
+    movie_ids: np.ndarray,
+    ratings: np.ndarray,
+    k: int = DEFAULT_SIMILAR_MOVIES,
+    min_common: int = MIN_COMMON_RATERS,
+    block_size: int = ITEM_BLOCK_SIZE
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calcula os K filmes mais similares de cada filme (cosseno ajustado)
+
+    As notas são centralizadas pela média de cada usuário e a matriz
+    filmes x usuários é mantida esparsa. As similaridades são calculadas
+    em blocos de filmes; apenas pares com pelo menos min_common usuários
+    em comum e similaridade positiva são mantidos. Cada par é devolvido
+    uma única vez com movie_id_1 < movie_id_2, como exige a tabela.
+
+    Args:
+        user_ids: ID do usuário de cada avaliação
+        movie_ids: ID do filme de cada avaliação
+        ratings: Nota de cada avaliação
+        k: Filmes similares por filme
+        min_common: Mínimo de usuários em comum por par
+        block_size: Filmes por bloco
+
+    Returns:
+        Tupla (movie_id_1, movie_id_2, similarity_score)
+    """
+    ratings = np.asarray(ratings, dtype=np.float32)
+    unique_users, user_idx = np.unique(np.asarray(user_ids), return_inverse=True)
+    unique_movies, movie_idx = np.unique(np.asarray(movie_ids), return_inverse=True)
+    n_users, n_movies = len(unique_users), len(unique_movies)
+
+    user_counts = np.bincount(user_idx, minlength=n_users)
+    user_sums = np.bincount(user_idx, weights=ratings, minlength=n_users)
+    user_means = np.divide(user_sums, np.maximum(user_counts, 1))
+    centered = ratings - user_means[user_idx].astype(np.float32)
+
+    matrix = build_utility_matrix(movie_idx, user_idx, centered, n_movies, n_users)
+    presence = matrix.copy()
+    presence.data[:] = 1.0
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    inv_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = (sparse.diags(inv_norms.astype(np.float32)) @ matrix).tocsr()
+    normalized_t = normalized.T.tocsc()
+    presence_t = presence.T.tocsc()
+
+    k = max(0, min(k, n_movies - 1))
+    rows, cols, scores = [], [], []
+    for start in range(0, n_movies if k else 0, block_size):
+        end = min(start + block_size, n_movies)
+        sims = (normalized[start:end] @ normalized_t).toarray()
+        common = (presence[start:end] @ presence_t).toarray()
+        sims[common < min_common] = -np.inf
+        sims[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        keep = top_sims > 0
+
+        rows.append(np.broadcast_to(np.arange(start, end)[:, None], top.shape)[keep])
+        cols.append(top[keep])
+        scores.append(top_sims[keep])
+
+    if not rows:
+        empty = np.empty(0, dtype=np.int32)
+        return empty, empty, np.empty(0, dtype=np.float32)
+
+    rows, cols, scores = np.concatenate(rows), np.concatenate(cols), np.concatenate(scores)
+
+    # Par canônico (menor, maior); um par presente nas listas dos dois filmes é gravado uma vez
+    first, second = np.minimum(rows, cols), np.maximum(rows, cols)
+    _, unique_pos = np.unique(first.astype(np.int64) * n_movies + second, return_index=True)
+
+    movie_id_1 = unique_movies[first[unique_pos]].astype(np.int32)
+    movie_id_2 = unique_movies[second[unique_pos]].astype(np.int32)
+    logger.info(f"{len(unique_pos)} pares de filmes similares calculados ({n_movies} filmes, top-{k})")
+    return movie_id_1, movie_id_2, scores[unique_pos].astype(np.float32)
@@ -0,0 +1,338 @@
+"""
+Persistência do modelo de recomendação no MinIO
+Cada versão é um bundle em models/recommender/<versão>/: um .npy por array + manifest.json.
+Os workers da API baixam o bundle para disco local e o abrem com np.load(mmap_mode='r'),
+compartilhando uma única cópia no page cache.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from .model import KMeansKNNModel
+
+logger = logging.getLogger(__name__)
+
+MODEL_PREFIX = "models/recommender"
+LATEST_POINTER = f"{MODEL_PREFIX}/LATEST"
+MANIFEST_NAME = "manifest.json"
+BUNDLE_FORMAT = "npy-bundle/1"
+
+# Bundles locais mantidos em disco (os mais recentes)
+LOCAL_BUNDLES_KEPT = 3
+
+# Bundles usados há menos que isto (s) não são removidos: outro worker pode estar baixando ou abrindo
+PRUNE_MIN_AGE = 600
+
+# Bundle servido por este processo, por diretório raiz (nunca removido por ele)
+_loaded_bundles: Dict[str, str] = {}
+
+# Tamanho dos blocos ao copiar/verificar arquivos
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def bundle_key(model_version: str, file_name: str, prefix: str = MODEL_PREFIX) -> str:
+    """Chave de um arquivo do bundle de uma versão (modelo ou outro conjunto de arrays sob prefix)"""
+    return f"{prefix}/{model_version}/{file_name}"
+
+
+def model_key(model_version: str) -> str:
+    """Chave do formato antigo (arquivo .npz único), mantida para leitura de versões antigas"""
+    return bundle_key(model_version, "model.npz")
+
+
+def local_bundle_root() -> str:
+    """Diretório local dos bundles (MODEL_BUNDLE_DIR)"""
+    return os.getenv("MODEL_BUNDLE_DIR", os.path.join(tempfile.gettempdir(), "recommender-models"))
+
+
+def write_bundle(model: KMeansKNNModel, directory: str) -> Dict:
+    """
+    Grava o modelo como bundle local (um .npy por array + manifest.json)
+
+    Args:
+        model: Modelo treinado
+        directory: Diretório de destino (criado se necessário)
+
+    Returns:
+        Manifest gravado
+    """
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "model_version": model.model_version,
+        "metadata": model.metadata,
+        "arrays": write_arrays(model.arrays(), directory)
+    }
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def write_arrays(arrays: Dict[str, np.ndarray], directory: str) -> Dict[str, Dict]:
+    """
+    Grava cada array como um .npy no diretório
+
+    Returns:
+        Entradas do manifest por nome (file, dtype, shape, size, sha256)
+    """
+    os.makedirs(directory, exist_ok=True)
+    entries = {}
+    for name, array in arrays.items():
+        file_name = f"{name}.npy"
+        path = os.path.join(directory, file_name)
+        np.save(path, np.ascontiguousarray(array), allow_pickle=False)
+        entries[name] = {
+            "file": file_name,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "size": os.path.getsize(path),
+            "sha256": _file_sha256(path)
+        }
+    return entries
+
+
+def read_arrays(directory: str, manifest: Dict, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """Abre os arrays listados no manifest (mapeados em memória, somente leitura, se mmap)"""
+    return {
+        name: np.load(os.path.join(directory, entry["file"]), mmap_mode="r" if mmap else None, allow_pickle=False)
+        for name, entry in manifest["arrays"].items()
+    }
+
+
+def load_bundle(directory: str, mmap: bool = True) -> KMeansKNNModel:
+    """
+    Abre um bundle local
+
+    Args:
+        directory: Diretório com manifest.json e os .npy
+        mmap: Se True, os arrays são mapeados em memória (somente leitura)
+
+    Returns:
+        Modelo com arrays apoiados nos arquivos do bundle
+    """
+    with open(os.path.join(directory, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    return KMeansKNNModel(read_arrays(directory, manifest, mmap), manifest["metadata"])
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _bundle_complete(directory: str, manifest: Dict) -> bool:
+    """Verifica se todos os arquivos do manifest existem localmente com o tamanho esperado"""
+    for entry in manifest["arrays"].values():
+        path = os.path.join(directory, entry["file"])
+        if not os.path.exists(path) or os.path.getsize(path) != entry["size"]:
+            return False
+    return os.path.exists(os.path.join(directory, MANIFEST_NAME))
+
+
+def _download_file(minio_client, key: str, path: str, expected_sha256: str):
+    """Baixa um arquivo do bundle (escrita atômica, com verificação de SHA-256)"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    digest = hashlib.sha256()
+    stream = minio_client.open_object_stream(key)
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: stream.read(COPY_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                f.write(chunk)
+    finally:
+        stream.close()
+
+    if digest.hexdigest() != expected_sha256:
+        os.remove(tmp_path)
+        raise ValueError(f"Checksum inválido ao baixar {key}")
+    os.replace(tmp_path, path)
+
+
+def fetch_bundle(minio_client, model_version: str, root: Optional[str] = None, prefix: str = MODEL_PREFIX) -> Optional[str]:
+    """
+    Garante uma cópia local do bundle de uma versão (baixa apenas arquivos ausentes)
+
+    Args:
+        minio_client: Instância de MinIOClient
+        model_version: Versão do modelo
+        root: Diretório local dos bundles (default: MODEL_BUNDLE_DIR)
+        prefix: Prefixo dos bundles no MinIO (default: modelos de recomendação)
+
+    Returns:
+        Diretório local do bundle, ou None se a versão não tem bundle no MinIO
+    """
+    data = minio_client.download_file(bundle_key(model_version, MANIFEST_NAME, prefix))
+    if data is None:
+        return None
+    manifest = json.loads(data.decode("utf-8"))
+
+    directory = os.path.join(root or local_bundle_root(), model_version)
+    os.makedirs(directory, exist_ok=True)
+    if _bundle_complete(directory, manifest):
+        return directory
+
+    for entry in manifest["arrays"].values():
+        path = os.path.join(directory, entry["file"])
+        if not os.path.exists(path) or os.path.getsize(path) != entry["size"]:
+            _download_file(minio_client, bundle_key(model_version, entry["file"], prefix), path, entry["sha256"])
+
+    tmp_manifest = os.path.join(directory, f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+    with open(tmp_manifest, "wb") as f:
+        f.write(data)
+    os.replace(tmp_manifest, os.path.join(directory, MANIFEST_NAME))
+    logger.info(f"Bundle {model_version} baixado para {directory}")
+    return directory
+
+
+def mark_bundle_loaded(directory: str):
+    """Registra o bundle como o servido por este processo e renova seu mtime (referência da remoção)"""
+    directory = os.path.abspath(directory)
+    _loaded_bundles[os.path.dirname(directory)] = directory
+    os.utime(directory)
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def prune_local_bundles(root: Optional[str] = None, keep: int = LOCAL_BUNDLES_KEPT, protect: Iterable[str] = ()):
+    """
+    Remove bundles locais antigos, mantendo os `keep` mais recentes
+
+    Nunca remove as versões em protect (a apontada por LATEST), o
+    bundle servido por este processo nem bundles usados há menos de
+    PRUNE_MIN_AGE segundos, que outro worker pode estar baixando ou
+    abrindo. Arquivos já mapeados por outro worker continuam válidos
+    até serem desmapeados (o inode só é liberado depois).
+
+    Args:
+        root: Diretório dos bundles (default: MODEL_BUNDLE_DIR)
+        keep: Bundles mais recentes mantidos
+        protect: Versões que não podem ser removidas
+    """
+    root = os.path.abspath(root or local_bundle_root())
+    if not os.path.isdir(root):
+        return
+    protect = set(protect)
+    protect.add(os.path.basename(_loaded_bundles.get(root, "")))
+    now = time.time()
+    directories = [os.path.join(root, name) for name in os.listdir(root)]
+    directories = sorted((d for d in directories if os.path.isdir(d)), key=_mtime, reverse=True)
+    for directory in directories[keep:]:
+        if os.path.basename(directory) in protect or now - _mtime(directory) < PRUNE_MIN_AGE:
+            continue
+        shutil.rmtree(directory, ignore_errors=True)
+        logger.info(f"Bundle local removido: {directory}")
+
+
+def deserialize_model(data: bytes) -> KMeansKNNModel:
+    """Reconstrói o modelo a partir do conteúdo de um arquivo .npz (formato antigo)"""
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        metadata = json.loads(str(npz["__metadata__"]))
+        arrays = {name: npz[name] for name in npz.files if name != "__metadata__"}
+    return KMeansKNNModel(arrays, metadata)
+
+
+def save_model_to_minio(minio_client, model: KMeansKNNModel, set_latest: bool = True) -> str:
+    """
+    Grava uma versão do modelo no MinIO como bundle (.npy + manifest.json)
+
+    O manifest é enviado por último: uma versão só é visível quando
+    todos os arrays já estão no MinIO.
+
+    Args:
+        minio_client: Instância de MinIOClient
+        model: Modelo treinado
+        set_latest: Se True, aponta LATEST para esta versão
+
+    Returns:
+        Chave do manifest gravado
+    """
+    with tempfile.TemporaryDirectory(prefix="recommender-bundle-") as directory:
+        manifest = write_bundle(model, directory)
+        key = upload_bundle(minio_client, directory, manifest, model.model_version)
+
+    if set_latest:
+        pointer = minio_client.upload_file_dedup(model.model_version.encode("utf-8"), LATEST_POINTER, "text/plain", compression="none")
+        if not pointer["success"]:
+            raise RuntimeError("Falha ao atualizar ponteiro LATEST do modelo")
+
+    logger.info(f"Modelo {model.model_version} gravado em {bundle_key(model.model_version, '')}")
+    return key
+
+
+def upload_bundle(minio_client, directory: str, manifest: Dict, version: str, prefix: str = MODEL_PREFIX) -> str:
+    """
+    Envia um bundle local ao MinIO; o manifest vai por último
+
+    Returns:
+        Chave do manifest gravado
+    """
+    for entry in manifest["arrays"].values():
+        with open(os.path.join(directory, entry["file"]), "rb") as f:
+            result = minio_client.upload_stream_dedup(
+                f, bundle_key(version, entry["file"], prefix), "application/octet-stream"
+            )
+        if not result["success"]:
+            raise RuntimeError(f"Falha ao gravar {entry['file']} de {prefix}/{version} no MinIO")
+
+    key = bundle_key(version, MANIFEST_NAME, prefix)
+    with open(os.path.join(directory, MANIFEST_NAME), "rb") as f:
+        result = minio_client.upload_stream_dedup(f, key, "application/json", compression="none")
+    if not result["success"]:
+        raise RuntimeError(f"Falha ao gravar manifest de {prefix}/{version} no MinIO")
+    return key
+
+
+def get_latest_version(minio_client) -> Optional[str]:
+    """Versão apontada por LATEST (None se nenhum modelo foi publicado)"""
+    data = minio_client.download_file(LATEST_POINTER)
+    return data.decode("utf-8").strip() if data else None
+
+
+def load_model_from_minio(minio_client, model_version: Optional[str] = None) -> Optional[KMeansKNNModel]:
+    """
+    Carrega uma versão do modelo do MinIO
+
+    O bundle é copiado uma vez para MODEL_BUNDLE_DIR e aberto com
+    mmap; outros workers que carregam a mesma versão reaproveitam os
+    arquivos locais. Versões antigas (model.npz) são lidas em memória.
+
+    Args:
+        minio_client: Instância de MinIOClient
+        model_version: Versão desejada (default: LATEST)
+
+    Returns:
+        Modelo carregado ou None se não encontrado
+    """
+    latest = get_latest_version(minio_client)
+    model_version = model_version or latest
+    if not model_version:
+        return None
+
+    directory = fetch_bundle(minio_client, model_version)
+    if directory is not None:
+        model = load_bundle(directory)
+        mark_bundle_loaded(directory)
+        prune_local_bundles(protect=[latest] if latest else [])
+    else:
+        data = minio_client.download_file(model_key(model_version))
+        if data is None:
+            return None
+        model = deserialize_model(data)
+
+    logger.info(f"Modelo {model.model_version} carregado ({model.n_users} usuários, {model.n_movies} filmes)")
+    return model
@@ -0,0 +1,327 @@
+"""
+Treinamento do modelo K-Means + KNN a partir das avaliações
+Reproduz os Steps 4-8 do notebook (Parte 3) e gera um KMeansKNNModel
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from .clustering import ClusterCache, fit_kmeans, fit_signature, matrix_version
+from .model import KMeansKNNModel
+from .ann import LSHIndex, resolve_neighbor_method
+from .neighbors import DEFAULT_INDEX_NEIGHBORS, build_neighbor_index
+
+logger = logging.getLogger(__name__)
+
+# K determinado pelo método do cotovelo (WCSS) no notebook
+DEFAULT_K_CLUSTERS = 8
+
+# Linhas lidas por vez do cursor server-side ao carregar avaliações
+FETCH_CHUNK_SIZE = 500_000
+
+
+def load_ratings_from_postgres(pg_client, since: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Carrega as avaliações do PostgreSQL como arrays NumPy
+
+    Usa um cursor server-side lido em blocos, de modo que apenas os
+    arrays finais (e um bloco de tuplas) ficam em memória.
+
+    Args:
+        pg_client: Instância de PostgreSQLClient
+        since: Se informado, apenas avaliações com created_at >= since (ISO 8601, ver ratings_watermark)
+
+    Returns:
+        Tupla (user_ids, movie_ids, ratings)
+    """
+    chunks = []
+    conn = None
+    try:
+        conn = pg_client.get_connection()
+        cursor = conn.cursor(name="recommender_ratings")
+        cursor.itersize = FETCH_CHUNK_SIZE
+        if since is None:
+            cursor.execute("SELECT user_id, movie_id, rating FROM ratings")
+        else:
+            cursor.execute("SELECT user_id, movie_id, rating FROM ratings WHERE created_at >= %s", (since,))
+        while True:
+            rows = cursor.fetchmany(FETCH_CHUNK_SIZE)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.int32))
+        cursor.close()
+        conn.commit()
+    finally:
+        if conn:
+            pg_client.return_connection(conn)
+
+    data = np.concatenate(chunks) if chunks else np.empty((0, 3), dtype=np.int32)
+    logger.info(f"{len(data)} avaliações carregadas do PostgreSQL" + (f" (desde {since})" if since else ""))
+    return data[:, 0].copy(), data[:, 1].copy(), data[:, 2].astype(np.float32)
+
+
+def build_movie_matrix(user_ids: np.ndarray, movie_ids: np.ndarray, ratings: np.ndarray) -> sparse.csr_matrix:
+    """Matriz filmes x usuários (CSR) usada pelo K-Means, a partir de ids externos"""
+    _, user_idx = np.unique(np.asarray(user_ids), return_inverse=True)
+    _, movie_idx = np.unique(np.asarray(movie_ids), return_inverse=True)
+    return build_utility_matrix(
+        movie_idx, user_idx, np.asarray(ratings, dtype=np.float32),
+        int(movie_idx.max()) + 1 if len(movie_idx) else 0,
+        int(user_idx.max()) + 1 if len(user_idx) else 0
+    )
+
+
+def ratings_watermark(pg_client) -> str:
+    """
+    Marca d'água das avaliações, no relógio do PostgreSQL (mesmo tipo de ratings.created_at)
+
+    Registrada no modelo antes de ler as avaliações; a próxima
+    atualização incremental lê as avaliações com created_at >= marca.
+    created_at é o início da transação que gravou a linha, e uma
+    transação aberta agora pode fazer commit depois da leitura com um
+    created_at no passado. Por isso a marca é o início da transação
+    aberta mais antiga no banco (ou o horário atual, se não há
+    nenhuma): a janela seguinte se sobrepõe à anterior e as avaliações
+    relidas sem mudança são descartadas (incremental.changed_ratings).
+    """
+    result = pg_client.execute_query("""
+        SELECT LEAST(
+            LOCALTIMESTAMP,
+            (SELECT MIN(xact_start) FROM pg_stat_activity
+             WHERE datname = current_database() AND pid <> pg_backend_pid())::timestamp
+        ) AS watermark
+    """)
+    return result[0]["watermark"].isoformat()
+
+
+def build_utility_matrix(
+    row_idx: np.ndarray,
+    col_idx: np.ndarray,
+    ratings: np.ndarray,
+    n_rows: int,
+    n_cols: int
+) -> sparse.csr_matrix:
+    """
+    Matriz de utilidade esparsa (CSR) construída diretamente das avaliações
+
+    Substitui o pivot_table(fill_value=0) denso do notebook (Step 4):
+    a memória cresce com o número de avaliações, não com linhas x colunas.
+    Avaliações duplicadas são somadas pelo formato COO.
+
+    Returns:
+        Matriz CSR float32 [n_rows, n_cols]
+    """
+    matrix = sparse.csr_matrix(
+        (np.asarray(ratings, dtype=np.float32), (row_idx, col_idx)),
+        shape=(n_rows, n_cols)
+    )
+    matrix.sort_indices()
+    return matrix
+
+
+def build_csr(rows: np.ndarray, cols: np.ndarray, values: np.ndarray, n_rows: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Agrupa triplas (linha, coluna, valor) no formato CSR
+
+    Returns:
+        Tupla (indptr int64, colunas int32, valores float32)
+    """
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32), values[order].astype(np.float32)
+
+
+def cluster_user_means(
+    user_idx: np.ndarray,
+    movie_idx: np.ndarray,
+    ratings: np.ndarray,
+    movie_clusters: np.ndarray,
+    n_users: int,
+    k_clusters: int
+) -> np.ndarray:
+    """
+    Utility clustered matrix: nota média de cada usuário em cada cluster de filmes
+
+    Células sem avaliações ficam com 0, como o fillna(0) do notebook.
+
+    Returns:
+        Array float32 [n_users, k_clusters]
+    """
+    cells = user_idx.astype(np.int64) * k_clusters + movie_clusters[movie_idx]
+    size = n_users * k_clusters
+    sums = np.bincount(cells, weights=ratings, minlength=size).reshape(n_users, k_clusters)
+    counts = np.bincount(cells, minlength=size).reshape(n_users, k_clusters)
+    means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    return means.astype(np.float32)
+
+
+def normalize_user_vectors(user_cluster_means: np.ndarray) -> np.ndarray:
+    """
+    Centraliza cada linha pela média e normaliza (norma L2 = 1)
+
+    O produto interno entre os vetores resultantes é a similaridade
+    cosseno da matriz normalizada usada no notebook (Step 7/8).
+    Linhas constantes resultam em vetor nulo (similaridade 0).
+    """
+    centered = user_cluster_means - user_cluster_means.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    vectors = np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0)
+    return vectors.astype(np.float32)
+
+
+def fit_movie_clusters(
+    movie_idx: np.ndarray,
+    user_idx: np.ndarray,
+    ratings: np.ndarray,
+    n_movies: int,
+    n_users: int,
+    k_clusters: int,
+    random_state: int = 42,
+    cluster_cache: Optional[ClusterCache] = None
+) -> np.ndarray:
+    """
+    Agrupa os filmes com K-Means sobre a matriz filmes x usuários (Steps 5-6)
+
+    A matriz é mantida esparsa (CSR); o K-Means do scikit-learn opera
+    diretamente sobre ela, sem densificar. Com cluster_cache, um ajuste
+    já feito para (K, versão dos dados) com os mesmos parâmetros (K-Means
+    completo, sem warm start), por exemplo na busca do cotovelo, é
+    reaproveitado.
+
+    Returns:
+        Array int32 [n_movies] com o cluster de cada filme
+    """
+    movie_matrix = build_utility_matrix(movie_idx, user_idx, ratings, n_movies, n_users)
+    if cluster_cache is None:
+        return fit_kmeans(movie_matrix, k_clusters, random_state=random_state)["labels"]
+
+    data_version = matrix_version(movie_matrix)
+    signature = fit_signature(random_state=random_state)
+    cached = cluster_cache.get(k_clusters, data_version, signature)
+    if cached is not None:
+        logger.info(f"Clusters K={k_clusters} reaproveitados do cache ({data_version})")
+        return cached["labels"].astype(np.int32)
+
+    fit = fit_kmeans(movie_matrix, k_clusters, random_state=random_state)
+    cluster_cache.put(k_clusters, data_version, signature, fit)
+    return fit["labels"]
+
+
+def train_model(
+    user_ids: np.ndarray,
+    movie_ids: np.ndarray,
+    ratings: np.ndarray,
+    k_clusters: int = DEFAULT_K_CLUSTERS,
+    random_state: int = 42,
+    model_version: Optional[str] = None,
+    index_neighbors: int = DEFAULT_INDEX_NEIGHBORS,
+    cluster_cache: Optional[ClusterCache] = None,
+    neighbor_method: str = "auto"
+) -> KMeansKNNModel:
+    """
+    Treina o modelo K-Means + KNN a partir de arrays de avaliações
+
+    Args:
+        user_ids: ID do usuário de cada avaliação
+        movie_ids: ID do filme de cada avaliação
+        ratings: Nota de cada avaliação
+        k_clusters: Número de clusters de filmes
+        random_state: Semente do K-Means
+        model_version: Versão do modelo (default: kmeans_knn-<timestamp>)
+        index_neighbors: Vizinhos guardados por usuário no índice top-K
+        cluster_cache: Cache de ajustes do K-Means por (K, versão dos dados)
+        neighbor_method: Índice de vizinhos 'exact', 'lsh' (aproximado) ou 'auto' (pelo número de usuários)
+
+    Returns:
+        Modelo treinado
+    """
+    start = datetime.now()
+    ratings = np.asarray(ratings, dtype=np.float32)
+
+    # Mapas id externo -> índice interno
+    unique_users, user_idx = np.unique(np.asarray(user_ids), return_inverse=True)
+    unique_movies, movie_idx = np.unique(np.asarray(movie_ids), return_inverse=True)
+    n_users, n_movies = len(unique_users), len(unique_movies)
+    logger.info(f"Treinando K-Means+KNN: {n_users} usuários, {n_movies} filmes, {len(ratings)} avaliações, K={k_clusters}")
+
+    movie_clusters = fit_movie_clusters(
+        movie_idx, user_idx, ratings, n_movies, n_users, k_clusters, random_state, cluster_cache
+    )
+    user_cluster_means = cluster_user_means(user_idx, movie_idx, ratings, movie_clusters, n_users, k_clusters)
+    user_vectors = normalize_user_vectors(user_cluster_means)
+
+    arrays = assemble_arrays(unique_users, unique_movies, user_idx, movie_idx, ratings, movie_clusters, user_cluster_means, user_vectors)
+    neighbor_method = resolve_neighbor_method(neighbor_method, n_users)
+    ann_index = None
+    if neighbor_method == "lsh":
+        ann_index = LSHIndex.build(user_vectors)
+        arrays["neighbor_ids"], arrays["neighbor_sims"] = ann_index.knn_graph(index_neighbors)
+    else:
+        arrays["neighbor_ids"], arrays["neighbor_sims"] = build_neighbor_index(user_vectors, index_neighbors)
+
+    metadata = {
+        "model_version": model_version or f"kmeans_knn-{start:%Y%m%dT%H%M%S}",
+        "algorithm": "kmeans_knn",
+        "k_clusters": int(k_clusters),
+        "random_state": int(random_state),
+        "n_users": int(n_users),
+        "n_movies": int(n_movies),
+        "n_ratings": int(len(ratings)),
+        "index_neighbors": int(arrays["neighbor_ids"].shape[1]),
+        "neighbor_method": neighbor_method,
+        **({"ann_params": ann_index.params()} if ann_index else {}),
+        "global_mean": float(ratings.mean()) if len(ratings) else 3.0,
+        "trained_at": start.isoformat(),
+        "training_seconds": round((datetime.now() - start).total_seconds(), 3)
+    }
+    logger.info(f"Modelo {metadata['model_version']} treinado em {metadata['training_seconds']}s")
+    model = KMeansKNNModel(arrays, metadata)
+    model.set_ann_index(ann_index)
+    return model
+
+
+def assemble_arrays(
+    unique_users: np.ndarray,
+    unique_movies: np.ndarray,
+    user_idx: np.ndarray,
+    movie_idx: np.ndarray,
+    ratings: np.ndarray,
+    movie_clusters: np.ndarray,
+    user_cluster_means: np.ndarray,
+    user_vectors: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """Monta os arrays do modelo (médias e índices CSR/CSC das avaliações)"""
+    n_users, n_movies = len(unique_users), len(unique_movies)
+
+    user_counts = np.bincount(user_idx, minlength=n_users)
+    movie_counts = np.bincount(movie_idx, minlength=n_movies)
+    user_sums = np.bincount(user_idx, weights=ratings, minlength=n_users)
+    movie_sums = np.bincount(movie_idx, weights=ratings, minlength=n_movies)
+    global_mean = float(ratings.mean()) if len(ratings) else 3.0
+
+    user_means = np.divide(user_sums, user_counts, out=np.full(n_users, global_mean), where=user_counts > 0)
+    movie_means = np.divide(movie_sums, movie_counts, out=np.full(n_movies, global_mean), where=movie_counts > 0)
+
+    movie_indptr, movie_users, movie_ratings = build_csr(movie_idx, user_idx, ratings, n_movies)
+    user_indptr, user_movies, user_ratings = build_csr(user_idx, movie_idx, ratings, n_users)
+
+    return {
+        "user_ids": unique_users.astype(np.int32),
+        "movie_ids": unique_movies.astype(np.int32),
+        "movie_clusters": movie_clusters.astype(np.int32),
+        "user_cluster_means": user_cluster_means,
+        "user_vectors": user_vectors,
+        "user_means": user_means.astype(np.float32),
+        "movie_means": movie_means.astype(np.float32),
+        "movie_counts": movie_counts.astype(np.int32),
+        "movie_indptr": movie_indptr,
+        "movie_users": movie_users,
+        "movie_ratings": movie_ratings,
+        "user_indptr": user_indptr,
+        "user_movies": user_movies,
+        "user_ratings": user_ratings,
+    }
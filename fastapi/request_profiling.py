@@ -0,0 +1,586 @@
+"""
+Perfil por requisição: tempo total e tempo gasto no PostgreSQL e no MinIO
+Middleware ASGI com cabeçalho Server-Timing, histogramas por rota em /metrics e dumps de perfil amostrados
+"""
+import asyncio
+import bisect
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from instrumentation import add_timing_hook
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # pragma: no cover - dependência opcional
+    PyinstrumentProfiler = None
+
+logger = logging.getLogger(__name__)
+
+# Limites dos buckets dos histogramas (s), no estilo Prometheus
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Componentes medidos pelos ganchos dos clientes; 'other' é o restante (serialização, laço, CPU)
+COMPONENTS = ("postgres", "minio")
+
+# Rota registrada para requisições que não casaram com nenhum endpoint (evita um rótulo por URL)
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Intervalo de amostragem do atraso do event loop (s)
+LOOP_LAG_INTERVAL = 0.1
+
+# Intervalo (s) em que cada worker grava seu snapshot de métricas no diretório compartilhado
+METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", "5"))
+
+PROFILE_ENGINES = ("cprofile", "pyinstrument")
+
+# Tempos da requisição em andamento (visível também nas threads de asyncio.to_thread)
+_current_timings: contextvars.ContextVar[Optional["RequestTimings"]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+class RequestTimings:
+    """Tempo acumulado e número de chamadas por componente em uma requisição"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.components: Dict[str, list] = {component: [0.0, 0] for component in COMPONENTS}
+        self._lock = threading.Lock()
+
+    def add(self, component: str, seconds: float):
+        with self._lock:
+            entry = self.components.setdefault(component, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def breakdown(self, total: float) -> Dict[str, float]:
+        """Segundos por componente, mais 'other' (total menos os componentes, mínimo 0)"""
+        seconds = {component: entry[0] for component, entry in self.components.items()}
+        seconds["other"] = max(0.0, total - sum(seconds.values()))
+        return seconds
+
+    def server_timing(self, total: float) -> str:
+        """Valor do cabeçalho Server-Timing (durações em ms)"""
+        parts = [
+            f'{component};dur={seconds * 1000:.2f};desc="{calls}x"'
+            for component, (seconds, calls) in self.components.items() if calls
+        ]
+        parts.append(f"other;dur={self.breakdown(total)['other'] * 1000:.2f}")
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+class Histogram:
+    """Histograma cumulativo com buckets fixos (formato Prometheus)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def state(self) -> Dict:
+        return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+    def merge(self, state: Dict):
+        """Soma outro histograma (mesmos buckets), no formato de state()"""
+        self.counts = [a + b for a, b in zip(self.counts, state["counts"])]
+        self.sum += state["sum"]
+        self.count += state["count"]
+
+    def exposition(self, name: str, labels: str) -> list:
+        sep = "," if labels else ""
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+        braces = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{braces} {self.sum:.6f}")
+        lines.append(f"{name}_count{braces} {self.count}")
+        return lines
+
+
+def _label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{key}="{_label_value(value)}"' for key, value in labels.items())
+
+
+class MetricsRegistry:
+    """
+    Métricas de requisições e de chamadas aos clientes, expostas em /metrics
+
+    - http_requests_total{method,route,status}
+    - http_request_duration_seconds{method,route}
+    - http_request_component_seconds{method,route,component}
+    - client_call_duration_seconds{component,operation}
+    - event_loop_lag_seconds
+    - request_profiles_written_total
+    - app_startup_seconds{worker,phase} (inicialização de cada worker)
+
+    Os contadores são do processo; com vários workers, SharedMetrics soma
+    os snapshots de todos eles (snapshot/merge).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.durations: Dict[Tuple[str, str], Histogram] = {}
+        self.components: Dict[Tuple[str, str, str], Histogram] = {}
+        self.client_calls: Dict[Tuple[str, str], Histogram] = {}
+        self.loop_lag = Histogram()
+        self.profiles_written = 0
+        self.startup: Dict[str, float] = {}
+
+    def _histogram(self, store: Dict, key: Tuple) -> Histogram:
+        histogram = store.get(key)
+        if histogram is None:
+            histogram = store[key] = Histogram()
+        return histogram
+
+    def record_request(self, method: str, route: str, status_code: int, total: float, breakdown: Dict[str, float]):
+        with self._lock:
+            key = (method, route, status_code)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self._histogram(self.durations, (method, route)).observe(total)
+            for component, seconds in breakdown.items():
+                self._histogram(self.components, (method, route, component)).observe(seconds)
+
+    def record_client_call(self, component: str, operation: str, seconds: float):
+        with self._lock:
+            self._histogram(self.client_calls, (component, operation)).observe(seconds)
+
+    def record_loop_lag(self, seconds: float):
+        with self._lock:
+            self.loop_lag.observe(seconds)
+
+    def record_profile(self):
+        with self._lock:
+            self.profiles_written += 1
+
+    def record_startup(self, phases: Dict[str, float]):
+        with self._lock:
+            self.startup = dict(phases)
+
+    def snapshot(self) -> Dict:
+        """Estado bruto das métricas, serializável em JSON (lido por merge em outro processo)"""
+        with self._lock:
+            return {
+                "requests": [[*key, count] for key, count in self.requests.items()],
+                "durations": [[*key, histogram.state()] for key, histogram in self.durations.items()],
+                "components": [[*key, histogram.state()] for key, histogram in self.components.items()],
+                "client_calls": [[*key, histogram.state()] for key, histogram in self.client_calls.items()],
+                "loop_lag": self.loop_lag.state(),
+                "profiles_written": self.profiles_written,
+                "startup": dict(self.startup),
+            }
+
+    def merge(self, snapshot: Dict):
+        """Soma os contadores e histogramas de um snapshot a este registro (startup não é somado)"""
+        with self._lock:
+            for method, route, status_code, count in snapshot["requests"]:
+                key = (method, route, status_code)
+                self.requests[key] = self.requests.get(key, 0) + count
+            for method, route, state in snapshot["durations"]:
+                self._histogram(self.durations, (method, route)).merge(state)
+            for method, route, component, state in snapshot["components"]:
+                self._histogram(self.components, (method, route, component)).merge(state)
+            for component, operation, state in snapshot["client_calls"]:
+                self._histogram(self.client_calls, (component, operation)).merge(state)
+            self.loop_lag.merge(snapshot["loop_lag"])
+            self.profiles_written += snapshot["profiles_written"]
+
+    def exposition(self, startup: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+        """
+        Métricas no formato texto do Prometheus
+
+        Args:
+            startup: Fases da inicialização por worker (pid); por padrão, só as deste processo
+        """
+        with self._lock:
+            if startup is None:
+                startup = {str(os.getpid()): self.startup}
+            lines = ["# HELP http_requests_total Requisições por rota e status", "# TYPE http_requests_total counter"]
+            for (method, route, status_code), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status_code)}}} {count}")
+
+            lines += ["# HELP http_request_duration_seconds Tempo total da requisição",
+                      "# TYPE http_request_duration_seconds histogram"]
+            for (method, route), histogram in sorted(self.durations.items()):
+                lines += histogram.exposition("http_request_duration_seconds", _labels(method=method, route=route))
+
+            lines += ["# HELP http_request_component_seconds Tempo da requisição por componente (postgres, minio, other)",
+                      "# TYPE http_request_component_seconds histogram"]
+            for (method, route, component), histogram in sorted(self.components.items()):
+                labels = _labels(method=method, route=route, component=component)
+                lines += histogram.exposition("http_request_component_seconds", labels)
+
+            lines += ["# HELP client_call_duration_seconds Duração das chamadas aos clientes PostgreSQL e MinIO",
+                      "# TYPE client_call_duration_seconds histogram"]
+            for (component, operation), histogram in sorted(self.client_calls.items()):
+                labels = _labels(component=component, operation=operation)
+                lines += histogram.exposition("client_call_duration_seconds", labels)
+
+            lines += ["# HELP event_loop_lag_seconds Atraso do event loop em relação ao agendado",
+                      "# TYPE event_loop_lag_seconds histogram"]
+            lines += self.loop_lag.exposition("event_loop_lag_seconds", "")
+
+            lines += ["# HELP request_profiles_written_total Perfis de requisições lentas gravados",
+                      "# TYPE request_profiles_written_total counter",
+                      f"request_profiles_written_total {self.profiles_written}"]
+
+            lines += ["# HELP app_startup_seconds Duração das fases da inicialização do worker",
+                      "# TYPE app_startup_seconds gauge"]
+            for worker, phases in sorted(startup.items()):
+                for phase, seconds in sorted(phases.items()):
+                    lines.append(f"app_startup_seconds{{{_labels(worker=worker, phase=phase)}}} {seconds:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def hook(self, component: str, operation: str, seconds: float):
+        """Gancho de instrumentação: alimenta a requisição atual e o histograma do cliente"""
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(component, seconds)
+        self.record_client_call(component, operation, seconds)
+
+    def install(self):
+        """Registra o gancho nos clientes instrumentados"""
+        add_timing_hook(self.hook)
+
+
+class RequestProfiler:
+    """
+    Perfis amostrados de requisições lentas
+
+    Uma fração das requisições (sample_rate) roda sob o profiler, uma de
+    cada vez; o perfil só é gravado se a requisição passar de slow_ms.
+    Com cProfile, o perfil cobre tudo que o event loop executou no
+    intervalo (inclusive outras requisições) e, com o ProfilingExecutor
+    como executor padrão do loop, as tarefas de asyncio.to_thread
+    enviadas no intervalo; com pyinstrument (se instalado) o modo
+    assíncrono atribui o tempo à requisição certa, mas só na thread do
+    event loop. Mantém no máximo max_files arquivos em output_dir.
+    """
+
+    def __init__(
+        self,
+        slow_ms: Optional[float] = None,
+        sample_rate: Optional[float] = None,
+        output_dir: Optional[str] = None,
+        engine: Optional[str] = None,
+        max_files: Optional[int] = None
+    ):
+        """
+        Args:
+            slow_ms: Limite (ms) acima do qual o perfil é gravado; 0 desativa
+            sample_rate: Fração das requisições perfiladas
+            output_dir: Diretório dos arquivos de perfil
+            engine: 'cprofile' ou 'pyinstrument'
+            max_files: Arquivos mantidos (os mais antigos são apagados)
+        """
+        self.slow_ms = slow_ms if slow_ms is not None else float(os.getenv("PROFILE_SLOW_MS", "0"))
+        self.sample_rate = sample_rate if sample_rate is not None else float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+        self.output_dir = output_dir or os.getenv("PROFILE_DIR", "/tmp/profiles")
+        self.engine = engine or os.getenv("PROFILE_ENGINE", "cprofile")
+        self.max_files = max_files or int(os.getenv("PROFILE_MAX_FILES", "100"))
+        if self.engine not in PROFILE_ENGINES:
+            raise ValueError(f"Profiler inválido: {self.engine}. Use um de {PROFILE_ENGINES}")
+        if self.engine == "pyinstrument" and PyinstrumentProfiler is None:
+            logger.warning("pyinstrument não instalado; usando cProfile")
+            self.engine = "cprofile"
+        self._active = False
+        self._thread_profiles: List[cProfile.Profile] = []
+        self._written: Deque[str] = deque()
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow_ms > 0 and self.sample_rate > 0
+
+    def start(self):
+        """Inicia um perfil se a requisição foi sorteada e nenhum outro está ativo (None caso contrário)"""
+        if not self.enabled or self._active or random.random() >= self.sample_rate:
+            return None
+        try:
+            if self.engine == "pyinstrument":
+                profiler = PyinstrumentProfiler(async_mode="enabled")
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+        except ValueError as e:
+            # Outro profiler já ativo no processo (ex.: depurador)
+            logger.warning(f"Profiler indisponível: {e}")
+            return None
+        self._active = True
+        return profiler
+
+    def stop(self, profiler) -> None:
+        if self.engine == "pyinstrument":
+            profiler.stop()
+        else:
+            profiler.disable()
+            # Perfis das threads do intervalo, somados ao da requisição ao gravar
+            profiler.thread_profiles = self._thread_profiles
+            self._thread_profiles = []
+        self._active = False
+
+    @property
+    def profiling_threads(self) -> bool:
+        """True se as tarefas enviadas ao executor agora devem rodar sob cProfile"""
+        return self._active and self.engine == "cprofile"
+
+    def run_profiled(self, fn, *args, **kwargs):
+        """Executa fn sob um cProfile próprio (cProfile só mede a thread que o ativou)"""
+        profiles = self._thread_profiles
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn, *args, **kwargs)
+        finally:
+            profiles.append(profile)
+
+    def _write(self, profiler, path: str):
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.engine == "pyinstrument":
+            with open(path, "w") as f:
+                f.write(profiler.output_html())
+        else:
+            stats = pstats.Stats(profiler)
+            for profile in list(getattr(profiler, "thread_profiles", [])):
+                stats.add(profile)
+            stats.dump_stats(path)
+        self._written.append(path)
+        while len(self._written) > self.max_files:
+            old = self._written.popleft()
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    async def save_if_slow(self, profiler, method: str, route: str, total: float) -> Optional[str]:
+        """Grava o perfil se a requisição passou do limite; retorna o caminho do arquivo"""
+        total_ms = total * 1000
+        if total_ms < self.slow_ms:
+            return None
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        extension = "html" if self.engine == "pyinstrument" else "prof"
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{method}_{slug}_{total_ms:.0f}ms.{extension}"
+        path = os.path.join(self.output_dir, name)
+        try:
+            await asyncio.to_thread(self._write, profiler, path)
+        except OSError as e:
+            logger.error(f"Erro ao gravar perfil {path}: {e}")
+            return None
+        logger.info(f"Perfil de requisição lenta gravado: {path}")
+        return path
+
+
+class ProfilingExecutor(ThreadPoolExecutor):
+    """
+    Executor padrão do event loop que estende os perfis cProfile às threads
+
+    Enquanto um perfil amostrado está ativo, cada tarefa enviada (ex.:
+    asyncio.to_thread) roda sob um cProfile próprio, somado ao perfil da
+    requisição; fora disso, o executor se comporta como o padrão.
+    """
+
+    def __init__(self, profiler: RequestProfiler, max_workers: Optional[int] = None):
+        super().__init__(max_workers=max_workers, thread_name_prefix="asyncio")
+        self.profiler = profiler
+
+    def submit(self, fn, /, *args, **kwargs):
+        if self.profiler.profiling_threads:
+            return super().submit(self.profiler.run_profiled, fn, *args, **kwargs)
+        return super().submit(fn, *args, **kwargs)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedMetrics:
+    """
+    Métricas somadas entre os workers do gunicorn
+
+    Cada worker grava periodicamente o snapshot do seu registro em
+    directory/<pid>-<id>.json (escrita atômica); a exposição soma os
+    snapshots de todos os arquivos, então /metrics mostra a mesma visão
+    qualquer que seja o worker que atende. Snapshots de workers que já
+    saíram continuam somados (os contadores não regridem quando um worker
+    é reciclado), mas sem app_startup_seconds. O diretório é limpo na
+    subida do servidor (on_starting em gunicorn.conf.py).
+    """
+
+    def __init__(self, registry: MetricsRegistry, directory: str, interval: float = METRICS_PUBLISH_INTERVAL):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._pid: Optional[int] = None
+        self._path: Optional[str] = None
+
+    @property
+    def path(self) -> str:
+        """Arquivo deste worker (com preload_app o objeto nasce no mestre, antes do fork)"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._path = os.path.join(self.directory, f"{self._pid}-{uuid.uuid4().hex[:8]}.json")
+        return self._path
+
+    def publish(self):
+        """Grava o snapshot deste worker (arquivo temporário + os.replace)"""
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot = self.registry.snapshot()
+        snapshot["pid"] = os.getpid()
+        path = self.path
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def exposition(self) -> str:
+        """Métricas de todos os workers no formato texto do Prometheus (inclui o estado atual deste)"""
+        self.publish()
+        merged = MetricsRegistry()
+        startup: Dict[str, Dict[str, float]] = {}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Snapshot de métricas ignorado ({name}): {e}")
+                continue
+            merged.merge(snapshot)
+            if _process_alive(snapshot["pid"]):
+                startup[str(snapshot["pid"])] = snapshot["startup"]
+        return merged.exposition(startup)
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.publish)
+            except OSError as e:
+                logger.error(f"Erro ao gravar snapshot de métricas em {self.directory}: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Para a gravação periódica e grava o snapshot final do worker"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            try:
+                await asyncio.to_thread(self.publish)
+            except OSError as e:
+                logger.error(f"Erro ao gravar snapshot de métricas em {self.directory}: {e}")
+
+
+class LoopLagMonitor:
+    """Mede o atraso do event loop (quanto um sleep curto acorda depois do previsto)"""
+
+    def __init__(self, registry: MetricsRegistry, interval: float = LOOP_LAG_INTERVAL):
+        self.registry = registry
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.registry.record_loop_lag(max(0.0, time.perf_counter() - start - self.interval))
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def _route_path(scope: Dict) -> str:
+    """Caminho modelo da rota (ex.: /recommendations/{user_id}) em vez da URL concreta"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que mede cada requisição HTTP
+
+    Acrescenta o cabeçalho Server-Timing (postgres, minio, other e total
+    até o início da resposta) e registra os histogramas por rota no
+    MetricsRegistry ao fim da resposta. Requisições sorteadas rodam sob
+    o RequestProfiler.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry, profiler: Optional[RequestProfiler] = None):
+        self.app = app
+        self.registry = registry
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.server_timing(timings.elapsed()).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profile = self.profiler.start() if self.profiler is not None else None
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total = timings.elapsed()
+            _current_timings.reset(token)
+            route = _route_path(scope)
+            self.registry.record_request(scope["method"], route, status_code, total, timings.breakdown(total))
+            if profile is not None:
+                self.profiler.stop(profile)
+                if await self.profiler.save_if_slow(profile, scope["method"], route, total):
+                    self.registry.record_profile()
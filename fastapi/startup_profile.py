@@ -0,0 +1,261 @@
+"""
+Perfil de inicialização da API: tempo de import por módulo e tempo até a primeira resposta
+StartupTimer mede as fases do lifespan de cada worker (exportadas em /metrics como app_startup_seconds)
+"""
+import argparse
+import json
+import logging
+import os
+import shlex
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Comando de produção medido por padrão no modo --serve
+DEFAULT_SERVE_COMMAND = "gunicorn main:app -c gunicorn.conf.py"
+
+# Endpoint consultado até a API responder
+DEFAULT_HEALTH_URL = "http://127.0.0.1:8000/health"
+
+# Intervalo entre tentativas de conexão (s)
+POLL_INTERVAL = 0.05
+
+
+def process_uptime() -> Optional[float]:
+    """
+    Segundos desde a criação deste processo (fork do worker ou início do mestre)
+
+    Lido de /proc (Linux), com resolução de um tick do relógio (~10 ms);
+    None em outros sistemas.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Campos após o nome do executável (que pode conter espaços); starttime é o campo 22
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """Duração das fases da inicialização (import, clientes, modelos) de um processo"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    def record(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        """Context manager que soma o tempo do bloco à fase `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summary(self) -> Dict[str, float]:
+        """Fases registradas e o tempo desde a criação do processo ('process')"""
+        summary = dict(self.phases)
+        uptime = process_uptime()
+        if uptime is not None:
+            summary["process"] = uptime
+        return summary
+
+
+def parse_importtime(output: str) -> List[Dict]:
+    """
+    Interpreta a saída de `python -X importtime`
+
+    Cada linha tem 'import time: <self µs> | <cumulativo µs> | <nome>',
+    com o nome indentado dois espaços por nível de aninhamento.
+
+    Returns:
+        Lista de dicionários com module, self_ms, cumulative_ms e level
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # cabeçalho
+        name = parts[2].rstrip()
+        entries.append({
+            "module": name.strip(),
+            "self_ms": int(parts[0]) / 1000,
+            "cumulative_ms": int(parts[1]) / 1000,
+            "level": (len(name) - len(name.lstrip()) - 1) // 2
+        })
+    return entries
+
+
+def profile_imports(module: str = "main", python: str = sys.executable, top: int = 15) -> Dict:
+    """
+    Mede o import de um módulo num interpretador novo (sem cache de módulos)
+
+    Args:
+        module: Módulo importado (default: main, o app FastAPI)
+        python: Interpretador usado
+        top: Quantidade de entradas em cada ranking
+
+    Returns:
+        Dicionário com o tempo total, os imports diretos mais caros, os
+        módulos com maior tempo próprio e o tempo próprio somado por pacote
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"Falha ao importar {module}: {errors[-1] if errors else completed.returncode}")
+
+    entries = parse_importtime(completed.stderr)
+    target = [e for e in entries if e["module"] == module]
+    packages = defaultdict(float)
+    for entry in entries:
+        packages[entry["module"].split(".")[0]] += entry["self_ms"]
+
+    def ranked(items, key):
+        return sorted(items, key=key, reverse=True)[:top]
+
+    return {
+        "module": module,
+        "total_ms": target[-1]["cumulative_ms"] if target else sum(e["cumulative_ms"] for e in entries if e["level"] == 0),
+        "process_wall_ms": round(wall * 1000, 1),
+        "n_modules": len(entries),
+        "top_level": ranked([e for e in entries if e["level"] <= 1], key=lambda e: e["cumulative_ms"]),
+        "top_self": ranked(entries, key=lambda e: e["self_ms"]),
+        "packages": [{"package": name, "self_ms": round(ms, 3)} for name, ms in ranked(packages.items(), key=lambda item: item[1])]
+    }
+
+
+def _wait_for_response(url: str, process: subprocess.Popen, timeout: float) -> bool:
+    """Consulta url até receber qualquer resposta HTTP (True) ou o processo/timeout terminar (False)"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return True
+        except urllib.error.HTTPError:
+            return True  # a API respondeu (ex.: 503 com dependência fora)
+        except (urllib.error.URLError, OSError):
+            time.sleep(POLL_INTERVAL)
+    return False
+
+
+def _stop(process: subprocess.Popen, timeout: float = 15):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def measure_cold_start(command: str = DEFAULT_SERVE_COMMAND, url: str = DEFAULT_HEALTH_URL, runs: int = 3, timeout: float = 120) -> Dict:
+    """
+    Tempo do início do servidor até a primeira resposta HTTP, em várias execuções
+
+    Args:
+        command: Comando que sobe a API (executado no diretório deste arquivo)
+        url: Endpoint consultado
+        runs: Execuções medidas (o servidor é encerrado entre elas)
+        timeout: Espera máxima por execução (s)
+
+    Returns:
+        Dicionário com os tempos de cada execução e mínimo/mediana/máximo (s)
+    """
+    times = []
+    for run in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            shlex.split(command), cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            if not _wait_for_response(url, process, timeout):
+                raise RuntimeError(f"Servidor não respondeu em {url} (execução {run + 1}, código {process.poll()})")
+            times.append(time.perf_counter() - start)
+        finally:
+            _stop(process)
+        logger.info(f"Execução {run + 1}/{runs}: {times[-1]:.2f}s")
+
+    return {
+        "command": command,
+        "url": url,
+        "runs": [round(t, 3) for t in times],
+        "min_seconds": round(min(times), 3),
+        "median_seconds": round(statistics.median(times), 3),
+        "max_seconds": round(max(times), 3)
+    }
+
+
+def print_import_report(report: Dict):
+    """Imprime o perfil de imports de forma legível"""
+    print(f"\n📦 import {report['module']}: {report['total_ms']:.0f} ms "
+          f"({report['n_modules']} módulos, processo {report['process_wall_ms']:.0f} ms)")
+    print("\n  Imports mais caros (acumulado)")
+    for entry in report["top_level"]:
+        print(f"    {entry['cumulative_ms']:>9.1f} ms  {'  ' * entry['level']}{entry['module']}")
+    print("\n  Maior tempo próprio")
+    for entry in report["top_self"]:
+        print(f"    {entry['self_ms']:>9.1f} ms  {entry['module']}")
+    print("\n  Tempo próprio por pacote")
+    for entry in report["packages"]:
+        print(f"    {entry['self_ms']:>9.1f} ms  {entry['package']}")
+
+
+def main():
+    """Função principal para execução do perfil via CLI"""
+    parser = argparse.ArgumentParser(description="Perfil de inicialização da API (imports e cold start)")
+    parser.add_argument("--module", default="main", help="Módulo cujo import é medido")
+    parser.add_argument("--top", type=int, default=15, help="Entradas em cada ranking")
+    parser.add_argument("--serve", nargs="?", const=DEFAULT_SERVE_COMMAND, default=None,
+                        help=f"Mede também o tempo até a primeira resposta do comando (default: '{DEFAULT_SERVE_COMMAND}')")
+    parser.add_argument("--url", default=DEFAULT_HEALTH_URL, help="Endpoint consultado no modo --serve")
+    parser.add_argument("--runs", type=int, default=3, help="Execuções no modo --serve")
+    parser.add_argument("--timeout", type=float, default=120, help="Espera máxima por execução no modo --serve (s)")
+    parser.add_argument("--output", help="Arquivo JSON para gravar o relatório")
+    args = parser.parse_args()
+
+    try:
+        report = {"imports": profile_imports(args.module, top=args.top)}
+        print_import_report(report["imports"])
+
+        if args.serve:
+            report["cold_start"] = measure_cold_start(args.serve, args.url, args.runs, args.timeout)
+            cold = report["cold_start"]
+            print(f"\n🚀 Primeira resposta de '{cold['command']}': mediana {cold['median_seconds']}s "
+                  f"(mín {cold['min_seconds']}s, máx {cold['max_seconds']}s, {len(cold['runs'])} execuções)")
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\n✅ Relatório gravado em {args.output}")
+        return 0
+    except Exception as e:
+        logger.error(f"Falha no perfil de inicialização: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
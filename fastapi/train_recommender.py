@@ -0,0 +1,232 @@
+"""
+Treinamento do modelo de recomendação: PostgreSQL -> K-Means + KNN -> MinIO
+Publica uma nova versão do modelo consumida pelos endpoints de recomendação
+(treino completo ou atualização incremental com as avaliações novas)
+"""
+import argparse
+import logging
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from minio_client import MinIOClient
+from postgres_client import PostgreSQLClient
+from recommender import DEFAULT_K_CLUSTERS, load_model_from_minio, load_ratings_from_postgres, save_model_to_minio, train_model
+from recommender.ann import NEIGHBOR_METHODS
+from recommender.clustering import DEFAULT_K_RANGE, ClusterCache, elbow_search, matrix_version, suggest_k
+from recommender.grid_search import DEFAULT_K_VALUES, DEFAULT_N_VALUES, GridResultCache, grid_search
+from recommender.incremental import changed_ratings, update_model
+from recommender.training import build_movie_matrix, ratings_watermark
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def train_and_publish(k_clusters: int = DEFAULT_K_CLUSTERS, minio_client=None, pg_client=None, neighbor_method: str = "auto"):
+    """
+    Treina o modelo com todas as avaliações e publica no MinIO
+
+    Args:
+        k_clusters: Número de clusters de filmes
+        minio_client: Cliente MinIO (opcional, criado se ausente)
+        pg_client: Cliente PostgreSQL (opcional, criado se ausente)
+        neighbor_method: Índice de vizinhos 'exact', 'lsh' ou 'auto'
+
+    Returns:
+        Modelo treinado (KMeansKNNModel)
+    """
+    minio_client = minio_client or MinIOClient()
+    pg_client = pg_client or PostgreSQLClient()
+
+    watermark = ratings_watermark(pg_client)
+    user_ids, movie_ids, ratings = load_ratings_from_postgres(pg_client)
+    if len(ratings) == 0:
+        raise ValueError("Nenhuma avaliação no PostgreSQL. Execute o ETL primeiro (/etl/run)")
+
+    model = train_model(
+        user_ids, movie_ids, ratings, k_clusters=k_clusters,
+        cluster_cache=ClusterCache.from_env(), neighbor_method=neighbor_method
+    )
+    model.metadata["ratings_watermark"] = watermark
+    save_model_to_minio(minio_client, model)
+    return model
+
+
+def refresh_and_publish(base_model=None, minio_client=None, pg_client=None):
+    """
+    Atualiza incrementalmente o modelo com as avaliações novas e publica no MinIO
+
+    Lê apenas as avaliações a partir do ratings_watermark do modelo
+    base (relógio do PostgreSQL; modelos sem marca releem todas as
+    avaliações) e descarta as que o modelo já tem; clusters de filmes são mantidos e só os usuários afetados são
+    recalculados (ver recommender.incremental).
+
+    Args:
+        base_model: Modelo a atualizar (opcional, default: última versão publicada)
+        minio_client: Cliente MinIO (opcional, criado se ausente)
+        pg_client: Cliente PostgreSQL (opcional, criado se ausente)
+
+    Returns:
+        Novo modelo, ou None se não há avaliações novas
+    """
+    minio_client = minio_client or MinIOClient()
+    pg_client = pg_client or PostgreSQLClient()
+
+    base_model = base_model or load_model_from_minio(minio_client)
+    if base_model is None:
+        raise ValueError("Nenhum modelo publicado no MinIO. Treine um modelo em /recommender/train")
+
+    since = base_model.metadata.get("ratings_watermark")
+    watermark = ratings_watermark(pg_client)
+    user_ids, movie_ids, ratings = changed_ratings(base_model, *load_ratings_from_postgres(pg_client, since=since))
+    if len(ratings) == 0:
+        logger.info(f"Nenhuma avaliação nova desde {since or 'o treino'}; modelo {base_model.model_version} mantido")
+        return None
+
+    model = update_model(base_model, user_ids, movie_ids, ratings)
+    model.metadata["ratings_watermark"] = watermark
+    save_model_to_minio(minio_client, model)
+    return model
+
+
+def elbow_report(
+    k_values: Iterable[int] = DEFAULT_K_RANGE,
+    minibatch: Optional[bool] = None,
+    max_workers: Optional[int] = None,
+    pg_client=None
+) -> Dict:
+    """
+    Executa a busca do cotovelo (WCSS por K) sobre as avaliações do PostgreSQL
+
+    Os ajustes ficam no cache por (K, versão dos dados); um treino
+    posterior com o K escolhido reaproveita o ajuste.
+
+    Args:
+        k_values: Valores de K a testar
+        minibatch: Usar MiniBatchKMeans (None = automático)
+        max_workers: Processos em paralelo (default: número de CPUs)
+        pg_client: Cliente PostgreSQL (opcional, criado se ausente)
+
+    Returns:
+        Dicionário com data_version, suggested_k, total_seconds e results por K
+    """
+    pg_client = pg_client or PostgreSQLClient()
+    start = time.perf_counter()
+
+    user_ids, movie_ids, ratings = load_ratings_from_postgres(pg_client)
+    if len(ratings) == 0:
+        raise ValueError("Nenhuma avaliação no PostgreSQL. Execute o ETL primeiro (/etl/run)")
+
+    movie_matrix = build_movie_matrix(user_ids, movie_ids, ratings)
+    data_version = matrix_version(movie_matrix)
+    results = elbow_search(
+        movie_matrix, k_values, data_version=data_version,
+        minibatch=minibatch, max_workers=max_workers, cache=ClusterCache.from_env()
+    )
+
+    return {
+        "data_version": data_version,
+        "suggested_k": suggest_k(results),
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "results": results
+    }
+
+
+def grid_search_report(
+    k_values: Iterable[int] = DEFAULT_K_VALUES,
+    n_values: Iterable[int] = DEFAULT_N_VALUES,
+    test_size: float = 0.2,
+    seed: int = 42,
+    max_workers: Optional[int] = None,
+    pg_client=None
+) -> Dict:
+    """
+    Busca em grade (K, N) com divisão aleatória treino/teste das avaliações do PostgreSQL
+
+    Todo o conjunto de teste é avaliado (o notebook usava uma amostra de 10%).
+
+    Args:
+        k_values: Valores de K (clusters)
+        n_values: Valores de N (vizinhos)
+        test_size: Fração das avaliações usada como teste
+        seed: Semente da divisão treino/teste
+        max_workers: Processos em paralelo (default: número de CPUs)
+        pg_client: Cliente PostgreSQL (opcional, criado se ausente)
+
+    Returns:
+        Resultado de recommender.grid_search.grid_search
+    """
+    pg_client = pg_client or PostgreSQLClient()
+
+    user_ids, movie_ids, ratings = load_ratings_from_postgres(pg_client)
+    if len(ratings) == 0:
+        raise ValueError("Nenhuma avaliação no PostgreSQL. Execute o ETL primeiro (/etl/run)")
+
+    # Ordem canônica antes de sortear, para a divisão não depender da ordem de leitura do banco
+    order = np.lexsort((movie_ids, user_ids))
+    user_ids, movie_ids, ratings = user_ids[order], movie_ids[order], ratings[order]
+    is_test = np.random.default_rng(seed).random(len(ratings)) < test_size
+
+    return grid_search(
+        (user_ids[~is_test], movie_ids[~is_test], ratings[~is_test]),
+        (user_ids[is_test], movie_ids[is_test], ratings[is_test]),
+        k_values, n_values,
+        max_workers=max_workers,
+        cluster_cache=ClusterCache.from_env(),
+        result_cache=GridResultCache.from_env()
+    )
+
+
+def main():
+    """Função principal para execução do treinamento via CLI"""
+    parser = argparse.ArgumentParser(description="Treina e publica o modelo K-Means + KNN")
+    parser.add_argument("--k-clusters", type=int, default=DEFAULT_K_CLUSTERS, help="Número de clusters de filmes")
+    parser.add_argument("--neighbor-method", choices=NEIGHBOR_METHODS, default="auto", help="Índice de vizinhos exato, LSH ou automático")
+    parser.add_argument("--incremental", action="store_true", help="Atualiza a última versão com as avaliações novas")
+    parser.add_argument("--elbow", nargs=2, type=int, metavar=("K_MIN", "K_MAX"), help="Apenas calcula o WCSS de K_MIN a K_MAX")
+    parser.add_argument("--minibatch", action="store_true", default=None, help="Usa MiniBatchKMeans na busca do cotovelo")
+    parser.add_argument("--grid-search", action="store_true", help="Apenas executa a busca em grade (K, N)")
+    parser.add_argument("--k-values", default=",".join(map(str, DEFAULT_K_VALUES)), help="Valores de K da busca em grade")
+    parser.add_argument("--n-values", default=",".join(map(str, DEFAULT_N_VALUES)), help="Valores de N da busca em grade")
+    args = parser.parse_args()
+
+    try:
+        if args.grid_search:
+            report = grid_search_report(
+                [int(k) for k in args.k_values.split(",")],
+                [int(n) for n in args.n_values.split(",")]
+            )
+            print(f"\n🔎 Busca em grade (dados {report['data_version']}, {report['n_test']} avaliações de teste) em {report['total_seconds']}s")
+            for r in report["results"]:
+                origin = " (cache)" if r["cached"] else ""
+                print(f"  K={r['k']:>3}  N={r['n']:>3}  RMSE={r['rmse']:.4f}  MAE={r['mae']:.4f}  "
+                      f"P@10={r['precision_at_10']:.4f}  NDCG@10={r['ndcg_at_10']:.4f}{origin}")
+            print(f"  Melhor: K={report['best']['k']}, N={report['best']['n']}, RMSE={report['best']['rmse']:.4f}")
+            return 0
+        if args.elbow:
+            report = elbow_report(range(args.elbow[0], args.elbow[1] + 1), minibatch=args.minibatch)
+            print(f"\n📈 Cotovelo (dados {report['data_version']}) em {report['total_seconds']}s")
+            for r in report["results"]:
+                origin = "cache" if r["cached"] else ("warm start" if r["warm_started"] else r["algorithm"])
+                print(f"  K={r['k']:>3}  WCSS={r['wcss']:.2f}  {r['fit_seconds']:.2f}s  {r['peak_memory_mb']:.1f} MB  ({origin})")
+            print(f"  K sugerido: {report['suggested_k']}")
+            return 0
+        if args.incremental:
+            model = refresh_and_publish()
+            if model is None:
+                print("\nℹ️  Nenhuma avaliação nova; modelo mantido")
+                return 0
+        else:
+            model = train_and_publish(k_clusters=args.k_clusters, neighbor_method=args.neighbor_method)
+        print(f"\n✅ Modelo publicado: {model.model_version}")
+        for key, value in model.metadata.items():
+            print(f"  {key}: {value}")
+        return 0
+    except Exception as e:
+        logger.error(f"Falha no treinamento: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
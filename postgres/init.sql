@@ -123,8 +123,10 @@ CREATE TABLE IF NOT EXISTS movie_similarities (
 );
 
 -- Índices
-CREATE INDEX idx_movie_sim_movie1 ON movie_similarities(movie_id_1);
-CREATE INDEX idx_movie_sim_movie2 ON movie_similarities(movie_id_2);
+-- Cada par é gravado uma vez, então "filmes similares a X" consulta os dois lados;
+-- cada índice cobre um lado da busca (filme + versão, já ordenado por score)
+CREATE INDEX idx_movie_sim_movie1 ON movie_similarities(movie_id_1, model_version, similarity_score DESC) INCLUDE (movie_id_2);
+CREATE INDEX idx_movie_sim_movie2 ON movie_similarities(movie_id_2, model_version, similarity_score DESC) INCLUDE (movie_id_1);
 CREATE INDEX idx_movie_sim_score ON movie_similarities(similarity_score DESC);
 
 -- ====================================================================